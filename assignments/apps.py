@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AssignmentsConfig(AppConfig):
+    name = 'assignments'
+
+    def ready(self):
+        from assignments import signals  # noqa: F401
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from assignments.models import FileDeletion
+
+
+class Command(BaseCommand):
+    help = 'Deletes the exercise files queued for deletion by bulk deletes. Run every few minutes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        deleted = FileDeletion.process(options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} files')
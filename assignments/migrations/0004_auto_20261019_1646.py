@@ -0,0 +1,17 @@
+# Generated by Django 2.1.15 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0003_auto_20190405_1503'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['course', 'approved', 'upload_datetime'], name='exercise_course_approved_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0004_auto_20261019_1646'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('queued', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:31
+
+import assignments.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0012_exercise_upload_limit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('assignments', '0005_file_deletion_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=assignments.models.generate_upload_token, max_length=32, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('received', models.PositiveIntegerField(default=0)),
+                ('staging_name', models.CharField(max_length=100)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.Course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
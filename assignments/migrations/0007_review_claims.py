@@ -0,0 +1,26 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('assignments', '0006_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_exercises', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import logging
 import os
+import secrets
+from datetime import timedelta
 
 from django.contrib.auth.models import User
 from django.db import models
@@ -6,12 +9,17 @@ from django.utils import timezone
 
 from booking.models import Course
 
+logger = logging.getLogger(__name__)
+
 
 def get_exercise_filepath(instance, filename):
     return f'exercises/{instance.course.course_code}/user_{instance.student.id}/{filename}/'
 
 
 class Exercise(models.Model):
+    # how long an assistant who claimed an exercise has to review it before someone else can claim it
+    CLAIM_DURATION = timedelta(minutes=15)
+
     course = models.ForeignKey(
         Course,
         related_name='exercise_uploads',
@@ -43,6 +51,18 @@ class Exercise(models.Model):
     upload_datetime = models.DateTimeField(
         default=timezone.now
     )
+    # the assistant reviewing the exercise, until claimed_until, see assignments.review_queue
+    claimed_by = models.ForeignKey(
+        User,
+        blank=True,
+        null=True,
+        related_name='claimed_exercises',
+        on_delete=models.SET_NULL,
+    )
+    claimed_until = models.DateTimeField(
+        blank=True,
+        null=True,
+    )
 
     def delete(self, using=None, keep_parents=False):
         if self.file:
@@ -54,6 +74,10 @@ class Exercise(models.Model):
     def filename(self):
         return os.path.basename(self.file.name)
 
+    @property
+    def is_claimed(self):
+        return self.claimed_until is not None and self.claimed_until > timezone.now()
+
     def __str__(self):
         return f'{self.student} - {self.filename} - {self.course.course_code}'
 
@@ -62,3 +86,83 @@ class Exercise(models.Model):
             '-upload_datetime',  # then sort by upload time within these groups
             'approved',  # exercises without reviews on top
         ]
+        indexes = [
+            models.Index(fields=['course', 'approved', 'upload_datetime'], name='exercise_course_approved_idx'),
+        ]
+
+
+def generate_upload_token():
+    return secrets.token_urlsafe(24)
+
+
+class ExerciseUpload(models.Model):
+    """An exercise being uploaded in chunks, see assignments.uploads. Becomes an Exercise once every byte is in"""
+    CHUNK_SIZE = 1024 * 1024
+    STAGING_DIRECTORY = 'partial_uploads'
+
+    token = models.CharField(
+        max_length=32,
+        unique=True,
+        default=generate_upload_token,
+    )
+    course = models.ForeignKey(
+        Course,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    student = models.ForeignKey(
+        User,
+        related_name='exercise_uploads',
+        on_delete=models.CASCADE,
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    # sha256 of the whole file, as computed by the client
+    checksum = models.CharField(max_length=64)
+    received = models.PositiveIntegerField(default=0)
+    staging_name = models.CharField(max_length=100)
+    updated = models.DateTimeField(default=timezone.now)
+
+    def save(self, **kwargs):
+        if not self.staging_name:
+            self.staging_name = f'{self.STAGING_DIRECTORY}/{self.token}'
+        super().save(**kwargs)
+
+    def __str__(self):
+        return f'{self.student} - {self.filename} ({self.received}/{self.size})'
+
+
+class FileDeletion(models.Model):
+    """
+    An exercise file to delete. Exercises deleted in bulk queue their files here instead of removing them one at a
+    time, and ./manage.py delete_queued_files removes them in the background.
+    """
+    name = models.CharField(max_length=255)
+    queued = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def queue_files(cls, exercises):
+        """Queues the files of the exercises in exercises, a queryset, with a single query per batch"""
+        names = exercises.exclude(file='').values_list('file', flat=True)
+        return len(cls.objects.bulk_create((cls(name=name) for name in names.iterator()), batch_size=1000))
+
+    @classmethod
+    def process(cls, batch_size=500):
+        """Deletes the queued files, returns the number of files deleted"""
+        storage = Exercise._meta.get_field('file').storage
+        deleted = 0
+        while True:
+            batch = list(cls.objects.order_by('pk')[:batch_size])
+            if not batch:
+                return deleted
+            for deletion in batch:
+                try:
+                    storage.delete(deletion.name)
+                    deleted += 1
+                except OSError:
+                    # dropped rather than retried forever, the error is logged for someone to look into
+                    logger.exception('Could not delete %s', deletion.name)
+            cls.objects.filter(pk__in=[deletion.pk for deletion in batch]).delete()
+
+    def __str__(self):
+        return self.name
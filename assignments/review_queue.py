@@ -0,0 +1,81 @@
+"""
+Work queue of unreviewed exercises for the assistants of a course.
+
+An assistant claims the oldest unreviewed exercise nobody else has claimed, and has it to themselves for
+Exercise.CLAIM_DURATION. A claim that runs out without a review makes the exercise available again.
+
+Where the database supports SELECT ... FOR UPDATE SKIP LOCKED the exercise is taken with it, so assistants claiming
+at the same time each lock a different row instead of waiting on each other. SQLite has no row locks, so there the
+exercise is taken with an UPDATE that only matches while it is still available, and the next one is tried if another
+assistant got it first. Either way the oldest available exercise is found by walking exercise_course_approved_idx
+from the start, past no more than the exercises claimed right now, so a claim takes the same time however many
+exercises are waiting.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from assignments.models import Exercise
+from itsBooking.extensions.versioning import bump_course_stamp
+
+# exercises tried before giving up when other assistants keep claiming them first, without SKIP LOCKED
+CLAIM_ATTEMPTS = 5
+
+
+def _available(course, now):
+    return Exercise.objects.filter(course=course, approved__isnull=True).filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lte=now)
+    ).order_by('upload_datetime')
+
+
+def _claim_skip_locked(course, assistant, now, until):
+    with transaction.atomic():
+        exercise = _available(course, now).select_for_update(skip_locked=True).first()
+        if exercise is not None:
+            Exercise.objects.filter(pk=exercise.pk).update(claimed_by=assistant, claimed_until=until)
+    return exercise
+
+
+def _claim_conditional_update(course, assistant, now, until):
+    for _ in range(CLAIM_ATTEMPTS):
+        exercise = _available(course, now).first()
+        if exercise is None:
+            return None
+        # matches nothing if another assistant claimed it after it was read
+        if _available(course, now).filter(pk=exercise.pk).update(claimed_by=assistant, claimed_until=until):
+            return exercise
+    return None
+
+
+def claim_next_exercise(course, assistant, now=None):
+    """
+    Claims the oldest available unreviewed exercise of the course for assistant and returns it, or None if there
+    is none. An assistant has one claim at a time, if they already have one it is renewed and returned instead.
+    """
+    now = now or timezone.now()
+    until = now + Exercise.CLAIM_DURATION
+    claimed = Exercise.objects.filter(
+        course=course, approved__isnull=True, claimed_by=assistant, claimed_until__gt=now
+    ).first()
+    if claimed is not None:
+        Exercise.objects.filter(pk=claimed.pk).update(claimed_until=until)
+    elif connections[router.db_for_write(Exercise)].features.has_select_for_update_skip_locked:
+        claimed = _claim_skip_locked(course, assistant, now, until)
+    else:
+        claimed = _claim_conditional_update(course, assistant, now, until)
+
+    if claimed is not None:
+        claimed.claimed_by, claimed.claimed_until = assistant, until
+        # the exercise list shows who is reviewing what
+        bump_course_stamp(course.pk)
+    return claimed
+
+
+def release_claims(course, assistant):
+    """Releases the assistant's claims in the course, returns the number released"""
+    released = Exercise.objects.filter(course=course, claimed_by=assistant).update(
+        claimed_by=None, claimed_until=None
+    )
+    if released:
+        bump_course_stamp(course.pk)
+    return released
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from assignments.models import Exercise
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp
+
+
+@receiver([post_save, post_delete], sender=Exercise)
+def exercise_changed(sender, instance, **kwargs):
+    bump_course_stamp(instance.course_id)
+    bump_user_stamp(instance.student_id)
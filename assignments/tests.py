@@ -1,11 +1,20 @@
+import hashlib
 import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth.models import User, Group
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from assignments.models import Exercise
+from assignments import review_queue
+from assignments.models import Exercise, ExerciseUpload
+from assignments.review_queue import claim_next_exercise
+from assignments.uploads import append_chunk, finish_upload
 from booking.models import Course
 
 
@@ -29,6 +38,31 @@ class ExerciseTest(TestCase):
             self.assertEqual(302, response.status_code)
             self.assertEqual(prev_count + 1, Exercise.objects.count())
 
+    def test_upload_size_limit(self):
+        """Files over the course's limit are stopped before the upload handlers that write them get any of it"""
+        self.user.groups.add(self.students_group)
+        self.course.max_exercise_upload_mb = 1
+        self.course.save()
+        url = reverse('upload_exercise', kwargs={'slug': self.course.slug})
+        # too large by Content-Length, and only found too large while the file is read
+        for size, stopped_at_start in ((2 * 1024 * 1024, True), (1024 * 1024 + 10, False)):
+            with self.subTest(size=size), \
+                    mock.patch.object(MemoryFileUploadHandler, 'receive_data_chunk') as memory, \
+                    mock.patch.object(TemporaryFileUploadHandler, 'receive_data_chunk') as temporary:
+                response = self.client.post(url, {'file': SimpleUploadedFile('big.txt', b'x' * size)})
+                self.assertFormError(response, 'form', 'file', 'Filen er større enn 1 MB')
+                self.assertFalse(Exercise.objects.exists())
+                if stopped_at_start:
+                    self.assertFalse(memory.called or temporary.called)
+
+    def test_upload_csrf(self):
+        self.user.groups.add(self.students_group)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('upload_exercise', kwargs={'slug': self.course.slug}),
+                               {'file': SimpleUploadedFile('ex.txt', b'exercise')})
+        self.assertEqual(403, response.status_code)
+
     def test_post_upload_no_file_fail(self):
         prev_count = Exercise.objects.count()
         response = self.client.post(
@@ -142,3 +176,193 @@ class ExerciseTest(TestCase):
         response2 = self.client.get(reverse('student_exercise_uploads_list', kwargs={'slug': self.course.slug}))
         exercise_list = list(response2.context['exercise_list'])
         self.assertEqual(0, len(exercise_list))
+
+    def test_unreviewed_exercises_use_index(self):
+        plan = self.course.exercise_uploads.filter(approved__isnull=True).explain()
+        self.assertIn('exercise_course_approved_idx', plan)
+
+
+class ReviewQueueTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        student = User.objects.create_user(username='STUDENT')
+        now = timezone.now()
+        self.exercises = [
+            Exercise.objects.create(course=self.course, student=student, file=f'ex{i}.txt',
+                                    upload_datetime=now - timedelta(hours=3 - i))
+            for i in range(3)
+        ]
+        self.assistant = User.objects.create_user(username='ASSISTANT')
+        self.other = User.objects.create_user(username='OTHER')
+        assistants = Group.objects.create(name='assistants')
+        self.assistant.groups.add(assistants)
+        self.other.groups.add(assistants)
+
+    def test_claims_oldest_available(self):
+        self.exercises[0].approved = True
+        self.exercises[0].save()
+        self.assertEqual(self.exercises[1], claim_next_exercise(self.course, self.assistant))
+        self.assertEqual(self.exercises[2], claim_next_exercise(self.course, self.other))
+        self.assertIsNone(claim_next_exercise(self.course, User.objects.create_user(username='THIRD')))
+
+    def test_claim_is_renewed(self):
+        now = timezone.now()
+        claim_next_exercise(self.course, self.assistant, now=now)
+        exercise = claim_next_exercise(self.course, self.assistant, now=now + timedelta(minutes=10))
+        self.assertEqual(self.exercises[0], exercise)
+        exercise.refresh_from_db()
+        self.assertEqual(now + timedelta(minutes=10) + Exercise.CLAIM_DURATION, exercise.claimed_until)
+
+    def test_expired_claim(self):
+        now = timezone.now()
+        claim_next_exercise(self.course, self.assistant, now=now)
+        later = now + Exercise.CLAIM_DURATION
+        self.assertEqual(self.exercises[0], claim_next_exercise(self.course, self.other, now=later))
+
+    def test_lost_race(self):
+        # another assistant claims the exercise between it being read and the update
+        available = review_queue._available
+
+        def claimed_meanwhile(course, now):
+            queryset = available(course, now)
+            Exercise.objects.filter(pk=self.exercises[0].pk).update(
+                claimed_by=self.other, claimed_until=now + Exercise.CLAIM_DURATION
+            )
+            return queryset
+
+        with mock.patch.object(review_queue, '_available', claimed_meanwhile):
+            exercise = review_queue._claim_conditional_update(
+                self.course, self.assistant, timezone.now(), timezone.now() + Exercise.CLAIM_DURATION
+            )
+        self.assertEqual(self.exercises[1], exercise)
+
+    def test_claim_view(self):
+        self.client.force_login(self.assistant)
+        url = reverse('claim_next_exercise', kwargs={'slug': self.course.slug})
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('exercise_uploads_list', kwargs={'slug': self.course.slug})
+                             + f'?review={self.exercises[0].pk}#{self.exercises[0].pk}',
+                             fetch_redirect_response=False)
+        # the page has the card and the review form the url points to
+        page = self.client.get(response.url).content.decode()
+        self.assertIn(f'id="{self.exercises[0].pk}"', page)
+        self.assertIn(f'id="{self.exercises[0].pk}-form"', page)
+        self.assertEqual(self.exercises[0].pk, self.client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()[
+            'exercise'])
+
+        self.client.post(reverse('exercise_uploads_list', kwargs={'slug': self.course.slug}),
+                         {'approved': True, 'exercise_pk': self.exercises[0].pk, 'feedback_text': 'abc'})
+        self.exercises[0].refresh_from_db()
+        self.assertIsNone(self.exercises[0].claimed_by)
+
+        self.client.post(url)
+        self.assertEqual({'released': 1}, self.client.post(url, {'release': ''},
+                                                           HTTP_X_REQUESTED_WITH='XMLHttpRequest').json())
+
+        self.client.force_login(User.objects.create_user(username='STUDENT2'))
+        self.assertEqual(403, self.client.post(url).status_code)
+
+
+@mock.patch.object(ExerciseUpload, 'CHUNK_SIZE', 4)
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', max_exercise_upload_mb=1)
+        self.user = User.objects.create_user(username='STUDENT')
+        self.user.groups.add(Group.objects.create(name='students'))
+        self.client.force_login(self.user)
+        self.content = b'exercise'
+
+    def start(self, content=None, size=None):
+        content = content or self.content
+        return self.client.post(reverse('start_exercise_upload', kwargs={'slug': self.course.slug}), {
+            'filename': 'ex.txt', 'size': size or len(content), 'checksum': hashlib.sha256(content).hexdigest(),
+        })
+
+    def send(self, url, offset, chunk):
+        return self.client.post(url, chunk, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_upload(self):
+        state = self.start().json()
+        self.assertEqual((0, 8, 4), (state['offset'], state['size'], state['chunk_size']))
+        self.assertEqual(4, self.send(state['url'], 0, b'exer').json()['offset'])
+        self.assertFalse(Exercise.objects.exists())
+        self.assertEqual({'done': True, 'redirect': '/'}, self.send(state['url'], 4, b'cise').json())
+        exercise = Exercise.objects.get()
+        with exercise.file.open() as file:
+            self.assertEqual(self.content, file.read())
+        self.assertFalse(ExerciseUpload.objects.exists())
+
+    def test_resume(self):
+        url = self.start().json()['url']
+        self.send(url, 0, b'exer')
+        # the chunk is sent again after a dropped connection, or a chunk is skipped
+        self.assertEqual(409, self.send(url, 0, b'exer').status_code)
+        self.assertEqual(409, self.send(url, 6, b'se').status_code)
+        # starting over finds the unfinished upload
+        state = self.start().json()
+        self.assertEqual((url, 4), (state['url'], state['offset']))
+        self.assertEqual(4, self.client.get(url).json()['offset'])
+        self.assertEqual(200, self.send(url, 4, b'cise').status_code)
+        self.assertTrue(Exercise.objects.exists())
+
+    def test_lost_staging_data(self):
+        url = self.start().json()['url']
+        self.send(url, 0, b'exer')
+        upload = ExerciseUpload.objects.get()
+        path = Exercise._meta.get_field('file').storage.path(upload.staging_name)
+        # only part of the chunk made it to disk
+        with open(path, 'r+b') as staging:
+            staging.truncate(2)
+        response = self.send(url, 4, b'cise')
+        self.assertEqual((409, 2), (response.status_code, response.json()['offset']))
+        self.assertEqual(2, self.client.get(url).json()['offset'])
+        self.send(url, 2, b'erci')
+        self.assertEqual(200, self.send(url, 6, b'se').status_code)
+        with Exercise.objects.get().file.open() as file:
+            self.assertEqual(self.content, file.read())
+
+        # the staging file is gone altogether
+        url = self.start().json()['url']
+        self.send(url, 0, b'exer')
+        os.remove(Exercise._meta.get_field('file').storage.path(ExerciseUpload.objects.get().staging_name))
+        self.assertEqual(0, self.send(url, 4, b'cise').json()['offset'])
+
+    def test_finished_by_another_request(self):
+        url = self.start().json()['url']
+        self.send(url, 0, b'exer')
+
+        def append_chunk_and_finish_elsewhere(*args):
+            upload = append_chunk(*args)
+            # a retry of the same chunk gets to finish the upload first
+            finish_upload(upload)
+            return upload
+
+        with mock.patch('assignments.views.append_chunk', append_chunk_and_finish_elsewhere):
+            self.assertEqual(404, self.send(url, 4, b'cise').status_code)
+        self.assertEqual(1, Exercise.objects.count())
+
+    def test_size_limits(self):
+        self.assertEqual(413, self.start(size=2 * 1024 * 1024).status_code)
+        url = self.start().json()['url']
+        self.assertEqual(413, self.send(url, 0, b'exercise').status_code)  # larger than a chunk
+        self.send(url, 0, b'exer')
+        self.assertEqual(413, self.send(url, 4, b'cise!').status_code)
+
+    def test_checksum_mismatch(self):
+        url = self.start().json()['url']
+        self.send(url, 0, b'exer')
+        self.assertEqual(422, self.send(url, 4, b'CISE').status_code)
+        self.assertFalse(Exercise.objects.exists())
+        self.assertFalse(ExerciseUpload.objects.exists())
+
+    def test_other_students_upload(self):
+        url = self.start().json()['url']
+        other = User.objects.create_user(username='OTHER')
+        other.groups.add(Group.objects.get(name='students'))
+        self.client.force_login(other)
+        self.assertEqual(404, self.send(url, 0, b'exer').status_code)
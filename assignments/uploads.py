@@ -0,0 +1,155 @@
+"""
+Resumable chunked uploads of exercises.
+
+The client starts an upload with the file's name, size and sha256, and sends the file CHUNK_SIZE bytes at a time,
+each chunk with the offset it starts at. The chunks are appended to a staging file. The offset the server has
+reached can be asked for at any time, so an interrupted upload continues from there instead of starting over. When
+the last chunk is in, the checksum is verified and the staging file is moved into place as the exercise's file.
+
+The size is checked against the course's limit when the upload is started, and every chunk against the size before
+its body is read, so nothing that would be rejected is written to disk. Plain form uploads are held to the same limit
+by SizeLimitUploadHandler.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import transaction
+from django.utils import timezone
+
+from assignments.models import Exercise, ExerciseUpload
+
+READ_SIZE = 64 * 1024
+CHECKSUM = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadError(Exception):
+    """A rejected upload request, status is the HTTP status to answer it with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """
+    Stops a multipart upload with a file larger than limit bytes before the file is handed to the handlers that write
+    it to disk. A request whose Content-Length is already too large is stopped when its file starts, so the body is not
+    read any further. too_large tells whether the upload was stopped.
+    """
+    # room for the boundaries, headers and other fields of the form around the file
+    FORM_OVERHEAD = 64 * 1024
+
+    def __init__(self, limit, request=None):
+        super().__init__(request)
+        self.limit = limit
+        self.too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.too_large = content_length > self.limit + self.FORM_OVERHEAD
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.too_large:
+            raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limit:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def _staging_path(upload):
+    return Exercise._meta.get_field('file').storage.path(upload.staging_name)
+
+
+def start_upload(course, student, filename, size, checksum):
+    """Returns the student's unfinished upload of the same file if there is one, so it is resumed, or a new upload"""
+    if size > course.max_exercise_upload_size:
+        raise UploadError(f'Filen er større enn {course.max_exercise_upload_mb} MB', status=413)
+    if size <= 0:
+        raise UploadError('Filen er tom')
+    if not CHECKSUM.fullmatch(checksum):
+        raise UploadError('Ugyldig sjekksum')
+    filename = os.path.basename(filename.replace('\\', '/'))[:255]
+    if not filename:
+        raise UploadError('Filen mangler navn')
+    fields = {'course': course, 'student': student, 'filename': filename, 'size': size, 'checksum': checksum}
+    return ExerciseUpload.objects.filter(**fields).first() or ExerciseUpload.objects.create(**fields)
+
+
+def append_chunk(upload, offset, length, stream):
+    """Appends length bytes read from stream to the upload at offset, returns the updated upload"""
+    if length > ExerciseUpload.CHUNK_SIZE:
+        raise UploadError(f'Bitene kan ikke være større enn {ExerciseUpload.CHUNK_SIZE} bytes', status=413)
+    if offset + length > upload.size:
+        raise UploadError('Mer data enn filens størrelse', status=413)
+
+    with transaction.atomic():
+        # locked, so two requests with the same chunk can not both append it
+        upload = ExerciseUpload.objects.select_for_update().get(pk=upload.pk)
+        path = _staging_path(upload)
+        staged = os.path.getsize(path) if os.path.exists(path) else 0
+        if staged < upload.received:
+            # a write was lost, or the staging file was removed or is on another instance. Appending at received would
+            # pad the file with zeros, so the client is sent back to the data that is really there
+            upload.received = staged
+        elif offset != upload.received:
+            raise UploadError(f'Forventet offset {upload.received}', status=409)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as staging:
+                # drops whatever a chunk that was cut off half way wrote
+                staging.truncate(offset)
+                remaining = length
+                while remaining:
+                    data = stream.read(min(remaining, READ_SIZE))
+                    if not data:
+                        raise UploadError('Biten ble avbrutt')
+                    staging.write(data)
+                    remaining -= len(data)
+            upload.received = offset + length
+        upload.updated = timezone.now()
+        upload.save(update_fields=['received', 'updated'])
+    if upload.received != offset + length:
+        # after the commit, so the rewound offset is kept
+        raise UploadError(f'Forventet offset {upload.received}', status=409)
+    return upload
+
+
+def finish_upload(upload):
+    """
+    Verifies the checksum of a complete upload and moves it into place as an Exercise, which is returned. Raises
+    ExerciseUpload.DoesNotExist if another request has finished the upload already.
+    """
+    with transaction.atomic():
+        # locked, so a retried last chunk waits for the request finishing the upload and then finds it gone
+        upload = ExerciseUpload.objects.select_for_update().get(pk=upload.pk)
+        path = _staging_path(upload)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as staging:
+            for block in iter(lambda: staging.read(READ_SIZE), b''):
+                digest.update(block)
+        corrupt = digest.hexdigest() != upload.checksum
+        if corrupt:
+            upload.delete()
+            os.remove(path)
+        else:
+            exercise = Exercise(course=upload.course, student=upload.student)
+            storage = exercise.file.storage
+            name = storage.get_available_name(exercise.file.field.generate_filename(exercise, upload.filename))
+            os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+            # a rename, the file is not copied
+            os.replace(path, storage.path(name))
+            exercise.file.name = name
+            exercise.save()
+            upload.delete()
+    if corrupt:
+        # after the commit, so the upload stays deleted
+        raise UploadError('Filen ble ødelagt under opplastingen, last den opp på nytt', status=422)
+    return exercise
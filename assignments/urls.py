@@ -1,9 +1,13 @@
 from django.urls import path
 
-from assignments.views import UploadExercise, CourseExerciseList, StudentExerciseList
+from assignments.views import UploadExercise, CourseExerciseList, StudentExerciseList, StartExerciseUpload, \
+    ExerciseUploadChunk, ClaimNextExercise
 
 urlpatterns = [
     path('<str:slug>/upload/', UploadExercise.as_view(), name='upload_exercise'),
+    path('<str:slug>/upload/chunked/', StartExerciseUpload.as_view(), name='start_exercise_upload'),
+    path('upload-chunks/<str:token>/', ExerciseUploadChunk.as_view(), name='exercise_upload_chunk'),
     path('<str:slug>/uploads/', CourseExerciseList.as_view(), name='exercise_uploads_list'),
+    path('<str:slug>/uploads/claim/', ClaimNextExercise.as_view(), name='claim_next_exercise'),
     path('<str:slug>/uploaded/', StudentExerciseList.as_view(), name='student_exercise_uploads_list'),
 ]
@@ -2,14 +2,20 @@ from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.db.models import Q
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse, Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import CreateView, UpdateView, TemplateView
+from django.views.generic.base import View
 
 from assignments.forms import ExerciseFeedbackForm
-from assignments.models import Exercise
-from booking.models import Course
+from assignments.models import Exercise, ExerciseUpload
+from assignments.review_queue import claim_next_exercise, release_claims
+from assignments.uploads import UploadError, SizeLimitUploadHandler, start_upload, append_chunk, finish_upload
+from itsBooking.extensions.conditional import conditional_course_page
+from itsBooking.extensions.courses import get_course
 from itsBooking.extensions.mixins import UserInGroupMixin
 
 
@@ -19,12 +25,17 @@ class CourseExerciseList(UserInGroupMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
+        course = get_course(self.request, self.kwargs['slug'])
         context.update({'course': course,
                         'form': ExerciseFeedbackForm(),
-                        'exercise_list': course.exercise_uploads.all()})
+                        'exercise_list': course.exercise_uploads.select_related('student', 'feedback_by',
+                                                                                'claimed_by')})
         return context
 
+    @method_decorator(conditional_course_page)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def post(self, request, *args, **kwargs):
         exercise_pk = self.request.POST['exercise_pk']
         # handle reviews through a separate view
@@ -41,6 +52,7 @@ class ExerciseFeedback(UserPassesTestMixin, UpdateView):
     def form_valid(self, form):
         exercise = form.save(commit=False)
         exercise.feedback_by = self.request.user
+        exercise.claimed_by = exercise.claimed_until = None
         exercise.save()
         messages.success(self.request, 'Tilbakemelding vellykket!')
         return super().form_valid(form)
@@ -56,6 +68,41 @@ class ExerciseFeedback(UserPassesTestMixin, UpdateView):
         return self.request.user.groups.filter(Q(name='assistants') | Q(name='course_coordinators'))
 
 
+class ClaimNextExercise(UserInGroupMixin, View):
+    """
+    Claims the oldest unreviewed exercise nobody is reviewing for the assistant, see assignments.review_queue, and
+    sends them to its review form, or answers with it as JSON. release releases the assistant's claim instead.
+    """
+    allowed_groups = ('assistants', 'course_coordinators')
+
+    def post(self, request, slug):
+        course = get_course(request, slug)
+        if 'release' in request.POST:
+            released = release_claims(course, request.user)
+            if request.is_ajax():
+                return JsonResponse({'released': released})
+            return HttpResponseRedirect(reverse('exercise_uploads_list', kwargs={'slug': slug}))
+
+        exercise = claim_next_exercise(course, request.user)
+        if exercise is None:
+            if request.is_ajax():
+                return JsonResponse({'exercise': None})
+            messages.info(request, 'Det er ingen flere øvinger å vurdere')
+            return HttpResponseRedirect(reverse('exercise_uploads_list', kwargs={'slug': slug}))
+
+        review_url = reverse('exercise_uploads_list', kwargs={'slug': slug}) + f'?review={exercise.pk}#{exercise.pk}'
+        if request.is_ajax():
+            return JsonResponse({
+                'exercise': exercise.pk,
+                'filename': exercise.filename,
+                'file': exercise.file.url,
+                'claimed_until': exercise.claimed_until.isoformat(),
+                'review_url': review_url,
+            })
+        return HttpResponseRedirect(review_url)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
 class UploadExercise(SuccessMessageMixin, UserInGroupMixin, CreateView):
     model = Exercise
     fields = ('file',)
@@ -63,27 +110,104 @@ class UploadExercise(SuccessMessageMixin, UserInGroupMixin, CreateView):
     success_message = '%(file)s successfully uploaded to %(course)s!'
     allowed_groups = ('students',)
 
+    def dispatch(self, request, *args, **kwargs):
+        # the handler has to be in place before the csrf check parses the body
+        self.size_limit = SizeLimitUploadHandler(get_course(request, kwargs['slug']).max_exercise_upload_size, request)
+        request.upload_handlers.insert(0, self.size_limit)
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
+        course = get_course(self.request, self.kwargs['slug'])
         context.update({'course': course})
         return context
 
     def get_form(self):
         form = super().get_form()
         form.fields['file'].widget.attrs['onchange'] = 'display_filename(this)'
+        if self.size_limit.too_large:
+            course = get_course(self.request, self.kwargs['slug'])
+            form.errors['file'] = form.error_class([f'Filen er større enn {course.max_exercise_upload_mb} MB'])
         return form
 
     def form_valid(self, form):
         exercise = form.save(commit=False)
         exercise.student = self.request.user
-        exercise.course = get_object_or_404(Course, slug=self.kwargs['slug'])
+        exercise.course = get_course(self.request, self.kwargs['slug'])
+        if exercise.file.size > exercise.course.max_exercise_upload_size:
+            form.add_error('file', f'Filen er større enn {exercise.course.max_exercise_upload_mb} MB')
+            return self.form_invalid(form)
         exercise.save()
         # needed for the success message
         form.cleaned_data['course'] = exercise.course
         return super().form_valid(form)
 
 
+def _upload_state(upload):
+    return {
+        'url': reverse('exercise_upload_chunk', kwargs={'token': upload.token}),
+        'offset': upload.received,
+        'size': upload.size,
+        'chunk_size': ExerciseUpload.CHUNK_SIZE,
+    }
+
+
+class StartExerciseUpload(UserInGroupMixin, View):
+    """Starts a chunked upload of an exercise, or resumes the student's unfinished upload of the same file"""
+    allowed_groups = ('students',)
+
+    def post(self, request, slug):
+        course = get_course(request, slug)
+        try:
+            size = int(request.POST.get('size', ''))
+        except ValueError:
+            return JsonResponse({'error': 'size må være et heltall'}, status=400)
+        try:
+            upload = start_upload(
+                course, request.user, request.POST.get('filename', ''), size, request.POST.get('checksum', '')
+            )
+        except UploadError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        return JsonResponse(_upload_state(upload))
+
+
+class ExerciseUploadChunk(UserInGroupMixin, View):
+    """
+    GET returns how far the upload has come, POST appends the chunk in the body at the offset given by the
+    Upload-Offset header. The exercise is created when the last chunk is in.
+    """
+    allowed_groups = ('students',)
+
+    def get(self, request, token):
+        upload = get_object_or_404(ExerciseUpload, token=token, student=request.user)
+        return JsonResponse(_upload_state(upload))
+
+    def post(self, request, token):
+        upload = get_object_or_404(ExerciseUpload, token=token, student=request.user)
+        try:
+            offset = int(request.META.get('HTTP_UPLOAD_OFFSET', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset og Content-Length må oppgis'}, status=400)
+        try:
+            # the body is read from the request stream, never loaded whole into memory
+            upload = append_chunk(upload, offset, length, request)
+            if upload.received < upload.size:
+                return JsonResponse(_upload_state(upload))
+            exercise = finish_upload(upload)
+        except ExerciseUpload.DoesNotExist:
+            # finished by another request with the same chunk while this one waited for the upload's lock
+            raise Http404()
+        except UploadError as error:
+            if error.status == 409:
+                # the offset to continue from may have been rewound
+                upload.refresh_from_db()
+            return JsonResponse({'error': str(error), **_upload_state(upload)}, status=error.status)
+        messages.success(request, UploadExercise.success_message % {'file': exercise.filename,
+                                                                     'course': exercise.course})
+        return JsonResponse({'done': True, 'redirect': UploadExercise.success_url})
+
+
 class StudentExerciseList(UserInGroupMixin, TemplateView):
     template_name = 'assignments/exercise_list.html'
     allowed_groups = ('students',)
@@ -93,8 +217,12 @@ class StudentExerciseList(UserInGroupMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
+        course = get_course(self.request, self.kwargs['slug'])
         context.update({'course': course,
                         'form': ExerciseFeedbackForm(),
                         'exercise_list': course.exercise_uploads.filter(student=self.request.user)})
         return context
+
+    @method_decorator(conditional_course_page)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
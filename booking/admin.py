@@ -1,13 +1,94 @@
+from django import forms
 from django.contrib import admin
-from .models import Course, BookingInterval
+from .models import Course, BookingInterval, BookingTicket
+from .rollover import clone_schedule, clear_semester
+from itsBooking.extensions.admin import PaginatedTabularInline, action_form, action_form_data
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp
+
+
+class CourseStudentInline(PaginatedTabularInline):
+    model = Course.students.through
+    autocomplete_fields = ('user', )
+    verbose_name = 'student'
+    verbose_name_plural = 'studenter'
+    extra = 1
+
+
+class CourseAssistantInline(PaginatedTabularInline):
+    model = Course.assistants.through
+    autocomplete_fields = ('user', )
+    verbose_name = 'studentassistent'
+    verbose_name_plural = 'studentassistenter'
+    extra = 1
+
+
+class ScheduleSourceForm(forms.Form):
+    source = forms.ModelChoiceField(Course.objects.all(), label='Kopier ukeplanen til')
+
+
+def copy_schedule(modeladmin, request, queryset):
+    form = ScheduleSourceForm(action_form_data(request))
+    response = action_form(modeladmin, request, queryset, form, 'Kopier ukeplan')
+    if response is not None:
+        return response
+    source = form.cleaned_data['source']
+    updated = clone_schedule(source, queryset.values_list('pk', flat=True))
+    modeladmin.message_user(request, f'Kopierte ukeplanen til {source} til {updated} saltider')
+
+
+copy_schedule.short_description = 'Kopier ukeplanen til et emne til valgte emner'
+
+
+def new_semester(modeladmin, request, queryset):
+    response = action_form(
+        modeladmin, request, queryset, forms.Form(action_form_data(request)), 'Nytt semester',
+        warning='Alle reservasjoner, påmeldte studasser og innleveringer i emnene blir slettet.',
+    )
+    if response is not None:
+        return response
+    deleted = clear_semester(queryset.values_list('pk', flat=True))
+    modeladmin.message_user(request, 'Slettet ' + ', '.join(f'{count} {table}' for table, count in deleted.items()))
+
+
+new_semester.short_description = 'Nullstill valgte emner for et nytt semester'
 
 
 class CourseAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("course_code",)}
+    list_display = ('title', 'course_code', 'course_coordinator', 'rush_mode')
+    list_editable = ('rush_mode', )
+    list_select_related = ('course_coordinator', )
+    search_fields = ('title', 'course_code')
+    # members are edited a page at a time in the inlines, a select widget would load every user
+    exclude = ('students', 'assistants')
+    autocomplete_fields = ('course_coordinator', )
+    inlines = (CourseStudentInline, CourseAssistantInline)
+    actions = (copy_schedule, new_semester)
+
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        # the inlines save the memberships as rows, which sends no m2m_changed
+        changed = formset.new_objects + [membership for membership, _ in formset.changed_objects] \
+            + formset.deleted_objects
+        if changed:
+            bump_course_stamp(form.instance.pk)
+        for membership in changed:
+            bump_user_stamp(membership.user_id)
 
 
 class BookingIntervalAdmin(admin.ModelAdmin):
     readonly_fields = ('nk', 'day', 'start', 'end', 'course', )
+    autocomplete_fields = ('assistants', )
+    list_display = ('__str__', 'max_available_assistants')
+    list_filter = ('course', 'day')
+    list_select_related = ('course', )
+
+
+class BookingTicketAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'booking_interval', 'slot_index', 'status', 'created', 'processed')
+    list_filter = ('status', 'course')
+    list_select_related = ('student', 'course', 'booking_interval__course')
+    readonly_fields = ('course', 'booking_interval', 'student', 'reservation', )
 
 
 class ReservationAdmin(admin.ModelAdmin):
@@ -16,4 +97,5 @@ class ReservationAdmin(admin.ModelAdmin):
 
 admin.site.register(Course, CourseAdmin)
 admin.site.register(BookingInterval, BookingIntervalAdmin)
+admin.site.register(BookingTicket, BookingTicketAdmin)
 # admin.site.register(Reservation, ReservationAdmin)
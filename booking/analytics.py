@@ -0,0 +1,137 @@
+"""
+Occupancy analytics for course coordinators.
+
+A course's reservations, archived and current, are loaded into a weeks × days × slots matrix once, and every
+statistic is computed from it with numpy instead of looping over reservations. The result is cached under the
+course's version stamp, so it is only recomputed after the course's reservations or booking intervals change.
+"""
+import calendar
+from datetime import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count
+
+from booking.models import Course, ReservationConnection, ArchivedReservation, ReservationSlot
+from itsBooking.extensions.versioning import course_stamp, versioned_key
+
+SLOTS_PER_DAY = (Course.CLOSE_BOOKING_TIME - Course.OPEN_BOOKING_TIME) * 60 // Course.RESERVATION_LENGTH
+NUM_LISTED_SLOTS = 5
+
+
+def slot_of_day(start):
+    return ((start.hour - Course.OPEN_BOOKING_TIME) * 60 + start.minute) // Course.RESERVATION_LENGTH
+
+
+def load_reservations(course):
+    """
+    Returns an array with a (week, day, slot of day, assistant id) row for each of the course's reservations.
+    Weeks are the ordinal of the week's monday.
+    """
+    archived = ArchivedReservation.objects.filter(course=course).order_by().values_list(
+        'week_start', 'day', 'start', 'assistant_id'
+    )
+    current = ReservationConnection.objects.filter(booking_interval__course=course).order_by().values_list(
+        'week_start', 'booking_interval__day', 'booking_interval__start', 'slot_index', 'assistant_id'
+    )
+    rows = [
+        (week_start.toordinal(), day, slot_of_day(start), assistant_id or 0)
+        for week_start, day, start, assistant_id in archived.iterator()
+    ]
+    rows.extend(
+        (week_start.toordinal(), day, slot_of_day(start) + slot_index, assistant_id)
+        for week_start, day, start, slot_index, assistant_id in current
+    )
+    return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+
+def load_capacity(course):
+    """Returns a days × slots matrix with the number of assistants available for each slot"""
+    capacity = np.zeros((Course.NUM_DAYS_IN_WORK_WEEK, SLOTS_PER_DAY), dtype=np.int64)
+    booking_intervals = course.booking_intervals.order_by().annotate(
+        assistant_count=Count('assistants')
+    ).values_list('day', 'start', 'assistant_count')
+    for day, start, assistant_count in booking_intervals:
+        first = slot_of_day(start)
+        capacity[day, first:first + Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL] = assistant_count
+    return capacity
+
+
+def compute_occupancy(reservations, capacity):
+    """
+    Computes the occupancy statistics from the arrays returned by load_reservations and load_capacity.
+    Assistants only sign up for the current week, so capacity is taken to be the same for every week.
+    """
+    weeks, week_index = np.unique(reservations[:, 0], return_inverse=True)
+    num_weeks = max(len(weeks), 1)
+
+    booked = np.zeros((num_weeks,) + capacity.shape, dtype=np.int64)
+    np.add.at(booked, (week_index, reservations[:, 1], reservations[:, 2]), 1)
+
+    total_booked = booked.sum(axis=0)
+    total_capacity = capacity * num_weeks
+    utilization = np.divide(total_booked, total_capacity, out=np.zeros(capacity.shape), where=total_capacity > 0)
+
+    # slots that are fully booked some weeks and empty others are the ones students are least reliable about
+    mean_booked = booked.mean(axis=0)
+    variation = np.divide(booked.std(axis=0), mean_booked, out=np.zeros(capacity.shape), where=mean_booked > 0)
+
+    assistant_ids, assistant_counts = np.unique(reservations[reservations[:, 3] > 0, 3], return_counts=True)
+    order = np.argsort(-assistant_counts, kind='stable')
+
+    return {
+        'num_weeks': len(weeks),
+        'utilization': utilization,
+        'total_utilization': total_booked.sum() / total_capacity.sum() if total_capacity.any() else 0.0,
+        'peak_slots': _top_slots(mean_booked),
+        'volatile_slots': _top_slots(variation),
+        'assistant_load': list(zip(assistant_ids[order].tolist(), assistant_counts[order].tolist())),
+    }
+
+
+def _top_slots(matrix):
+    """(day, slot of day, value) for the NUM_LISTED_SLOTS highest values of a days × slots matrix, skipping zeros"""
+    flat = np.argsort(-matrix, axis=None, kind='stable')[:NUM_LISTED_SLOTS]
+    days, slots = np.unravel_index(flat, matrix.shape)
+    return [(day, slot, matrix[day, slot]) for day, slot in zip(days.tolist(), slots.tolist()) if matrix[day, slot] > 0]
+
+
+def course_occupancy(course):
+    """Template friendly occupancy statistics for the course, cached until the course changes"""
+    key = versioned_key(f'occupancy:{course.pk}', course_stamp(course.pk))
+    occupancy = cache.get(key)
+    if occupancy is None:
+        occupancy = _describe(compute_occupancy(load_reservations(course), load_capacity(course)))
+        cache.set(key, occupancy, None)
+    return occupancy
+
+
+def _slot_start(slot):
+    return ReservationSlot.start_time(time(Course.OPEN_BOOKING_TIME), slot)
+
+
+def _describe(stats):
+    def describe_slots(slots, unit):
+        return [
+            {'day': calendar.day_name[day], 'start': _slot_start(slot), unit: round(float(value), 2)}
+            for day, slot, value in slots
+        ]
+
+    names = User.objects.in_bulk([assistant_id for assistant_id, _ in stats['assistant_load']])
+    num_weeks = max(stats['num_weeks'], 1)
+    return {
+        'num_weeks': stats['num_weeks'],
+        'total_utilization': round(float(stats['total_utilization']) * 100),
+        # one row per slot of the day, one column per weekday
+        'heatmap': [
+            {'start': _slot_start(slot), 'cells': stats['utilization'][:, slot].round(2).tolist()}
+            for slot in range(SLOTS_PER_DAY)
+        ],
+        'peak_slots': describe_slots(stats['peak_slots'], 'mean_booked'),
+        'volatile_slots': describe_slots(stats['volatile_slots'], 'variation'),
+        'assistant_load': [
+            {'assistant': names.get(assistant_id), 'reservations': count, 'per_week': round(count / num_weeks, 1)}
+            for assistant_id, count in stats['assistant_load']
+        ],
+    }
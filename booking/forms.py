@@ -1,13 +1,32 @@
 from django import forms
 
-from booking.models import ReservationInterval
+from booking.models import BookingInterval, Course, ReservationSlot
 from itsBooking.templatetags.helpers import get_available_reservation_slots
 
 
 class ReservationConnectionForm(forms.Form):
-    reservation_pk = forms.IntegerField(widget=forms.HiddenInput())
+    booking_interval_nk = forms.CharField(widget=forms.HiddenInput())
+    reservation_index = forms.IntegerField(
+        widget=forms.HiddenInput(),
+        min_value=0,
+        max_value=Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL - 1,
+    )
+
+    def __init__(self, *args, student=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the student's own hold on the slot does not make it unavailable to them
+        self.student = student
 
     def clean(self):
-        reservation = ReservationInterval.objects.get(pk=self.cleaned_data['reservation_pk'])
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        try:
+            booking_interval = BookingInterval.objects.get(nk=cleaned_data['booking_interval_nk'])
+        except BookingInterval.DoesNotExist:
+            raise forms.ValidationError('This reservation interval does not exist')
+        reservation = ReservationSlot(booking_interval, cleaned_data['reservation_index'], student=self.student)
         if get_available_reservation_slots(reservation) <= 0:
             raise forms.ValidationError('No assistants available for this reservation interval')
+        cleaned_data['reservation'] = reservation
+        return cleaned_data
@@ -0,0 +1,135 @@
+"""
+iCalendar (RFC 5545) feeds of a user's schedule.
+
+Students get their reservations, assistants get their booking intervals as weekly recurring shifts plus an event
+for every student that has reserved time with them. Each role's feed is built from a single joined query, and
+the lines are generated one at a time so the response can be streamed.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import FilteredRelation, Q
+
+from booking.models import BookingInterval, ReservationConnection, ReservationSlot, current_week_start
+
+CALENDAR_TIMEZONE = 'Europe/Oslo'
+
+# Central European time with the EU daylight saving rules, so clients do not have to know the zone
+VTIMEZONE = [
+    'BEGIN:VTIMEZONE',
+    f'TZID:{CALENDAR_TIMEZONE}',
+    'BEGIN:DAYLIGHT',
+    'TZOFFSETFROM:+0100',
+    'TZOFFSETTO:+0200',
+    'TZNAME:CEST',
+    'DTSTART:19700329T020000',
+    'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+    'END:DAYLIGHT',
+    'BEGIN:STANDARD',
+    'TZOFFSETFROM:+0200',
+    'TZOFFSETTO:+0100',
+    'TZNAME:CET',
+    'DTSTART:19701025T030000',
+    'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+]
+
+
+def escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Splits a content line into lines of at most 75 octets, continued lines start with a space"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:  # do not split a multi-byte character
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _local(day, at):
+    return f';TZID={CALENDAR_TIMEZONE}:{datetime.combine(day, at):%Y%m%dT%H%M%S}'
+
+
+def _event(uid, stamp, day, start, end, summary, description='', rrule=None):
+    yield 'BEGIN:VEVENT'
+    yield f'UID:{uid}'
+    yield f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}'
+    yield 'DTSTART' + _local(day, start)
+    yield 'DTEND' + _local(day, end)
+    if rrule:
+        yield f'RRULE:{rrule}'
+    yield f'SUMMARY:{escape(summary)}'
+    if description:
+        yield f'DESCRIPTION:{escape(description)}'
+    yield 'END:VEVENT'
+
+
+def _full_name(first_name, last_name, username):
+    return f'{first_name} {last_name}'.strip() or username
+
+
+def student_events(user_id, stamp):
+    reservations = ReservationConnection.objects.filter(student_id=user_id).order_by().values_list(
+        'pk', 'week_start', 'slot_index', 'booking_interval__day', 'booking_interval__start',
+        'booking_interval__course__course_code', 'booking_interval__course__title',
+        'assistant__first_name', 'assistant__last_name', 'assistant__username',
+    )
+    for pk, week_start, slot_index, day, start, course_code, title, *assistant in reservations.iterator():
+        yield from _event(
+            f'reservation-{pk}@itsbooking', stamp, week_start + timedelta(days=day),
+            ReservationSlot.start_time(start, slot_index), ReservationSlot.start_time(start, slot_index + 1),
+            f'{course_code} studass', f'{title}\nStudentassistent: {_full_name(*assistant)}',
+        )
+
+
+def assistant_events(user_id, stamp):
+    # every shift, joined with the reservations students have made with this assistant (if any)
+    shifts = BookingInterval.objects.filter(assistants=user_id).annotate(
+        own_connections=FilteredRelation('connections', condition=Q(connections__assistant=user_id)),
+    ).order_by('pk', 'own_connections__week_start', 'own_connections__slot_index').values_list(
+        'pk', 'day', 'start', 'end', 'course__course_code', 'course__title',
+        'own_connections__pk', 'own_connections__week_start', 'own_connections__slot_index',
+        'own_connections__student__first_name', 'own_connections__student__last_name',
+        'own_connections__student__username',
+    )
+    week_start = current_week_start()
+    previous_shift = None
+    for pk, day, start, end, course_code, title, connection, reserved_week, slot_index, *student in shifts.iterator():
+        if pk != previous_shift:
+            previous_shift = pk
+            yield from _event(
+                f'shift-{pk}@itsbooking', stamp, week_start + timedelta(days=day), start, end,
+                f'{course_code} saltid', title, rrule='FREQ=WEEKLY',
+            )
+        if connection is not None:
+            yield from _event(
+                f'reservation-{connection}@itsbooking', stamp, reserved_week + timedelta(days=day),
+                ReservationSlot.start_time(start, slot_index), ReservationSlot.start_time(start, slot_index + 1),
+                f'{course_code}: {_full_name(*student)}', title,
+            )
+
+
+def feed(user_id, stamp):
+    """Generates the folded lines of the user's calendar. stamp is the (UTC) time the feed was last modified"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//itsBooking//Saltider//NO',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:Saltider',
+    ] + VTIMEZONE
+    for line in lines:
+        yield fold(line)
+    for line in student_events(user_id, stamp):
+        yield fold(line)
+    for line in assistant_events(user_id, stamp):
+        yield fold(line)
+    yield fold('END:VCALENDAR')
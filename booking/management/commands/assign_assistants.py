@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.models import Course
+from booking.scheduling import assign_assistants
+
+
+class Command(BaseCommand):
+    help = 'Assigns assistants to the booking intervals of a course from their submitted availability'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_code')
+        parser.add_argument('--max-per-assistant', type=int, default=None,
+                            help='Max number of booking intervals per assistant. Defaults to an even share')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(course_code=options['course_code'])
+        except Course.DoesNotExist:
+            raise CommandError(f'No course with course code {options["course_code"]}')
+        assignment = assign_assistants(course, options['max_per_assistant'])
+        seats = sum(len(assistants) for assistants in assignment.values())
+        self.stdout.write(f'Filled {seats} seats in {len(assignment)} booking intervals of {course}')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.models import Course
+from booking.rollover import clone_schedule, clear_semester
+
+
+class Command(BaseCommand):
+    help = 'Prepares courses for a new semester: copies the weekly schedule of one course onto them and/or clears ' \
+           'their reservations, assistant registrations and exercises.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_codes', nargs='*', help='The courses, all courses with --all')
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument('--schedule-from', metavar='COURSE_CODE',
+                            help='Course whose number of assistants per booking interval is copied')
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete the courses' reservations, registrations and exercises")
+
+    def handle(self, *args, **options):
+        if not options['schedule_from'] and not options['clear']:
+            raise CommandError('Nothing to do, give --schedule-from and/or --clear')
+        courses = Course.objects.all()
+        if not options['all']:
+            if not options['course_codes']:
+                raise CommandError('Give the course codes of the courses, or --all')
+            courses = courses.filter(course_code__in=options['course_codes'])
+        course_ids = list(courses.values_list('pk', flat=True))
+
+        if options['schedule_from']:
+            try:
+                source = Course.objects.get(course_code=options['schedule_from'])
+            except Course.DoesNotExist:
+                raise CommandError(f'No course {options["schedule_from"]}')
+            updated = clone_schedule(source, course_ids)
+            self.stdout.write(f'Copied the schedule of {source.course_code} to {updated} booking intervals')
+        if options['clear']:
+            deleted = clear_semester(course_ids)
+            self.stdout.write('Cleared ' + ', '.join(f'{count} {table}' for table, count in deleted.items()))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.queue import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Makes the reservations queued for courses in rush mode, in the order they were requested. ' \
+           'Run a single instance of it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help='Exit after this many seconds, for a cron job that starts the next run')
+
+    def handle(self, *args, **options):
+        deadline = None if options['max_seconds'] is None else time.monotonic() + options['max_seconds']
+        while True:
+            processed = process_queue(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} booking tickets')
+            if options['once'] or deadline is not None and time.monotonic() >= deadline:
+                return
+            # drops connections that have passed CONN_MAX_AGE or broken, like a request does when it finishes
+            close_old_connections()
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import ArchivedReservation, current_week_start
+
+
+class Command(BaseCommand):
+    help = 'Moves the reservations of past weeks into the reservation archive. Run once a week.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        archived = ArchivedReservation.archive_weeks_before(current_week_start(), options['batch_size'])
+        self.stdout.write(f'Archived {archived} reservations')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import SlotHold
+from itsBooking.extensions.versioning import bump_course_stamp
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired slot holds. Run every few minutes.'
+
+    def handle(self, *args, **options):
+        deleted, course_ids = SlotHold.sweep()
+        # expired holds no longer count against availability, so the course pages have to be rendered again
+        for course_id in course_ids:
+            bump_course_stamp(course_id)
+        self.stdout.write(f'Deleted {deleted} expired slot holds')
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.15 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_auto_20190327_1825'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookinginterval',
+            index=models.Index(fields=['course', 'start'], name='booking_bi_course_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservationconnection',
+            index=models.Index(fields=['reservation_interval', 'assistant'], name='booking_rc_ri_assistant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservationinterval',
+            index=models.Index(fields=['booking_interval', 'index'], name='booking_ri_bi_index_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_booking_intervals(apps, schema_editor):
+    """
+    Copies every booking interval into the new table, which numbers them with an integer primary key,
+    and points their reservation intervals and assistants at the copy.
+    """
+    BookingInterval = apps.get_model('booking', 'BookingInterval')
+    NewBookingInterval = apps.get_model('booking', 'NewBookingInterval')
+    ReservationInterval = apps.get_model('booking', 'ReservationInterval')
+    db_alias = schema_editor.connection.alias
+
+    for booking_interval in BookingInterval.objects.using(db_alias).order_by('course_id', 'day', 'start'):
+        new_booking_interval = NewBookingInterval.objects.using(db_alias).create(
+            nk=booking_interval.nk,
+            course_id=booking_interval.course_id,
+            day=int(booking_interval.day),
+            start=booking_interval.start,
+            end=booking_interval.end,
+            max_available_assistants=booking_interval.max_available_assistants,
+        )
+        new_booking_interval.assistants.set(booking_interval.assistants.all())
+        ReservationInterval.objects.using(db_alias).filter(booking_interval_id=booking_interval.nk).update(
+            new_booking_interval=new_booking_interval
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Replaces the md5 natural key of BookingInterval with an integer primary key and stores the day as a small
+    integer. The booking intervals are copied into a new table, as the primary key and the foreign keys pointing
+    at it can not be converted in place.
+    """
+    # SQLite can not rename the copied table inside a transaction
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('booking', '0003_auto_20261019_1646'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewBookingInterval',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday')])),
+                ('start', models.TimeField()),
+                ('end', models.TimeField()),
+                ('max_available_assistants', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('nk', models.CharField(max_length=32, unique=True)),
+                ('assistants', models.ManyToManyField(blank=True, limit_choices_to={'groups__name': 'assistants'}, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.Course')),
+            ],
+            options={
+                'ordering': ['-course', 'day', 'start'],
+            },
+        ),
+        migrations.AddField(
+            model_name='reservationinterval',
+            name='new_booking_interval',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.NewBookingInterval'),
+        ),
+        migrations.RunPython(copy_booking_intervals, atomic=True),
+        migrations.RemoveIndex(
+            model_name='reservationinterval',
+            name='booking_ri_bi_index_idx',
+        ),
+        migrations.AlterModelOptions(
+            name='reservationinterval',
+            options={},
+        ),
+        migrations.RemoveField(
+            model_name='reservationinterval',
+            name='booking_interval',
+        ),
+        migrations.DeleteModel(
+            name='BookingInterval',
+        ),
+        migrations.RenameModel(
+            old_name='NewBookingInterval',
+            new_name='BookingInterval',
+        ),
+        migrations.RenameField(
+            model_name='reservationinterval',
+            old_name='new_booking_interval',
+            new_name='booking_interval',
+        ),
+        migrations.AlterField(
+            model_name='reservationinterval',
+            name='booking_interval',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_intervals', to='booking.BookingInterval'),
+        ),
+        migrations.AlterField(
+            model_name='bookinginterval',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_intervals', to='booking.Course'),
+        ),
+        migrations.AlterField(
+            model_name='bookinginterval',
+            name='assistants',
+            field=models.ManyToManyField(blank=True, limit_choices_to={'groups__name': 'assistants'}, related_name='setup_booking_intervals', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterModelOptions(
+            name='reservationinterval',
+            options={'ordering': ['booking_interval__day']},
+        ),
+        migrations.AddIndex(
+            model_name='reservationinterval',
+            index=models.Index(fields=['booking_interval', 'index'], name='booking_ri_bi_index_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinginterval',
+            index=models.Index(fields=['course', 'start'], name='booking_bi_course_start_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_reservations_to_slots(apps, schema_editor):
+    """
+    Points every reservation at the booking interval and slot index of its reservation interval.
+    Reservations that would break the new unique constraints (the same assistant or student twice in one slot)
+    are deleted, keeping the oldest one.
+    """
+    ReservationConnection = apps.get_model('booking', 'ReservationConnection')
+    connections = ReservationConnection.objects.using(schema_editor.connection.alias)
+
+    taken = set()
+    duplicates = []
+    rows = connections.order_by('pk').values_list(
+        'pk', 'reservation_interval__booking_interval_id', 'reservation_interval__index', 'assistant_id', 'student_id'
+    )
+    for pk, booking_interval_id, index, assistant_id, student_id in rows:
+        assistant_key = (booking_interval_id, index, 'assistant', assistant_id)
+        student_key = (booking_interval_id, index, 'student', student_id)
+        if assistant_key in taken or student_key in taken:
+            duplicates.append(pk)
+            continue
+        taken.update((assistant_key, student_key))
+        connections.filter(pk=pk).update(booking_interval_id=booking_interval_id, slot_index=index)
+    connections.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Replaces the stored ReservationInterval rows with slots computed from the booking interval.
+    Reservations now point at (booking_interval, slot_index).
+    """
+
+    dependencies = [
+        ('booking', '0004_bookinginterval_integer_pk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservationconnection',
+            name='booking_interval',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connections', to='booking.BookingInterval'),
+        ),
+        migrations.AddField(
+            model_name='reservationconnection',
+            name='slot_index',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(move_reservations_to_slots),
+        migrations.RemoveIndex(
+            model_name='reservationconnection',
+            name='booking_rc_ri_assistant_idx',
+        ),
+        migrations.AlterModelOptions(
+            name='reservationconnection',
+            options={'ordering': ['booking_interval__day', 'booking_interval__start', 'slot_index']},
+        ),
+        migrations.RemoveField(
+            model_name='reservationconnection',
+            name='reservation_interval',
+        ),
+        migrations.AlterField(
+            model_name='reservationconnection',
+            name='booking_interval',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connections', to='booking.BookingInterval'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservationconnection',
+            unique_together={('booking_interval', 'slot_index', 'assistant'), ('booking_interval', 'slot_index', 'student')},
+        ),
+        migrations.DeleteModel(
+            name='ReservationInterval',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.1.15 on 2026-10-19 14:54
+
+import booking.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('booking', '0005_virtual_reservation_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('day', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday')])),
+                ('start', models.TimeField()),
+                ('assistant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reservations', to='booking.Course')),
+                ('student', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservationconnection',
+            name='week_start',
+            field=models.DateField(db_index=True, default=booking.models.current_week_start),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservationconnection',
+            unique_together={('booking_interval', 'slot_index', 'week_start', 'student'), ('booking_interval', 'slot_index', 'week_start', 'assistant')},
+        ),
+        migrations.AddIndex(
+            model_name='archivedreservation',
+            index=models.Index(fields=['course', 'week_start'], name='booking_ar_course_week_idx'),
+        ),
+    ]
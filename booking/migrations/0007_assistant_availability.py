@@ -0,0 +1,29 @@
+# Generated by Django 2.1.15 on 2026-10-19 14:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('booking', '0006_week_dated_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssistantAvailability',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('preference', models.PositiveSmallIntegerField(choices=[(1, 'Foretrekker'), (2, 'Kan'), (3, 'Ved behov')], default=2)),
+                ('assistant', models.ForeignKey(limit_choices_to={'groups__name': 'assistants'}, on_delete=django.db.models.deletion.CASCADE, related_name='availabilities', to=settings.AUTH_USER_MODEL)),
+                ('booking_interval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availabilities', to='booking.BookingInterval')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='assistantavailability',
+            unique_together={('assistant', 'booking_interval')},
+        ),
+    ]
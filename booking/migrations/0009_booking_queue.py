@@ -0,0 +1,55 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:19
+
+import booking.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('booking', '0008_calendar_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_index', models.PositiveSmallIntegerField()),
+                ('week_start', models.DateField(default=booking.models.current_week_start)),
+                ('status', models.CharField(choices=[('queued', 'I kø'), ('confirmed', 'Bekreftet'), ('rejected', 'Avvist')], default='queued', max_length=10)),
+                ('message', models.CharField(blank=True, max_length=200)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+                ('booking_interval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.BookingInterval')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rush_mode',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='bookingticket',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_tickets', to='booking.Course'),
+        ),
+        migrations.AddField(
+            model_name='bookingticket',
+            name='reservation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.ReservationConnection'),
+        ),
+        migrations.AddField(
+            model_name='bookingticket',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bookingticket',
+            index=models.Index(fields=['status', 'course', 'id'], name='booking_ticket_queue_idx'),
+        ),
+    ]
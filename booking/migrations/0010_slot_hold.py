@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:21
+
+import booking.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('booking', '0009_booking_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_index', models.PositiveSmallIntegerField()),
+                ('week_start', models.DateField(default=booking.models.current_week_start)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('booking_interval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='booking.BookingInterval')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
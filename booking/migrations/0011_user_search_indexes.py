@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+# for the prefix searches of the user admin, username already has the index of its unique constraint
+USER_INDEXES = [
+    models.Index(fields=['first_name'], name='auth_user_first_name_idx'),
+    models.Index(fields=['last_name'], name='auth_user_last_name_idx'),
+    models.Index(fields=['email'], name='auth_user_email_idx'),
+]
+
+
+def add_user_indexes(apps, schema_editor):
+    # auth's own migrations can not be changed, so the indexes are added to its table from here
+    User = apps.get_model('auth', 'User')
+    for index in USER_INDEXES:
+        schema_editor.add_index(User, index)
+
+
+def remove_user_indexes(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for index in USER_INDEXES:
+        schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('booking', '0010_slot_hold'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_user_indexes, remove_user_indexes),
+    ]
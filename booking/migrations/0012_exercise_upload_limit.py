@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='max_exercise_upload_mb',
+            field=models.PositiveIntegerField(default=20),
+        ),
+    ]
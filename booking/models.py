@@ -1,11 +1,22 @@
 import calendar
 import hashlib
-from datetime import time
+import secrets
+from datetime import time, datetime, date, timedelta
 
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group
 from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from itsBooking.db.bulk import delete_pks
+from itsBooking.extensions.versioning import bump_stamps
+
+
+def current_week_start(day=None):
+    """Returns the monday of the ISO week of day, today by default"""
+    day = day or timezone.localdate()
+    return day - timedelta(days=day.weekday())
 
 
 class Course(models.Model):
@@ -45,40 +56,51 @@ class Course(models.Model):
         on_delete=models.CASCADE,
         related_name="supervising_course",
     )
+    # reservations are queued as booking tickets and made one at a time by booking.queue, for when the whole
+    # class books at once
+    rush_mode = models.BooleanField(default=False)
+    max_exercise_upload_mb = models.PositiveIntegerField(default=20)
 
     def __str__(self):
         return self.title
 
+    @property
+    def max_exercise_upload_size(self):
+        return self.max_exercise_upload_mb * 1024 * 1024
+
     def _generate_booking_intervals(self):
         """
         generates booking intervals associated with a course. 5 2-hour intervals for every weekday
         """
+        booking_intervals = []
         for day in range(self.NUM_DAYS_IN_WORK_WEEK):
             for hour in range(self.OPEN_BOOKING_TIME,
                               self.CLOSE_BOOKING_TIME,
                               self.BOOKING_INTERVAL_LENGTH):
                 start = time(hour=hour, minute=00)
                 end = time(hour=hour + 2, minute=00)
-                self.booking_intervals.create(day=day, start=start, end=end)
+                booking_intervals.append(BookingInterval(
+                    course=self, day=day, start=start, end=end, nk=BookingInterval.generate_nk(self, day, start)
+                ))
+        BookingInterval.objects.bulk_create(booking_intervals)
 
     def save(self, **kwargs):
         if not self.slug:
             self.slug = slugify(self.course_code)
         super().save(**kwargs)
-        if not self.booking_intervals.all():
+        if not self.booking_intervals.exists():
             self._generate_booking_intervals()
 
 
 class BookingInterval(models.Model):
-    DAY_CHOICES = [(str(i), calendar.day_name[i]) for i in range(0, 5)]
+    DAY_CHOICES = [(i, calendar.day_name[i]) for i in range(0, 5)]
 
     course = models.ForeignKey(
         Course,
         related_name='booking_intervals',
         on_delete=models.CASCADE,
     )
-    day = models.CharField(
-        max_length=20,
+    day = models.PositiveSmallIntegerField(
         choices=DAY_CHOICES,
     )
     start = models.TimeField()
@@ -95,65 +117,118 @@ class BookingInterval(models.Model):
         blank=True,
         related_name='setup_booking_intervals',
     )
+    # natural key, used to look up booking intervals from the AJAX views
     nk = models.CharField(
         max_length=32,
         blank=False,
         unique=True,
-        primary_key=True,
     )
 
     class Meta:
         ordering = [
             '-course', 'day', 'start'
         ]
+        indexes = [
+            models.Index(fields=['course', 'start'], name='booking_bi_course_start_idx'),
+        ]
 
-    def _generate_reservation_intervals(self):
-        for i in range(Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL):
-            j = i + 1
-            self.reservation_intervals.add(
-                ReservationInterval.objects.create(
-                    index=i,
-                    start=time(hour=self.start.hour + (15 * i) // 60, minute=(15 * i) % 60),
-                    end=time(hour=self.start.hour + (15 * j) // 60, minute=(15 * j) % 60),
-                    booking_interval=self,
-                )
-            )
+    @staticmethod
+    def generate_nk(course, day, start):
+        return hashlib.md5(
+            f'{start}-{calendar.day_name[day]}-{course.course_code}'.encode('utf-8')
+        ).hexdigest()
 
     def save(self, **kwargs):
         if not self.nk:
-            self.nk = hashlib.md5(
-                f'{self.start}-{self.get_day_display()}-{self.course.course_code}'
-                    .encode('utf-8')).hexdigest()
+            self.nk = self.generate_nk(self.course, self.day, self.start)
         super().save(**kwargs)
-        if not self.reservation_intervals.all():
-            self._generate_reservation_intervals()
+
+    def get_reservation_slots(self):
+        return [ReservationSlot(self, index) for index in range(Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL)]
 
     def __str__(self):
         return f'{self.course.course_code} {self.get_day_display()} {self.start}-{self.end}'
 
 
-class ReservationInterval(models.Model):
-    booking_interval = models.ForeignKey(
-        BookingInterval,
-        related_name='reservation_intervals',
-        on_delete=models.CASCADE,
-    )
-    index = models.IntegerField(default=0)
-    start = models.TimeField()
-    end = models.TimeField()
+class ReservationSlot:
+    """
+    One of the RESERVATION_LENGTH minute slots of a booking interval that students make reservations for.
+    Slots are computed from their booking interval and index, only the reservations made for them are stored.
 
-    class Meta:
-        ordering = [
-            'booking_interval__day'
-        ]
+    Views that show many slots at once can pass in the slot's reservations, holds and the number of assistants in
+    the booking interval, so that rendering the slot does not cost any queries.
+    """
+
+    def __init__(self, booking_interval, index, connections=None, assistant_count=None, holds=None, student=None):
+        self.booking_interval = booking_interval
+        self.index = index
+        self.start = self.start_time(booking_interval.start, index)
+        self.end = self.start_time(booking_interval.start, index + 1)
+        self._connections = connections
+        self._assistant_count = assistant_count
+        self._holds = holds
+        # the student's own hold does not count against the slot's availability for them
+        self.student = student
+
+    @staticmethod
+    def start_time(booking_interval_start, index):
+        offset = timedelta(minutes=Course.RESERVATION_LENGTH * index)
+        return (datetime.combine(date.min, booking_interval_start) + offset).time()
+
+    @property
+    def connections(self):
+        """This week's reservations for the slot"""
+        if self._connections is None:
+            self._connections = list(self.booking_interval.connections.current_week().filter(slot_index=self.index))
+        return self._connections
+
+    @property
+    def assistant_count(self):
+        if self._assistant_count is None:
+            self._assistant_count = self.booking_interval.assistants.count()
+        return self._assistant_count
+
+    @property
+    def holds(self):
+        """This week's unexpired holds on the slot by other students"""
+        if self._holds is None:
+            holds = SlotHold.objects.active().filter(
+                booking_interval=self.booking_interval, slot_index=self.index, week_start=current_week_start()
+            )
+            if self.student is not None:
+                holds = holds.exclude(student=self.student)
+            self._holds = list(holds)
+        return self._holds
+
+    @property
+    def available_slots(self):
+        return self.assistant_count - len(self.connections) - len(self.holds)
+
+    def __str__(self):
+        return f'{self.booking_interval} {self.start}-{self.end}'
+
+
+class NoAssistantAvailable(Exception):
+    """Raised when a reservation is made for a slot where every assistant is taken"""
+
+
+class ReservationConnectionQuerySet(models.QuerySet):
+    def current_week(self):
+        return self.filter(week_start=current_week_start())
 
 
 class ReservationConnection(models.Model):
-    reservation_interval = models.ForeignKey(
-        ReservationInterval,
+    booking_interval = models.ForeignKey(
+        BookingInterval,
         on_delete=models.CASCADE,
         related_name='connections',
     )
+    slot_index = models.PositiveSmallIntegerField()
+    # monday of the week the reservation is made for
+    week_start = models.DateField(
+        default=current_week_start,
+        db_index=True,
+    )
     student = models.ForeignKey(
         User,
         limit_choices_to={'groups__name': "students"},
@@ -167,12 +242,21 @@ class ReservationConnection(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = ReservationConnectionQuerySet.as_manager()
+
+    @property
+    def slot(self):
+        return ReservationSlot(self.booking_interval, self.slot_index)
+
     def _get_available_assistant(self):
-        all_bi_assistants = self.reservation_interval.booking_interval.assistants.all()
-        reserved_assistants = User.objects.filter(student_connections__in=self.reservation_interval.connections.all())
-        available_assistants = all_bi_assistants.difference(reserved_assistants)  # all assistants minus reserved ones
-        assert available_assistants.count() > 0, 'No assistants available for this reservation interval'
-        return available_assistants[0]
+        reserved_assistants = self.booking_interval.connections.filter(
+            slot_index=self.slot_index, week_start=self.week_start
+        ).values('assistant')
+        # all assistants minus reserved ones
+        available_assistant = self.booking_interval.assistants.exclude(pk__in=reserved_assistants).order_by('pk').first()
+        if available_assistant is None:
+            raise NoAssistantAvailable('No assistants available for this reservation slot')
+        return available_assistant
 
     def save(self, **kwargs):
         if self.pk is None:  # only runs on object creation
@@ -181,6 +265,267 @@ class ReservationConnection(models.Model):
 
     class Meta:
         ordering = [
-            'reservation_interval',  # sort by day
-            'reservation_interval__start',  # then sort by start time within the day
-        ]
\ No newline at end of file
+            'booking_interval__day',  # sort by day
+            'booking_interval__start',  # then sort by start time within the day
+            'slot_index',
+        ]
+        unique_together = (
+            # an assistant can only meet one student per slot, and a student only needs one assistant
+            ('booking_interval', 'slot_index', 'week_start', 'assistant'),
+            ('booking_interval', 'slot_index', 'week_start', 'student'),
+        )
+
+
+class SlotHoldQuerySet(models.QuerySet):
+    def active(self, now=None):
+        return self.filter(expires_at__gt=now or timezone.now())
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+
+class SlotHold(models.Model):
+    """
+    A slot held for a student while they confirm their reservation, which counts against the slot's availability
+    until it expires. Expired holds are ignored, and deleted now and then by ./manage.py sweep_slot_holds.
+    """
+    DURATION = timedelta(minutes=2)
+
+    booking_interval = models.ForeignKey(
+        BookingInterval,
+        on_delete=models.CASCADE,
+        related_name='holds',
+    )
+    slot_index = models.PositiveSmallIntegerField()
+    week_start = models.DateField(default=current_week_start)
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='slot_holds',
+    )
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = SlotHoldQuerySet.as_manager()
+
+    @classmethod
+    def place(cls, slot, student):
+        """Holds slot for student, releasing the student's other holds"""
+        with transaction.atomic():
+            cls.objects.filter(student=student).delete()
+            return cls.objects.create(
+                booking_interval=slot.booking_interval, slot_index=slot.index, student=student,
+                expires_at=timezone.now() + cls.DURATION,
+            )
+
+    @classmethod
+    def sweep(cls, now=None):
+        """Deletes the expired holds in a single query, returns (number deleted, pks of the courses they were for)"""
+        expired = cls.objects.expired(now)
+        course_ids = set(expired.order_by().values_list('booking_interval__course_id', flat=True))
+        deleted, _ = expired.delete()
+        return deleted, course_ids
+
+    def __str__(self):
+        return f'{self.student} - {self.booking_interval} #{self.slot_index} until {self.expires_at}'
+
+
+class BookingTicket(models.Model):
+    """A reservation request for a course in rush mode, waiting for booking.queue to make it"""
+    QUEUED = 'queued'
+    CONFIRMED = 'confirmed'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = (
+        (QUEUED, 'I kø'),
+        (CONFIRMED, 'Bekreftet'),
+        (REJECTED, 'Avvist'),
+    )
+
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='booking_tickets',
+    )
+    booking_interval = models.ForeignKey(
+        BookingInterval,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    slot_index = models.PositiveSmallIntegerField()
+    week_start = models.DateField(default=current_week_start)
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='booking_tickets',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    reservation = models.ForeignKey(
+        ReservationConnection,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    message = models.CharField(
+        max_length=200,
+        blank=True,
+    )
+    created = models.DateTimeField(default=timezone.now)
+    processed = models.DateTimeField(
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        indexes = [
+            # the queue of a course in arrival order, and a ticket's position in it
+            models.Index(fields=['status', 'course', 'id'], name='booking_ticket_queue_idx'),
+        ]
+
+    @property
+    def slot(self):
+        return ReservationSlot(self.booking_interval, self.slot_index)
+
+    def position(self):
+        """The number of tickets ahead of this one in the course's queue, None once it has been processed"""
+        if self.status != self.QUEUED:
+            return None
+        return BookingTicket.objects.filter(status=self.QUEUED, course_id=self.course_id, pk__lt=self.pk).count()
+
+    def __str__(self):
+        return f'{self.student} - {self.booking_interval} #{self.slot_index} ({self.status})'
+
+
+class AssistantAvailability(models.Model):
+    """A booking interval an assistant is available for, used by booking.scheduling to staff the course"""
+    PREFERRED = 1
+    AVAILABLE = 2
+    IF_NEEDED = 3
+    PREFERENCE_CHOICES = [
+        (PREFERRED, 'Foretrekker'),
+        (AVAILABLE, 'Kan'),
+        (IF_NEEDED, 'Ved behov'),
+    ]
+
+    assistant = models.ForeignKey(
+        User,
+        limit_choices_to={'groups__name': "assistants"},
+        related_name='availabilities',
+        on_delete=models.CASCADE,
+    )
+    booking_interval = models.ForeignKey(
+        BookingInterval,
+        related_name='availabilities',
+        on_delete=models.CASCADE,
+    )
+    preference = models.PositiveSmallIntegerField(
+        choices=PREFERENCE_CHOICES,
+        default=AVAILABLE,
+    )
+
+    class Meta:
+        unique_together = ('assistant', 'booking_interval')
+
+    def __str__(self):
+        return f'{self.assistant} {self.booking_interval} {self.get_preference_display()}'
+
+
+def generate_calendar_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarToken(models.Model):
+    """Secret part of the URL of a user's calendar feed, as calendar clients can not log in"""
+    user = models.OneToOneField(
+        User,
+        related_name='calendar_token',
+        on_delete=models.CASCADE,
+    )
+    token = models.CharField(
+        max_length=43,
+        unique=True,
+        default=generate_calendar_token,
+    )
+
+    def __str__(self):
+        return f'{self.user} calendar token'
+
+
+class ArchivedReservation(models.Model):
+    """
+    A reservation from a past week, kept for statistics.
+    Reservations are moved here by the weekly rollover_reservations command, so that ReservationConnection
+    only holds the current week.
+    """
+    week_start = models.DateField()
+    course = models.ForeignKey(
+        Course,
+        related_name='archived_reservations',
+        on_delete=models.CASCADE,
+    )
+    day = models.PositiveSmallIntegerField(
+        choices=BookingInterval.DAY_CHOICES,
+    )
+    start = models.TimeField()
+    student = models.ForeignKey(
+        User,
+        related_name='+',
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    assistant = models.ForeignKey(
+        User,
+        related_name='+',
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'week_start'], name='booking_ar_course_week_idx'),
+        ]
+
+    @classmethod
+    def archive_weeks_before(cls, week_start, batch_size=1000):
+        """
+        Moves the reservations of every week before week_start into the archive, batch_size rows at a time.
+        Returns the number of archived reservations.
+        """
+        past_reservations = ReservationConnection.objects.filter(week_start__lt=week_start).order_by('pk')
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(past_reservations.select_for_update().values_list(
+                    'pk', 'week_start', 'booking_interval__course_id', 'booking_interval__day',
+                    'booking_interval__start', 'slot_index', 'student_id', 'assistant_id',
+                )[:batch_size])
+                if not rows:
+                    return archived
+                cls.objects.bulk_create([
+                    cls(
+                        week_start=week, course_id=course_id, day=day,
+                        start=ReservationSlot.start_time(start, slot_index),
+                        student_id=student_id, assistant_id=assistant_id,
+                    )
+                    for _, week, course_id, day, start, slot_index, student_id, assistant_id in rows
+                ])
+                pks = [row[0] for row in rows]
+                # delete() would load every row to null its tickets and send its signals, which bump the stamps one
+                # reservation at a time
+                BookingTicket.objects.filter(reservation__in=pks).update(reservation=None)
+                delete_pks(ReservationConnection, pks)
+
+                course_ids = {row[2] for row in rows}
+                user_ids = {user_id for row in rows for user_id in row[6:] if user_id is not None}
+
+                def bump(course_ids=course_ids, user_ids=user_ids):
+                    bump_stamps('course', course_ids)
+                    bump_stamps('user', user_ids)
+                transaction.on_commit(bump)
+            archived += len(rows)
+
+    def __str__(self):
+        return f'{self.course.course_code} {self.week_start} {self.get_day_display()} {self.start}'
@@ -0,0 +1,72 @@
+"""
+The user's own courses, as listed on the home page.
+
+The courses a user is enrolled in, assisting or supervising are loaded in a single query, with the number of
+upcoming reservations and unreviewed exercises of each counted in subqueries. What is counted depends on the role:
+students see their own reservations and exercises, assistants the reservations they are assistant for and the
+course's exercises, and course coordinators everything in the course.
+
+The list is cached per user under the user's version stamp, which is bumped when they are enrolled in or removed from
+a course, and is thrown away when any of the courses' stamps is newer than the list.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from assignments.models import Exercise
+from booking.models import Course, ReservationConnection, current_week_start
+from itsBooking.extensions.versioning import user_stamp, get_stamps, versioned_key
+
+
+def _count(queryset, course_field):
+    """Number of rows of queryset in the outer query's course"""
+    counts = queryset.filter(**{course_field: OuterRef('pk')}).order_by().values(course_field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def user_courses(user, role, today=None):
+    """
+    The courses of the user, annotated with upcoming_reservations, this week's reservations from today on, and
+    unreviewed_exercises
+    """
+    today = today or timezone.localdate()
+    reservations = ReservationConnection.objects.filter(
+        week_start=current_week_start(today), booking_interval__day__gte=today.weekday()
+    )
+    exercises = Exercise.objects.filter(approved__isnull=True)
+    if role == 'students':
+        reservations = reservations.filter(student=user)
+        exercises = exercises.filter(student=user)
+    elif role == 'assistants':
+        reservations = reservations.filter(assistant=user)
+
+    return Course.objects.filter(
+        Q(pk__in=Course.students.through.objects.filter(user=user).values('course_id'))
+        | Q(pk__in=Course.assistants.through.objects.filter(user=user).values('course_id'))
+        | Q(course_coordinator=user)
+    ).annotate(
+        upcoming_reservations=_count(reservations, 'booking_interval__course'),
+        unreviewed_exercises=_count(exercises, 'course'),
+    ).order_by('course_code')
+
+
+def home_courses(user, role):
+    """user_courses, cached until the user's enrollment or anything in the courses changes, or the day ends"""
+    today = timezone.localdate()
+    key = versioned_key(f'home:{user.pk}:{role}:{today}', user_stamp(user.pk))
+    cached = cache.get(key)
+    if cached is not None:
+        built, courses = cached
+        if all(stamp < built for stamp in get_stamps('course', [course.pk for course in courses]).values()):
+            return courses
+
+    # taken before the query, so a course changed while it runs is newer than the list
+    built = time.time()
+    courses = list(user_courses(user, role, today))
+    cache.set(key, (built, courses), 24 * 60 * 60)
+    return courses
@@ -0,0 +1,73 @@
+"""
+Admission queue for courses in rush mode.
+
+When a course opens for booking the whole class tends to book at once, and the requests pile up behind each other
+on the same rows. In rush mode CreateReservationConnection only stores a BookingTicket, which locks nothing, and a
+single consumer (./manage.py process_booking_queue) makes the reservations in the order the tickets arrived.
+Students poll their ticket for the outcome.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from booking.models import BookingTicket, ReservationConnection, NoAssistantAvailable
+from itsBooking.templatetags.helpers import name
+
+
+class _AlreadyProcessed(Exception):
+    pass
+
+
+def enqueue(course_id, reservation, student):
+    """
+    Returns (ticket, created), the student's queued ticket for the course if they have one, otherwise a new ticket
+    for reservation. A student has at most one ticket in a course's queue, so sending many requests gets them
+    no further ahead.
+    """
+    ticket = BookingTicket.objects.filter(status=BookingTicket.QUEUED, course_id=course_id, student=student).first()
+    if ticket is not None:
+        return ticket, False
+    return BookingTicket.objects.create(
+        course_id=course_id, booking_interval=reservation.booking_interval, slot_index=reservation.index,
+        student=student,
+    ), True
+
+
+def process_ticket(ticket):
+    """Makes the ticket's reservation, or rejects the ticket if it can not be made. Returns whether it was processed"""
+    now = timezone.now()
+    queued = BookingTicket.objects.filter(pk=ticket.pk, status=BookingTicket.QUEUED)
+    try:
+        with transaction.atomic():
+            reservation = ReservationConnection.objects.create(
+                booking_interval=ticket.booking_interval, slot_index=ticket.slot_index, week_start=ticket.week_start,
+                student_id=ticket.student_id,
+            )
+            # the conditional update keeps a ticket from being processed twice if a second consumer is started
+            if not queued.update(status=BookingTicket.CONFIRMED, reservation=reservation, processed=now,
+                                 message=f'Din stud. ass. er {name(reservation.assistant)}'):
+                raise _AlreadyProcessed()
+    except _AlreadyProcessed:
+        return False
+    except NoAssistantAvailable:
+        message = 'Det er ingen ledige stud. ass. på dette tidspunktet'
+    except IntegrityError:
+        message = 'Du har allerede en reservasjon på dette tidspunktet'
+    else:
+        return True
+    return bool(queued.update(status=BookingTicket.REJECTED, processed=now, message=message))
+
+
+def process_queue(batch_size=100):
+    """
+    Processes up to batch_size of the oldest queued tickets of each course, one course after the other so a full
+    queue does not hold up the others. Returns the number of tickets processed.
+    """
+    processed = 0
+    course_ids = BookingTicket.objects.filter(status=BookingTicket.QUEUED).values_list('course_id', flat=True)
+    for course_id in set(course_ids.order_by()):
+        tickets = BookingTicket.objects.filter(
+            status=BookingTicket.QUEUED, course_id=course_id
+        ).select_related('booking_interval').order_by('pk')[:batch_size]
+        for ticket in tickets:
+            processed += process_ticket(ticket)
+    return processed
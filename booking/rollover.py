@@ -0,0 +1,74 @@
+"""
+Semester rollover for many courses at once.
+
+Everything is done with set-based queries. The rows of a semester are deleted by primary key, a thousand rows per
+DELETE, instead of being loaded to cascade and send signals one by one, and exercise files are queued for
+./manage.py delete_queued_files instead of being removed while the rows are deleted. The version stamps the
+signals would have bumped are bumped once the transaction commits.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from assignments.models import Exercise, FileDeletion
+from booking.models import BookingInterval, ReservationConnection, SlotHold, BookingTicket, AssistantAvailability
+from itsBooking.db.bulk import delete_pks
+from itsBooking.extensions.versioning import bump_stamps
+
+
+def clone_schedule(source, course_ids):
+    """
+    Copies the max_available_assistants of each of source's booking intervals onto the booking intervals of the
+    courses with the same day and start, with one UPDATE per distinct number. Returns the number of intervals updated.
+    """
+    course_ids = [pk for pk in course_ids if pk != source.pk]
+    pattern = {}
+    for day, start, num in source.booking_intervals.values_list('day', 'start', 'max_available_assistants'):
+        pattern.setdefault(num, []).append(Q(day=day, start=start))
+
+    updated = 0
+    with transaction.atomic():
+        for num, slots in pattern.items():
+            updated += BookingInterval.objects.filter(course__in=course_ids).filter(
+                reduce(or_, slots)
+            ).update(max_available_assistants=num)
+        transaction.on_commit(lambda: bump_stamps('course', course_ids))
+    return updated
+
+
+def clear_semester(course_ids):
+    """
+    Deletes the reservations, slot holds, booking tickets, assistant registrations and availabilities, and
+    exercises of the courses, queueing the files of the exercises for deletion. Returns {table: rows deleted}.
+    """
+    course_ids = list(course_ids)
+    booking_intervals = BookingInterval.objects.filter(course__in=course_ids).values('pk')
+    reservations = ReservationConnection.objects.filter(booking_interval__in=booking_intervals).order_by()
+    registrations = BookingInterval.assistants.through.objects.filter(bookinginterval__in=booking_intervals)
+    exercises = Exercise.objects.filter(course__in=course_ids).order_by()
+
+    with transaction.atomic():
+        user_ids = set(reservations.values_list('student_id', flat=True).distinct())
+        user_ids.update(reservations.values_list('assistant_id', flat=True).distinct())
+        user_ids.update(registrations.values_list('user_id', flat=True).distinct())
+        user_ids.update(exercises.values_list('student_id', flat=True).distinct())
+
+        deleted = {'exercise files': FileDeletion.queue_files(exercises)}
+        for table, queryset in (
+                # tickets first, they point to the reservations
+                ('booking tickets', BookingTicket.objects.filter(course__in=course_ids)),
+                ('slot holds', SlotHold.objects.filter(booking_interval__in=booking_intervals)),
+                ('reservations', reservations),
+                ('registrations', registrations),
+                ('availabilities', AssistantAvailability.objects.filter(booking_interval__in=booking_intervals)),
+                ('exercises', exercises),
+        ):
+            deleted[table] = delete_pks(queryset.model, queryset.values_list('pk', flat=True))
+
+        def bump():
+            bump_stamps('course', course_ids)
+            bump_stamps('user', user_ids)
+        transaction.on_commit(bump)
+    return deleted
@@ -0,0 +1,167 @@
+"""
+Batch assignment of assistants to booking intervals.
+
+Assistants submit the booking intervals they are available for, ranked by preference, and the whole course is
+staffed in one run instead of first-come-first-served. The staffing problem is solved as a min-cost flow:
+
+    source -> assistant (capacity: intervals per assistant) -> booking interval (capacity 1, cost: preference)
+           -> sink (capacity: max_available_assistants)
+
+The flow fills as many of the seats set by the course coordinator as possible, and among those fillings picks
+the one that gives the assistants the intervals they prefer most.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+from booking.models import BookingInterval, ReservationConnection, AssistantAvailability
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp
+
+
+class MinCostFlow:
+    """Successive shortest paths with Dijkstra on reduced costs. Edge costs must not be negative"""
+
+    def __init__(self, num_nodes):
+        # every edge is [to, capacity, cost, index of the reverse edge in graph[to]]
+        self.graph = [[] for _ in range(num_nodes)]
+
+    def add_edge(self, source, target, capacity, cost):
+        """Returns the edge, whose remaining capacity tells how much flow went through it after solve()"""
+        edge = [target, capacity, cost, len(self.graph[target])]
+        self.graph[source].append(edge)
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1])
+        return edge
+
+    def solve(self, source, sink):
+        """Sends as much flow as possible from source to sink at the lowest cost. Returns (flow, cost)"""
+        num_nodes = len(self.graph)
+        potential = [0] * num_nodes
+        flow, cost = 0, 0
+        while True:
+            distance = [math.inf] * num_nodes
+            previous = [None] * num_nodes  # (node, edge index) the shortest path arrived through
+            distance[source] = 0
+            queue = [(0, source)]
+            while queue:
+                dist, node = heapq.heappop(queue)
+                if dist > distance[node]:
+                    continue
+                for i, (target, capacity, edge_cost, _) in enumerate(self.graph[node]):
+                    new_dist = dist + edge_cost + potential[node] - potential[target]
+                    if capacity > 0 and new_dist < distance[target]:
+                        distance[target] = new_dist
+                        previous[target] = (node, i)
+                        heapq.heappush(queue, (new_dist, target))
+            if distance[sink] == math.inf:
+                return flow, cost
+            for node in range(num_nodes):
+                if distance[node] < math.inf:
+                    potential[node] += distance[node]
+
+            # bottleneck capacity along the path, then push it through
+            push, node = math.inf, sink
+            while node != source:
+                parent, i = previous[node]
+                push = min(push, self.graph[parent][i][1])
+                node = parent
+            node = sink
+            while node != source:
+                parent, i = previous[node]
+                edge = self.graph[parent][i]
+                edge[1] -= push
+                self.graph[node][edge[3]][1] += push
+                node = parent
+            flow += push
+            cost += push * (potential[sink] - potential[source])
+
+
+def solve_assignment(seats, availabilities, max_per_assistant):
+    """
+    seats: {booking interval pk: number of assistants wanted}
+    availabilities: iterable of (assistant pk, booking interval pk, preference), lower preference is better
+    max_per_assistant: {assistant pk: max number of booking intervals}
+
+    Returns {booking interval pk: [assistant pks]}
+    """
+    availabilities = [
+        (assistant, booking_interval, preference) for assistant, booking_interval, preference in availabilities
+        if seats.get(booking_interval, 0) > 0 and max_per_assistant.get(assistant, 0) > 0
+    ]
+    assistants = sorted({assistant for assistant, _, _ in availabilities})
+    booking_intervals = sorted(seats)
+    # node 0 is the source, 1 the sink, then one node per assistant and one per booking interval
+    assistant_nodes = {assistant: 2 + i for i, assistant in enumerate(assistants)}
+    interval_nodes = {pk: 2 + len(assistants) + i for i, pk in enumerate(booking_intervals)}
+
+    network = MinCostFlow(2 + len(assistants) + len(booking_intervals))
+    for assistant, node in assistant_nodes.items():
+        network.add_edge(0, node, max_per_assistant[assistant], 0)
+    for pk, node in interval_nodes.items():
+        network.add_edge(node, 1, seats[pk], 0)
+    edges = [
+        (assistant, booking_interval, network.add_edge(
+            assistant_nodes[assistant], interval_nodes[booking_interval], 1, preference
+        ))
+        for assistant, booking_interval, preference in availabilities
+    ]
+    network.solve(0, 1)
+
+    assignment = defaultdict(list)
+    for assistant, booking_interval, edge in edges:
+        if edge[1] == 0:  # the edge's single unit of capacity was used
+            assignment[booking_interval].append(assistant)
+    return dict(assignment)
+
+
+@transaction.atomic
+def assign_assistants(course, max_per_assistant=None):
+    """
+    Staffs every booking interval of the course from the submitted availabilities, replacing the current
+    assignment. Assistants that already have reservations this week keep those booking intervals.
+
+    max_per_assistant defaults to an even share of the course's seats.
+    Returns {booking interval pk: [assistant pks]}
+    """
+    booking_intervals = list(course.booking_intervals.select_for_update().order_by())
+    seats = {bi.pk: bi.max_available_assistants for bi in booking_intervals}
+    assistants = list(course.assistants.values_list('pk', flat=True))
+    if max_per_assistant is None:
+        max_per_assistant = math.ceil(sum(seats.values()) / len(assistants)) if assistants else 0
+    capacity = {assistant: max_per_assistant for assistant in assistants}
+
+    # booking intervals assistants have to keep, as students have already reserved time with them
+    kept = set(ReservationConnection.objects.current_week().filter(
+        booking_interval__course=course
+    ).values_list('booking_interval_id', 'assistant_id').distinct())
+    for booking_interval, assistant in kept:
+        seats[booking_interval] = max(seats[booking_interval] - 1, 0)
+        if assistant in capacity:
+            capacity[assistant] = max(capacity[assistant] - 1, 0)
+
+    availabilities = AssistantAvailability.objects.filter(
+        booking_interval__course=course, assistant__in=assistants
+    ).values_list('assistant_id', 'booking_interval_id', 'preference')
+    assignment = solve_assignment(
+        seats, [row for row in availabilities if (row[1], row[0]) not in kept], capacity
+    )
+    for booking_interval, assistant in kept:
+        assignment.setdefault(booking_interval, []).append(assistant)
+
+    through = BookingInterval.assistants.through
+    previous = set(through.objects.filter(bookinginterval__course=course).values_list('user_id', flat=True))
+    through.objects.filter(bookinginterval__course=course).delete()
+    through.objects.bulk_create([
+        through(bookinginterval_id=booking_interval, user_id=assistant)
+        for booking_interval, assigned in assignment.items()
+        for assistant in assigned
+    ])
+
+    # bulk_create sends no m2m_changed signals
+    def bump_stamps():
+        bump_course_stamp(course.pk)
+        for assistant in previous.union(*assignment.values()):
+            bump_user_stamp(assistant)
+    transaction.on_commit(bump_stamps)
+    return assignment
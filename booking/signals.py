@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from booking.models import Course, BookingInterval, ReservationConnection
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp, bump_stamps
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_course_stamp(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=BookingInterval)
+def booking_interval_changed(sender, instance, **kwargs):
+    bump_course_stamp(instance.course_id)
+
+
+def _changed_pks(instance, action, pk_set, related_name):
+    """The pks on the other side of an m2m change. Clearing sends no pk_set, so the cleared rows are read first"""
+    if action == 'pre_clear':
+        return set(getattr(instance, related_name).values_list('pk', flat=True))
+    if action in ('post_add', 'post_remove'):
+        return pk_set
+    return None
+
+
+@receiver(m2m_changed, sender=BookingInterval.assistants.through)
+def booking_interval_assistants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    pks = _changed_pks(instance, action, pk_set, 'setup_booking_intervals' if reverse else 'assistants')
+    if pks is None:
+        return
+    if reverse:  # instance is a user, pks are booking intervals
+        for course_id in set(BookingInterval.objects.filter(pk__in=pks).values_list('course_id', flat=True)):
+            bump_course_stamp(course_id)
+        bump_user_stamp(instance.pk)
+    else:
+        bump_course_stamp(instance.course_id)
+        for user_id in pks:
+            bump_user_stamp(user_id)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def course_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _course_members_changed(instance, action, reverse, pk_set, 'enrolled_courses' if reverse else 'students')
+
+
+@receiver(m2m_changed, sender=Course.assistants.through)
+def course_assistants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _course_members_changed(instance, action, reverse, pk_set, 'assisting_courses' if reverse else 'assistants')
+
+
+def _course_members_changed(instance, action, reverse, pk_set, related_name):
+    pks = _changed_pks(instance, action, pk_set, related_name)
+    if pks is None:
+        return
+    if reverse:  # instance is a user, pks are courses
+        for course_id in pks:
+            bump_course_stamp(course_id)
+        bump_user_stamp(instance.pk)
+    else:
+        bump_course_stamp(instance.pk)
+        for user_id in pks:
+            bump_user_stamp(user_id)
+
+
+@receiver([post_save, post_delete], sender=ReservationConnection)
+def reservation_changed(sender, instance, **kwargs):
+    # bulk deletes (archive_weeks_before, booking.rollover) delete without signals and bump the stamps once
+    if sender.booking_interval.is_cached(instance):
+        course_id = instance.booking_interval.course_id
+    else:
+        course_id = BookingInterval.objects.filter(pk=instance.booking_interval_id).values_list(
+            'course_id', flat=True
+        ).first()
+    # None if the booking interval is already gone
+    if course_id is not None:
+        bump_course_stamp(course_id)
+    bump_stamps('user', {instance.student_id, instance.assistant_id} - {None})
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # a user's group decides which version of the course pages they get
+    pks = _changed_pks(instance, action, pk_set, 'user_set' if reverse else 'groups')
+    if pks is None:
+        return
+    for user_id in (pks if reverse else [instance.pk]):
+        bump_user_stamp(user_id)
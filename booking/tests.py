@@ -1,11 +1,34 @@
 import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
 
+import numpy as np
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth.models import User, Group
-from django.db import IntegrityError
-from django.test import TestCase, Client
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, Client, skipUnlessDBFeature, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 
-from .models import Course, ReservationConnection
+from .analytics import SLOTS_PER_DAY, compute_occupancy, course_occupancy
+from .models import (
+    Course, ReservationConnection, BookingInterval, ReservationSlot, ArchivedReservation, AssistantAvailability,
+    CalendarToken, BookingTicket, SlotHold, current_week_start,
+)
+from .ical import fold
+from .rollover import clear_semester
+from .queue import process_queue
+from .scheduling import assign_assistants, solve_assignment
+from assignments.models import Exercise, FileDeletion
+from itsBooking.extensions.throttling import take_tokens, get_throttle_stats, reset_throttle_stats
 
 
 class StudentTableViewTest(TestCase):
@@ -33,6 +56,22 @@ class StudentTableViewTest(TestCase):
         self.assertEqual(200, self.response.status_code)
         self.assertIsNotNone(self.response.context['form'])
 
+    def test_grid_query_count(self):
+        """The reservation grid costs the same number of queries no matter how many reservations are made"""
+        assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        booking_interval = self.course.booking_intervals.first()
+        booking_interval.assistants.add(assistant)
+        self.client.get(reverse('course_detail', kwargs={'slug': self.course.slug}))  # sets the csrf cookie
+        # the course is loaded once, for both the conditional GET check and the view. The check also looks for
+        # expired holds
+        with self.assertNumQueries(10):
+            self.client.get(reverse('course_detail', kwargs={'slug': self.course.slug}))
+        ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=2, student=self.user)
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('course_detail', kwargs={'slug': self.course.slug}))
+        reservation = response.context['intervals'][0]['reservation_intervals'][2]['reservations'][0]
+        self.assertEqual(0, reservation.available_slots)
+
 
 class AssistantTableViewTest(TestCase):
     def setUp(self):
@@ -105,6 +144,12 @@ class CourseViewTest(TestCase):
         booking_interval.refresh_from_db()
         self.assertEqual(new_max_num_assistants, booking_interval.max_available_assistants)
 
+        for num in ('x', '-1', ''):
+            response = self.client.get(reverse('update_max_num_assistants'), {'nk': booking_interval.nk, 'num': num})
+            self.assertEqual(400, response.status_code, msg=num)
+        booking_interval.refresh_from_db()
+        self.assertEqual(new_max_num_assistants, booking_interval.max_available_assistants)
+
 
 class ReservationTest(TestCase):
     def setUp(self):
@@ -128,7 +173,7 @@ class ReservationTest(TestCase):
     def test_make_reservation_deny_not_available(self):
         response = self.client.post(reverse(
             'course_detail', kwargs={'slug': self.course.slug}
-        ), {'reservation_pk': self.course.booking_intervals.first().reservation_intervals.first().pk}
+        ), {'booking_interval_nk': self.course.booking_intervals.first().nk, 'reservation_index': 0}
         )
         messages = list(response.context['messages'])
         self.assertEqual(40, messages[0].level)  # level:40 => error
@@ -140,15 +185,15 @@ class ReservationTest(TestCase):
         assistant_group.user_set.add(assistant_user)
         self.course.booking_intervals.first().min_num_assistants = 1
         self.course.booking_intervals.first().assistants.add(assistant_user)
-        self.reservation = self.course.booking_intervals.first().reservation_intervals.first()
-        rc_count = self.reservation.connections.count()
+        booking_interval = self.course.booking_intervals.first()
+        rc_count = booking_interval.connections.filter(slot_index=0).count()
 
         response = self.client.post(
             reverse('course_detail', kwargs={'slug': self.course.slug}),
-            {'reservation_pk': self.reservation.pk}
+            {'booking_interval_nk': booking_interval.nk, 'reservation_index': 0}
         )
         self.assertEqual(302, response.status_code)
-        self.assertEqual(rc_count + 1, self.reservation.connections.count())
+        self.assertEqual(rc_count + 1, booking_interval.connections.filter(slot_index=0).count())
 
     def test_student_reservation_list(self):
         assistant_user = User.objects.create_user(username='ASSISTANT', password='123')
@@ -156,9 +201,9 @@ class ReservationTest(TestCase):
         assistant_group.user_set.add(assistant_user)
         self.course.booking_intervals.first().min_num_assistants = 1
         self.course.booking_intervals.first().assistants.add(assistant_user)
-        self.reservation = self.course.booking_intervals.first().reservation_intervals.first()
+        self.booking_interval = self.course.booking_intervals.first()
         ReservationConnection.objects.create(
-            reservation_interval=self.reservation,
+            booking_interval=self.booking_interval, slot_index=0,
             student=self.user,
             assistant=assistant_user
         )
@@ -182,11 +227,11 @@ class ReservationTest(TestCase):
         assistant_group.user_set.add(assistant_user)
         self.course.booking_intervals.first().min_num_assistants = 1
         self.course.booking_intervals.first().assistants.add(assistant_user)
-        self.reservation = self.course.booking_intervals.first().reservation_intervals.first()
+        self.booking_interval = self.course.booking_intervals.first()
         self.client.logout()
         self.client.login(username='ASSISTANT', password='123')
         ReservationConnection.objects.create(
-            reservation_interval=self.reservation,
+            booking_interval=self.booking_interval, slot_index=0,
             student=self.user,
             assistant=assistant_user
         )
@@ -205,8 +250,8 @@ class ReservationTest(TestCase):
         assistant_group.user_set.add(assistant_user)
         self.course.booking_intervals.first().min_num_assistants = 1
         self.course.booking_intervals.first().assistants.add(assistant_user)
-        self.reservation = self.course.booking_intervals.first().reservation_intervals.first()
-        self.connection = ReservationConnection.objects.create(reservation_interval=self.reservation,
+        self.booking_interval = self.course.booking_intervals.first()
+        self.connection = ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=0,
                                                                student=self.user,
                                                                assistant=assistant_user
                                                                )
@@ -228,8 +273,8 @@ class ReservationTest(TestCase):
         self.student_group.user_set.add(student_user)
         self.course.booking_intervals.first().min_num_assistants = 1
         self.course.booking_intervals.first().assistants.add(assistant_user)
-        self.reservation = self.course.booking_intervals.first().reservation_intervals.first()
-        self.connection = ReservationConnection.objects.create(reservation_interval=self.reservation,
+        self.booking_interval = self.course.booking_intervals.first()
+        self.connection = ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=0,
                                                                student=student_user,
                                                                assistant=assistant_user
                                                                )
@@ -263,6 +308,237 @@ class CourseModelTest(TestCase):
         # assert that slugs are generated on save()
         self.assertEqual(course.course_code, course.slug)
 
+    def test_booking_interval_keys(self):
+        """Booking intervals get integer primary keys, integer days and a unique natural key"""
+        course = Course.objects.create(title="algdat", course_code="tdt4125")
+        booking_interval = course.booking_intervals.order_by('day', 'start').last()
+        self.assertIsInstance(booking_interval.pk, int)
+        self.assertEqual(4, booking_interval.day)
+        self.assertEqual('Friday', booking_interval.get_day_display())
+        self.assertEqual(32, len(booking_interval.nk))
+        self.assertEqual(booking_interval, BookingInterval.objects.get(nk=booking_interval.nk))
+
+    def test_reservation_slots(self):
+        """Reservation slots are computed from their booking interval instead of being stored"""
+        course = Course.objects.create(title="algdat", course_code="tdt4125")
+        booking_interval = course.booking_intervals.order_by('day', 'start').first()
+        slots = booking_interval.get_reservation_slots()
+        self.assertEqual(Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL, len(slots))
+        self.assertEqual((time(8, 0), time(8, 15)), (slots[0].start, slots[0].end))
+        self.assertEqual((time(9, 45), time(10, 0)), (slots[-1].start, slots[-1].end))
+
+        assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        student = User.objects.create_user(username='STUDENT', password='123')
+        booking_interval.assistants.add(assistant)
+        self.assertEqual(1, ReservationSlot(booking_interval, 7).available_slots)
+        connection = ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=7,
+                                                          student=student)
+        self.assertEqual(assistant, connection.assistant)
+        self.assertEqual(time(9, 45), connection.slot.start)
+        self.assertEqual(0, ReservationSlot(booking_interval, 7).available_slots)
+        # a student can only hold one reservation per slot
+        booking_interval.assistants.add(User.objects.create_user(username='ASSISTANT2', password='123'))
+        with self.assertRaises(IntegrityError):
+            ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=7, student=student)
+
+
+class ReservationRolloverTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        self.student = User.objects.create_user(username='STUDENT', password='123')
+        self.booking_interval = self.course.booking_intervals.get(day=2, start=time(10))
+        self.booking_interval.assistants.add(self.assistant)
+        self.this_week = current_week_start()
+        self.last_week = self.this_week - timedelta(weeks=1)
+
+    def test_current_week_start(self):
+        self.assertEqual(date(2019, 3, 4), current_week_start(date(2019, 3, 7)))
+        self.assertEqual(date(2019, 3, 4), current_week_start(date(2019, 3, 4)))
+
+    def test_slots_are_per_week(self):
+        """A reservation made for last week does not take up this week's slot"""
+        ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=3,
+                                             student=self.student, week_start=self.last_week)
+        self.assertEqual(1, ReservationSlot(self.booking_interval, 3).available_slots)
+        ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=3,
+                                             student=self.student)
+        self.assertEqual(0, ReservationSlot(self.booking_interval, 3).available_slots)
+
+    def test_rollover(self):
+        for week_start in (self.last_week - timedelta(weeks=1), self.last_week, self.this_week):
+            ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=3,
+                                                 student=self.student, week_start=week_start)
+        out = StringIO()
+        call_command('rollover_reservations', batch_size=1, stdout=out)
+        self.assertIn('Archived 2 reservations', out.getvalue())
+        self.assertEqual([self.this_week], [c.week_start for c in ReservationConnection.objects.all()])
+
+        archived = ArchivedReservation.objects.filter(course=self.course, week_start=self.last_week).get()
+        self.assertEqual((2, time(10, 45)), (archived.day, archived.start))
+        self.assertEqual((self.student, self.assistant), (archived.student, archived.assistant))
+        self.assertEqual(2, self.course.archived_reservations.count())
+
+    def test_archive_query_count(self):
+        """Archiving takes the same number of queries however many reservations are archived"""
+        reservations = [
+            ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=3,
+                                                 student=self.student, week_start=self.last_week - timedelta(weeks=i))
+            for i in range(20)
+        ]
+        ticket = BookingTicket.objects.create(
+            course=self.course, booking_interval=self.booking_interval, slot_index=3, student=self.student,
+            status=BookingTicket.CONFIRMED, reservation=reservations[0],
+        )
+        # two batches, the second finds nothing
+        with self.assertNumQueries(9):
+            self.assertEqual(20, ArchivedReservation.archive_weeks_before(self.this_week))
+        self.assertFalse(ReservationConnection.objects.exists())
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.reservation)
+
+
+class CourseAnalyticsTest(TestCase):
+    def setUp(self):
+        self.coordinator = User.objects.create_user(username='COORDINATOR', password='123')
+        self.coordinator.groups.add(Group.objects.create(name='course_coordinators'))
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', course_coordinator=self.coordinator)
+        self.assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        self.student = User.objects.create_user(username='STUDENT', password='123')
+        self.booking_interval = self.course.booking_intervals.get(day=1, start=time(8))
+        self.booking_interval.assistants.add(self.assistant)
+        self.client.login(username='COORDINATOR', password='123')
+
+    def test_compute_occupancy(self):
+        capacity = np.zeros((5, SLOTS_PER_DAY), dtype=np.int64)
+        capacity[1, 0:8] = 2
+        # (week, day, slot of day, assistant): slot 0 is full both weeks, slot 1 only has a reservation the first week
+        reservations = np.array([
+            [1, 1, 0, 7], [1, 1, 0, 8], [1, 1, 1, 7],
+            [2, 1, 0, 7], [2, 1, 0, 8],
+        ])
+        stats = compute_occupancy(reservations, capacity)
+        self.assertEqual(2, stats['num_weeks'])
+        self.assertEqual(1.0, stats['utilization'][1, 0])
+        self.assertEqual(0.25, stats['utilization'][1, 1])
+        self.assertEqual(5 / 32, stats['total_utilization'])
+        self.assertEqual([(1, 0, 2.0), (1, 1, 0.5)], stats['peak_slots'])
+        self.assertEqual((1, 1), stats['volatile_slots'][0][:2])
+        self.assertEqual([(7, 3), (8, 2)], stats['assistant_load'])
+
+    def test_compute_occupancy_without_reservations(self):
+        stats = compute_occupancy(np.zeros((0, 4), dtype=np.int64), np.zeros((5, SLOTS_PER_DAY), dtype=np.int64))
+        self.assertEqual(0, stats['num_weeks'])
+        self.assertEqual(0.0, stats['total_utilization'])
+        self.assertEqual([], stats['peak_slots'])
+
+    def test_analytics_view(self):
+        ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=2, student=self.student)
+        ArchivedReservation.objects.create(
+            course=self.course, week_start=current_week_start() - timedelta(weeks=1), day=1, start=time(8, 30),
+            student=self.student, assistant=self.assistant,
+        )
+        response = self.client.get(reverse('course_analytics', kwargs={'slug': self.course.slug}))
+        self.assertEqual(200, response.status_code)
+        occupancy = response.context['occupancy']
+        self.assertEqual(2, occupancy['num_weeks'])
+        self.assertEqual(time(8, 30), occupancy['heatmap'][2]['start'])
+        self.assertEqual([0.0, 1.0, 0.0, 0.0, 0.0], occupancy['heatmap'][2]['cells'])
+        self.assertEqual([{'day': 'Tuesday', 'start': time(8, 30), 'mean_booked': 1.0}], occupancy['peak_slots'])
+        self.assertEqual(self.assistant, occupancy['assistant_load'][0]['assistant'])
+
+    def test_analytics_cached_per_course_version(self):
+        course_occupancy(self.course)
+        with self.assertNumQueries(0):
+            self.assertEqual(0, course_occupancy(self.course)['num_weeks'])
+        # a new reservation bumps the course's stamp
+        ReservationConnection.objects.create(booking_interval=self.booking_interval, slot_index=2, student=self.student)
+        self.assertEqual(1, course_occupancy(self.course)['num_weeks'])
+
+    def test_analytics_only_for_own_course(self):
+        other = User.objects.create_user(username='OTHER', password='123')
+        other.groups.add(Group.objects.get(name='course_coordinators'))
+        self.client.login(username='OTHER', password='123')
+        response = self.client.get(reverse('course_analytics', kwargs={'slug': self.course.slug}))
+        self.assertEqual(403, response.status_code)
+
+
+class AssistantSchedulingTest(TestCase):
+    def setUp(self):
+        self.coordinator = User.objects.create_user(username='COORDINATOR', password='123')
+        self.coordinator.groups.add(Group.objects.create(name='course_coordinators'))
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', course_coordinator=self.coordinator)
+        self.assistant_group = Group.objects.create(name='assistants')
+        self.assistants = [User.objects.create_user(username=f'ASSISTANT{i}', password='123') for i in range(2)]
+        for assistant in self.assistants:
+            assistant.groups.add(self.assistant_group)
+        self.course.assistants.add(*self.assistants)
+        self.monday = self.course.booking_intervals.get(day=0, start=time(8))
+        self.tuesday = self.course.booking_intervals.get(day=1, start=time(8))
+        self.course.booking_intervals.filter(pk__in=[self.monday.pk, self.tuesday.pk]).update(
+            max_available_assistants=1
+        )
+
+    def test_solve_assignment_fills_seats_before_preferences(self):
+        """Assistant 1 prefers 'a', but only gets it if that does not leave a seat empty"""
+        availabilities = [(1, 'a', 1), (1, 'b', 2), (2, 'a', 1)]
+        self.assertEqual({'a': [2], 'b': [1]}, solve_assignment({'a': 1, 'b': 1}, availabilities, {1: 1, 2: 1}))
+        # with room for everyone, preferences decide
+        self.assertEqual({'a': [1, 2]}, solve_assignment({'a': 2, 'b': 1}, availabilities, {1: 1, 2: 1}))
+        # an assistant never gets more intervals than allowed
+        self.assertEqual({'a': [1]}, solve_assignment({'a': 1, 'b': 1}, availabilities[:2], {1: 1}))
+
+    def test_assign_assistants(self):
+        first, second = self.assistants
+        AssistantAvailability.objects.bulk_create([
+            AssistantAvailability(assistant=first, booking_interval=self.monday, preference=1),
+            AssistantAvailability(assistant=first, booking_interval=self.tuesday, preference=2),
+            AssistantAvailability(assistant=second, booking_interval=self.monday, preference=1),
+        ])
+        self.course.booking_intervals.get(day=4, start=time(16)).assistants.add(first)
+
+        call_command('assign_assistants', 'tdt4125', stdout=StringIO())
+        self.assertEqual([second], list(self.monday.assistants.all()))
+        self.assertEqual([first], list(self.tuesday.assistants.all()))
+        self.assertEqual(2, BookingInterval.assistants.through.objects.filter(bookinginterval__course=self.course).count())
+
+    def test_assign_assistants_keeps_reserved_intervals(self):
+        first, second = self.assistants
+        student = User.objects.create_user(username='STUDENT', password='123')
+        self.monday.assistants.add(first)
+        ReservationConnection.objects.create(booking_interval=self.monday, slot_index=0, student=student)
+        AssistantAvailability.objects.create(assistant=second, booking_interval=self.monday, preference=1)
+
+        assign_assistants(self.course)
+        self.assertEqual([first], list(self.monday.assistants.all()))
+
+    def test_availability_view(self):
+        self.client.login(username='ASSISTANT0', password='123')
+        url = reverse('assistant_availability', kwargs={'slug': self.course.slug})
+        self.assertEqual(200, self.client.get(url).status_code)
+        response = self.client.post(url, {f'bi-{self.monday.pk}': '1', f'bi-{self.tuesday.pk}': ''})
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(
+            [(self.monday.pk, 1)],
+            list(self.assistants[0].availabilities.values_list('booking_interval', 'preference'))
+        )
+
+        # a failed save keeps the saved preferences
+        with mock.patch.object(AssistantAvailability.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.client.post(url, {f'bi-{self.tuesday.pk}': '2'})
+        self.assertEqual(
+            [(self.monday.pk, 1)],
+            list(self.assistants[0].availabilities.values_list('booking_interval', 'preference'))
+        )
+
+    def test_assign_view_only_for_coordinator(self):
+        url = reverse('assign_assistants', kwargs={'slug': self.course.slug})
+        self.client.login(username='ASSISTANT0', password='123')
+        self.assertEqual(403, self.client.post(url).status_code)
+        self.client.login(username='COORDINATOR', password='123')
+        self.assertEqual(302, self.client.post(url).status_code)
+
 
 class MakeAssistantsAvailableTest(TestCase):
     def setUp(self):
@@ -272,6 +548,8 @@ class MakeAssistantsAvailableTest(TestCase):
         self.password = 'TEST_PASS'
         self.user = User.objects.create_user(username=self.username, password=self.password)
         self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.max_available_assistants = 1
+        self.booking_interval.save()
         self.booking_interval.course.assistants.add(self.user)
         self.client.login(username=self.username, password=self.password)
 
@@ -336,3 +614,627 @@ class MakeAssistantsAvailableTest(TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(content['registration_available'], True)
         self.assertEqual(content['available_assistants_count'], 0)
+
+    def test_register_enforces_capacity(self):
+        other = User.objects.create_user(username='OTHER', password='123')
+        self.booking_interval.assistants.add(other)
+        response = self.client.post(reverse('bi_registration_switch'),
+                                    {'nk': self.booking_interval.nk, 'mode': 'register'})
+        self.assertEqual(409, response.status_code)
+        self.assertEqual({'registration_available': True, 'available_assistants_count': 1, 'full': True},
+                         json.loads(response.content.decode('utf-8')))
+        self.assertEqual([other], list(self.booking_interval.assistants.all()))
+
+    def test_register_and_unregister_are_idempotent(self):
+        url = reverse('bi_registration_switch')
+        for _ in range(2):
+            response = self.client.post(url, {'nk': self.booking_interval.nk, 'mode': 'register'})
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(1, json.loads(response.content.decode('utf-8'))['available_assistants_count'])
+        for _ in range(2):
+            response = self.client.post(url, {'nk': self.booking_interval.nk, 'mode': 'unregister'})
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(0, json.loads(response.content.decode('utf-8'))['available_assistants_count'])
+        response = self.client.post(url, {'nk': self.booking_interval.nk, 'mode': 'toggle'})
+        self.assertEqual(400, response.status_code)
+
+
+class BatchScheduleEditingTest(TestCase):
+    def setUp(self):
+        self.coordinator = User.objects.create_user(username='COORDINATOR', password='123')
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', course_coordinator=self.coordinator)
+        self.assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        self.course.assistants.add(self.assistant)
+        self.monday = self.course.booking_intervals.get(day=0, start=time(8))
+        self.tuesday = self.course.booking_intervals.get(day=1, start=time(8))
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def test_max_assistants_batch(self):
+        self.client.force_login(self.coordinator)
+        url = reverse('update_max_num_assistants_batch', kwargs={'slug': self.course.slug})
+        with self.assertNumQueries(9):  # session, user, course, savepoint, 3 grouped updates, release
+            response = self.post_json(url, {
+                'pattern': {'08:00': 2, '10:00': 2, '12:00': 1},
+                'changes': {self.tuesday.nk: 3},
+            })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(16, json.loads(response.content.decode('utf-8'))['updated'])
+        seats = dict(self.course.booking_intervals.values_list('pk', 'max_available_assistants'))
+        self.assertEqual(2, seats[self.monday.pk])
+        self.assertEqual(3, seats[self.tuesday.pk])
+        self.assertEqual(1, seats[self.course.booking_intervals.get(day=4, start=time(12)).pk])
+        self.assertEqual(0, seats[self.course.booking_intervals.get(day=4, start=time(14)).pk])
+
+        self.assertEqual(400, self.post_json(url, {'changes': {self.monday.nk: -1}}).status_code)
+        self.assertEqual(400, self.post_json(url, {'pattern': {'noon': 1}}).status_code)
+        self.assertEqual(400, self.post_json(url, {'pattern': {'25:00': 1}}).status_code)
+
+    def test_max_assistants_batch_only_for_coordinator(self):
+        self.client.force_login(self.assistant)
+        url = reverse('update_max_num_assistants_batch', kwargs={'slug': self.course.slug})
+        self.assertEqual(403, self.post_json(url, {'changes': {self.monday.nk: 2}}).status_code)
+
+    def test_registration_batch(self):
+        self.course.booking_intervals.filter(pk__in=[self.monday.pk, self.tuesday.pk]).update(max_available_assistants=1)
+        friday = self.course.booking_intervals.get(day=4, start=time(8))
+        friday.assistants.add(self.assistant)
+        wednesday = self.course.booking_intervals.get(day=2, start=time(8))
+        self.client.force_login(self.assistant)
+        response = self.post_json(reverse('bi_registration_batch'), {
+            'register': [self.monday.nk, self.tuesday.nk, wednesday.nk], 'unregister': [friday.nk],
+        })
+        self.assertEqual(200, response.status_code)
+        results = json.loads(response.content.decode('utf-8'))['booking_intervals']
+        self.assertEqual({'registration_available': False, 'available_assistants_count': 1, 'full': True},
+                         results[self.monday.nk])
+        # wednesday is closed
+        self.assertEqual({'registration_available': True, 'available_assistants_count': 0, 'full': True},
+                         results[wednesday.nk])
+        self.assertEqual(
+            {self.monday.pk, self.tuesday.pk}, set(self.assistant.setup_booking_intervals.values_list('pk', flat=True))
+        )
+
+    def test_registration_batch_rejects_other_courses(self):
+        other_course = Course.objects.create(title='matematikk 1', course_code='tma4100')
+        self.client.force_login(self.assistant)
+        response = self.post_json(reverse('bi_registration_batch'), {
+            'register': [self.monday.nk, other_course.booking_intervals.first().nk],
+        })
+        self.assertEqual(403, response.status_code)
+        self.assertFalse(self.assistant.setup_booking_intervals.exists())
+        response = self.post_json(reverse('bi_registration_batch'), {
+            'register': [self.monday.nk], 'unregister': [self.monday.nk],
+        })
+        self.assertEqual(400, response.status_code)
+
+    def test_registration_batch_rejects_anonymous_users(self):
+        # a course without assistants must not let anonymous users through the assistant check
+        other_course = Course.objects.create(title='matematikk 1', course_code='tma4100')
+        booking_interval = other_course.booking_intervals.first()
+        booking_interval.max_available_assistants = 1
+        booking_interval.save()
+        response = self.post_json(reverse('bi_registration_batch'), {'register': [booking_interval.nk]})
+        self.assertEqual(403, response.status_code)
+        self.assertFalse(booking_interval.assistants.exists())
+
+
+class CalendarFeedTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Algoritmer, og datastrukturer', course_code='tdt4125')
+        self.assistant = User.objects.create_user(username='ASSISTANT', password='123', first_name='Kari',
+                                                  last_name='Nordmann')
+        self.student = User.objects.create_user(username='STUDENT', password='123')
+        self.booking_interval = self.course.booking_intervals.get(day=2, start=time(10))
+        self.booking_interval.assistants.add(self.assistant)
+        self.connection = ReservationConnection.objects.create(
+            booking_interval=self.booking_interval, slot_index=1, student=self.student
+        )
+        self.wednesday = (current_week_start() + timedelta(days=2)).strftime('%Y%m%d')
+
+    def get_feed(self, user, **headers):
+        token = CalendarToken.objects.get_or_create(user=user)[0].token
+        return self.client.get(reverse('calendar_feed', kwargs={'token': token}), **headers)
+
+    def test_student_feed(self):
+        response = self.get_feed(self.student)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/calendar; charset=utf-8', response['Content-Type'])
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:reservation-{self.connection.pk}@itsbooking\r\n', content)
+        self.assertIn(f'DTSTART;TZID=Europe/Oslo:{self.wednesday}T101500\r\n', content)
+        self.assertIn(f'DTEND;TZID=Europe/Oslo:{self.wednesday}T103000\r\n', content)
+        self.assertIn('DESCRIPTION:Algoritmer\\, og datastrukturer\\nStudentassistent: Kari Nordmann', content)
+        self.assertNotIn('RRULE:FREQ=WEEKLY', content)
+
+    def test_assistant_feed(self):
+        content = b''.join(self.get_feed(self.assistant).streaming_content).decode('utf-8')
+        self.assertIn(f'UID:shift-{self.booking_interval.pk}@itsbooking', content)
+        self.assertIn(f'DTSTART;TZID=Europe/Oslo:{self.wednesday}T100000\r\nDTEND;TZID=Europe/Oslo:'
+                      f'{self.wednesday}T120000\r\nRRULE:FREQ=WEEKLY', content)
+        self.assertIn('SUMMARY:tdt4125: STUDENT', content)
+
+    def test_feed_is_conditional(self):
+        response = self.get_feed(self.student)
+        url = reverse('calendar_feed', kwargs={'token': self.student.calendar_token.token})
+        with self.assertNumQueries(1):  # only the token
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, cached.status_code)
+        cached = self.get_feed(self.student, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(304, cached.status_code)
+
+        # a changed reservation changes the feed
+        self.connection.delete()
+        self.assertEqual(200, self.get_feed(self.student, HTTP_IF_NONE_MATCH=response['ETag']).status_code)
+
+    def test_unknown_token(self):
+        response = self.client.get(reverse('calendar_feed', kwargs={'token': 'nope'}))
+        self.assertEqual(404, response.status_code)
+
+    def test_fold(self):
+        line = 'DESCRIPTION:' + 'ø' * 40
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode('utf-8')) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(line, folded.replace('\r\n ', '').rstrip('\r\n'))
+
+
+
+class ConditionalCoursePageTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.student = User.objects.create_user(username='STUDENT', password='123')
+        self.student.groups.add(Group.objects.create(name='students'))
+        self.other_student = User.objects.create_user(username='OTHER', password='123')
+        self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.assistants.add(User.objects.create_user(username='ASSISTANT', password='123'))
+        self.client.login(username='STUDENT', password='123')
+        self.urls = [
+            reverse('course_detail', kwargs={'slug': self.course.slug}),
+            reverse('course_landing_page', kwargs={'slug': self.course.slug}),
+        ]
+
+    def get_etags(self):
+        self.client.get(self.urls[0])  # sets the csrf cookie
+        return [self.client.get(url)['ETag'] for url in self.urls]
+
+    def assertNotModified(self, etags, expected=True):
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(304 if expected else 200, response.status_code, msg=url)
+            self.assertIn('private', response['Cache-Control'])
+
+    def test_unchanged_page_not_rendered(self):
+        etags = self.get_etags()
+        self.assertNotModified(etags)
+
+    def test_course_changes_invalidate(self):
+        etags = self.get_etags()
+        ReservationConnection.objects.create(
+            booking_interval=self.booking_interval, slot_index=0, student=self.other_student
+        )
+        self.assertNotModified(etags, expected=False)
+
+    def test_pages_are_per_user(self):
+        etags = self.get_etags()
+        self.client.login(username='OTHER', password='123')
+        self.other_student.groups.add(Group.objects.get(name='students'))
+        self.assertNotModified(etags, expected=False)
+
+    def test_expired_holds_invalidate(self):
+        hold = SlotHold.objects.create(booking_interval=self.booking_interval, slot_index=0,
+                                       student=self.other_student, expires_at=timezone.now() + SlotHold.DURATION)
+        etags = self.get_etags()
+        self.assertNotModified(etags)
+        # the hold runs out before sweep_slot_holds deletes it, which bumps no stamp
+        SlotHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(200, response.status_code)
+        self.assertNotModified([response['ETag']])
+
+
+
+@override_settings(BOOKING_THROTTLES={'user': (1, 2), 'course': (1, 3)})
+class BookingThrottleTest(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        reset_throttle_stats()
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.students = Group.objects.create(name='students')
+        self.url = reverse('course_detail', kwargs={'slug': self.course.slug})
+        self.data = {'booking_interval_nk': self.course.booking_intervals.first().nk, 'reservation_index': 0}
+
+    def reserve_as(self, username):
+        user, _ = User.objects.get_or_create(username=username)
+        user.groups.add(self.students)
+        self.client.force_login(user)
+        return self.client.post(self.url, self.data)
+
+    def test_user_bucket(self):
+        self.assertNotEqual(429, self.reserve_as('STUDENT').status_code)
+        self.assertNotEqual(429, self.reserve_as('STUDENT').status_code)
+        response = self.reserve_as('STUDENT')
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('1', response['Retry-After'])
+        self.assertEqual({('reservation_create', 'user'): 1}, get_throttle_stats())
+        # browsing the grid is not throttled
+        self.assertEqual(200, self.client.get(self.url).status_code)
+
+    def test_course_bucket(self):
+        for username in ('A', 'B', 'C'):
+            self.assertNotEqual(429, self.reserve_as(username).status_code)
+        self.assertEqual(429, self.reserve_as('D').status_code)
+        self.assertEqual({('reservation_create', 'course'): 1}, get_throttle_stats())
+
+    def test_registration_switch_throttled(self):
+        assistant = User.objects.create_user(username='ASSISTANT', password='123')
+        self.course.assistants.add(assistant)
+        self.client.force_login(assistant)
+        url = reverse('bi_registration_switch')
+        booking_interval = self.course.booking_intervals.first()
+        booking_interval.max_available_assistants = 1
+        booking_interval.save()
+        nk = booking_interval.nk
+        statuses = [self.client.post(url, {'nk': nk}).status_code for _ in range(3)]
+        self.assertEqual([200, 200, 429], statuses)
+
+    def test_reservation_cancel_course_bucket(self):
+        booking_interval = self.course.booking_intervals.first()
+        booking_interval.assistants.add(User.objects.create_user(username='ASSISTANT'))
+        statuses = []
+        for slot_index, username in enumerate(('A', 'B', 'C', 'D')):
+            student = User.objects.create_user(username=username)
+            student.groups.add(self.students)
+            reservation = ReservationConnection.objects.create(
+                booking_interval=booking_interval, slot_index=slot_index, student=student
+            )
+            self.client.force_login(student)
+            statuses.append(self.client.post(reverse('student_reservation_list'), {
+                'reservation_connection_pk': reservation.pk
+            }).status_code)
+        self.assertEqual([302, 302, 302, 429], statuses)
+        self.assertEqual({('reservation_cancel', 'course'): 1}, get_throttle_stats())
+
+    def test_registration_batch_course_buckets(self):
+        other_course = Course.objects.create(title='matematikk 1', course_code='tma4100')
+        nks = [self.course.booking_intervals.first().nk, other_course.booking_intervals.first().nk]
+        statuses = []
+        for username in ('A', 'B', 'C'):
+            assistant = User.objects.create_user(username=username)
+            self.course.assistants.add(assistant)
+            other_course.assistants.add(assistant)
+            self.client.force_login(assistant)
+            # each batch takes a token from both courses' buckets
+            statuses.append(self.client.post(reverse('bi_registration_batch'), json.dumps({
+                'register': nks[:1] if username == 'A' else nks
+            }), content_type='application/json').status_code)
+        self.assertEqual([200, 200, 200], statuses)
+        assistant = User.objects.create_user(username='D')
+        self.course.assistants.add(assistant)
+        self.client.force_login(assistant)
+        response = self.client.post(reverse('bi_registration_batch'), json.dumps({'register': nks[:1]}),
+                                    content_type='application/json')
+        self.assertEqual(429, response.status_code)
+        self.assertEqual({('registration', 'course'): 1}, get_throttle_stats())
+
+    def test_refill(self):
+        bucket = [('bucket', 2, 2)]
+        self.assertEqual((0, None), take_tokens(bucket, now=100))
+        self.assertEqual((0, None), take_tokens(bucket, now=100))
+        self.assertEqual((0.5, 'bucket'), take_tokens(bucket, now=100))
+        self.assertEqual((0, None), take_tokens(bucket, now=100.5))
+
+
+class BookingQueueTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', rush_mode=True)
+        self.students = Group.objects.create(name='students')
+        self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.assistants.add(User.objects.create_user(username='ASSISTANT'))
+        self.url = reverse('course_detail', kwargs={'slug': self.course.slug})
+        self.data = {'booking_interval_nk': self.booking_interval.nk, 'reservation_index': 0}
+
+    def reserve_as(self, username):
+        user, _ = User.objects.get_or_create(username=username)
+        user.groups.add(self.students)
+        self.client.force_login(user)
+        return self.client.post(self.url, self.data)
+
+    def test_reservation_queued(self):
+        response = self.reserve_as('STUDENT')
+        ticket = BookingTicket.objects.get()
+        self.assertRedirects(response, reverse('booking_ticket', kwargs={'pk': ticket.pk}))
+        self.assertFalse(ReservationConnection.objects.exists())
+        # asking again does not get the student a second place in the queue
+        self.reserve_as('STUDENT')
+        self.assertEqual(1, BookingTicket.objects.count())
+
+    def test_processed_in_arrival_order(self):
+        self.reserve_as('FIRST')
+        self.reserve_as('SECOND')
+        self.assertEqual(2, process_queue())
+        first, second = BookingTicket.objects.order_by('pk')
+        self.assertEqual(BookingTicket.CONFIRMED, first.status)
+        self.assertEqual(first.reservation, ReservationConnection.objects.get(student__username='FIRST'))
+        # the slot only has one assistant
+        self.assertEqual(BookingTicket.REJECTED, second.status)
+        self.assertEqual(0, process_queue())
+
+    def test_poll_ticket(self):
+        self.reserve_as('FIRST')
+        self.reserve_as('SECOND')
+        ticket = BookingTicket.objects.get(student__username='SECOND')
+        url = reverse('booking_ticket', kwargs={'pk': ticket.pk})
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual({'status': 'queued', 'message': '', 'position': 1}, response.json())
+        self.assertContains(self.client.get(url), 'Du står i kø, 1 foran deg.')
+        call_command('process_booking_queue', '--once', stdout=StringIO())
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(('rejected', None), (response.json()['status'], response.json()['position']))
+        # tickets are only shown to their student
+        self.client.force_login(User.objects.get(username='FIRST'))
+        self.assertEqual(404, self.client.get(url).status_code)
+
+    def test_consumer_runs_for_max_seconds(self):
+        self.reserve_as('FIRST')
+        call_command('process_booking_queue', '--max-seconds', '0', stdout=StringIO())
+        self.assertEqual(BookingTicket.CONFIRMED, BookingTicket.objects.get().status)
+
+
+class SlotHoldTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.students = Group.objects.create(name='students')
+        self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.assistants.add(User.objects.create_user(username='ASSISTANT'))
+        self.data = {'booking_interval_nk': self.booking_interval.nk, 'reservation_index': 0}
+
+    def login(self, username):
+        user, _ = User.objects.get_or_create(username=username)
+        user.groups.add(self.students)
+        self.client.force_login(user)
+        return user
+
+    def test_hold_blocks_other_students(self):
+        self.login('FIRST')
+        self.assertEqual(200, self.client.post(reverse('hold_slot'), self.data).status_code)
+        self.login('SECOND')
+        self.assertEqual(409, self.client.post(reverse('hold_slot'), self.data).status_code)
+        response = self.client.post(reverse('course_detail', kwargs={'slug': self.course.slug}), self.data)
+        self.assertEqual(40, list(response.context['messages'])[0].level)
+        self.assertFalse(ReservationConnection.objects.exists())
+
+    def test_hold_converted_to_reservation(self):
+        user = self.login('STUDENT')
+        self.client.post(reverse('hold_slot'), self.data)
+        response = self.client.post(reverse('course_detail', kwargs={'slug': self.course.slug}), self.data)
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(ReservationConnection.objects.filter(student=user).exists())
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_release(self):
+        self.login('FIRST')
+        self.client.post(reverse('hold_slot'), self.data)
+        self.client.post(reverse('hold_slot'), {'release': 1})
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_expired_holds_are_free_and_swept(self):
+        expired = SlotHold.objects.create(
+            booking_interval=self.booking_interval, slot_index=0, student=self.login('FIRST'),
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(1, ReservationSlot(self.booking_interval, 0).available_slots)
+        SlotHold.place(ReservationSlot(self.booking_interval, 1), self.login('SECOND'))
+        out = StringIO()
+        call_command('sweep_slot_holds', stdout=out)
+        self.assertIn('Deleted 1 expired slot holds', out.getvalue())
+        self.assertFalse(SlotHold.objects.filter(pk=expired.pk).exists())
+        self.assertEqual(0, ReservationSlot(self.booking_interval, 1).available_slots)
+
+
+class CourseAdminTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.client.force_login(User.objects.create_superuser('ADMIN', 'admin@example.com', '123'))
+        self.url = reverse('admin:booking_course_change', args=[self.course.pk])
+        User.objects.bulk_create(User(username=f'student{i}') for i in range(60))
+        self.course.students.add(*User.objects.filter(username__startswith='student'))
+
+    def test_members_paginated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(50, len(formset.get_queryset()))
+        self.assertContains(response, 'Side 1 av 2')
+        # no select listing every user
+        self.assertNotContains(response, 'student59')
+        response = self.client.get(self.url, {formset.get_page_parameter(): 2})
+        self.assertEqual(10, len(response.context['inline_admin_formsets'][0].formset.get_queryset()))
+
+    def test_page_query_count_independent_of_members(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url)
+            return len(queries)
+        queries = count_queries()
+        User.objects.bulk_create(User(username=f'other{i}') for i in range(60))
+        self.course.students.add(*User.objects.filter(username__startswith='other'))
+        self.assertEqual(queries, count_queries())
+
+
+class SemesterRolloverTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.source = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.source.booking_intervals.filter(day=0).update(max_available_assistants=3)
+        self.courses = [Course.objects.create(title=f'course {i}', course_code=f'c{i}') for i in range(3)]
+        self.student = User.objects.create_user(username='STUDENT')
+        self.assistant = User.objects.create_user(username='ASSISTANT')
+        for course in self.courses:
+            booking_interval = course.booking_intervals.first()
+            booking_interval.assistants.add(self.assistant)
+            AssistantAvailability.objects.create(assistant=self.assistant, booking_interval=booking_interval)
+            ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=0, student=self.student)
+            Exercise.objects.create(course=course, student=self.student, file=SimpleUploadedFile('ex.txt', b'exercise'))
+
+    def test_clear_semester(self):
+        path = Exercise.objects.first().file.path
+        with self.assertNumQueries(18):  # the same for any number of courses, up to a thousand rows per table
+            deleted = clear_semester([course.pk for course in self.courses])
+        self.assertEqual(3, deleted['reservations'])
+        self.assertEqual(3, deleted['registrations'])
+        self.assertFalse(Exercise.objects.exists())
+        self.assertFalse(AssistantAvailability.objects.exists())
+        # the files are deleted in the background
+        self.assertTrue(os.path.isfile(path))
+        call_command('delete_queued_files', stdout=StringIO())
+        self.assertFalse(os.path.isfile(path))
+        self.assertFalse(FileDeletion.objects.exists())
+
+    def test_new_semester_command(self):
+        out = StringIO()
+        call_command('new_semester', '--all', '--schedule-from', 'tdt4125', '--clear', stdout=out)
+        self.assertIn('Copied the schedule of tdt4125 to', out.getvalue())
+        self.assertFalse(ReservationConnection.objects.exists())
+        for course in self.courses:
+            self.assertEqual(
+                list(self.source.booking_intervals.order_by('day', 'start').values_list('max_available_assistants')),
+                list(course.booking_intervals.order_by('day', 'start').values_list('max_available_assistants')),
+            )
+
+    def test_copy_schedule_action(self):
+        self.client.force_login(User.objects.create_superuser('ADMIN', 'admin@example.com', '123'))
+        response = self.client.post(reverse('admin:booking_course_changelist'), {
+            'action': 'copy_schedule', ACTION_CHECKBOX_NAME: [self.courses[0].pk], 'apply': 1,
+            'source': self.source.pk,
+        })
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(5, self.courses[0].booking_intervals.filter(max_available_assistants=3).count())
+        self.assertFalse(self.courses[1].booking_intervals.filter(max_available_assistants=3).exists())
+
+
+class FullRegistrationTest(TestCase):
+    """
+    Registrations past max_available_assistants are refused with 409, the same check the concurrent test below
+    exercises, but one request at a time, so that it also runs on SQLite
+    """
+    NUM_ASSISTANTS = 5
+    CAPACITY = 3
+
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.max_available_assistants = self.CAPACITY
+        self.booking_interval.save()
+        self.assistants = [
+            User.objects.create_user(username=f'ASSISTANT{i}', password='123') for i in range(self.NUM_ASSISTANTS)
+        ]
+        self.course.assistants.add(*self.assistants)
+
+    def test_over_subscribed_registrations(self):
+        statuses = []
+        for assistant in self.assistants:
+            self.client.force_login(assistant)
+            response = self.client.post(reverse('bi_registration_switch'),
+                                        {'nk': self.booking_interval.nk, 'mode': 'register'})
+            data = json.loads(response.content.decode('utf-8'))
+            self.assertLessEqual(data['available_assistants_count'], self.CAPACITY)
+            statuses.append(response.status_code)
+        self.assertEqual([200] * self.CAPACITY + [409] * (self.NUM_ASSISTANTS - self.CAPACITY), statuses)
+        self.assertEqual(set(self.assistants[:self.CAPACITY]), set(self.booking_interval.assistants.all()))
+
+        # a full interval stays full, and frees a seat when an assistant leaves
+        response = self.client.post(reverse('bi_registration_switch'), {'nk': self.booking_interval.nk})
+        self.assertEqual(409, response.status_code)
+        self.assertTrue(json.loads(response.content.decode('utf-8'))['full'])
+        self.client.force_login(self.assistants[0])
+        self.client.post(reverse('bi_registration_switch'), {'nk': self.booking_interval.nk, 'mode': 'unregister'})
+        self.client.force_login(self.assistants[-1])
+        response = self.client.post(reverse('bi_registration_switch'), {'nk': self.booking_interval.nk})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(self.CAPACITY, self.booking_interval.assistants.count())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentRegistrationTest(TransactionTestCase):
+    """
+    Hammers a single booking interval with registrations from many assistants at once.
+    The in-memory SQLite test database can not run concurrent write transactions, so this only runs on databases
+    with row locks, like the MySQL database used in production.
+    """
+    NUM_ASSISTANTS = 20
+    CAPACITY = 3
+
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.booking_interval = self.course.booking_intervals.first()
+        self.booking_interval.max_available_assistants = self.CAPACITY
+        self.booking_interval.save()
+        self.assistants = [
+            User.objects.create_user(username=f'ASSISTANT{i}', password='123') for i in range(self.NUM_ASSISTANTS)
+        ]
+        self.course.assistants.add(*self.assistants)
+
+    def register(self, assistant):
+        client = Client()
+        client.force_login(assistant)
+        try:
+            # every assistant clicks twice
+            return [
+                client.post(reverse('bi_registration_switch'), {'nk': self.booking_interval.nk, 'mode': 'register'})
+                for _ in range(2)
+            ]
+        finally:
+            connection.close()
+
+    def test_concurrent_registrations(self):
+        with ThreadPoolExecutor(max_workers=self.NUM_ASSISTANTS) as executor:
+            responses = [response for pair in executor.map(self.register, self.assistants) for response in pair]
+        self.assertEqual(self.CAPACITY, self.booking_interval.assistants.count())
+        self.assertEqual(2 * self.CAPACITY, sum(response.status_code == 200 for response in responses))
+        for response in responses:
+            self.assertIn(response.status_code, (200, 409))
+            self.assertLessEqual(json.loads(response.content.decode('utf-8'))['available_assistants_count'],
+                                 self.CAPACITY)
+
+
+class QueryPlanTest(TestCase):
+    """
+    The hot booking queries should be answered through an index, as reported by SQLite's EXPLAIN QUERY PLAN
+    """
+
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.user = User.objects.create_user(username='USER', password='123')
+        self.booking_interval = self.course.booking_intervals.first()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=f'query does not use {index_name}: {plan}')
+
+    def test_booking_intervals_by_course_and_start(self):
+        queryset = BookingInterval.objects.filter(course=self.course, start=self.booking_interval.start)
+        self.assertUsesIndex(queryset.order_by('day'), 'booking_bi_course_start_idx')
+
+    def test_booking_intervals_by_assistant(self):
+        queryset = BookingInterval.objects.filter(assistants=self.user).order_by()
+        self.assertUsesIndex(queryset, 'booking_bookinginterval_assistants_user_id')
+
+    def test_reservation_connections_by_student(self):
+        queryset = ReservationConnection.objects.filter(student=self.user).order_by()
+        self.assertUsesIndex(queryset, 'booking_reservationconnection_student_id')
+
+    def test_reservation_connections_by_slot(self):
+        queryset = ReservationConnection.objects.filter(booking_interval=self.booking_interval, slot_index=3).order_by()
+        self.assertUsesIndex(queryset, 'booking_interval_id_slot_index_week_start')
+
+    def test_default_ordering_dropped_on_hot_path(self):
+        """The student grid should not sort on course, which the default ordering of BookingInterval does"""
+        queryset = BookingInterval.objects.filter(course=self.course, start=self.booking_interval.start)
+        self.assertIn('ORDER BY "booking_bookinginterval"."course_id" DESC', str(queryset.query))
+        self.assertNotIn('course_id" DESC', str(queryset.order_by('day').query))
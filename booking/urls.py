@@ -1,11 +1,21 @@
 from django.urls import path
 from booking.views import update_max_num_assistants, bi_registration_switch, ReservationList, \
-    CourseDetailDelegator, AssistantReservationList
+    update_max_num_assistants_batch, bi_registration_batch, \
+    CourseDetailDelegator, AssistantReservationList, CourseAnalytics, AssistantAvailabilityView, \
+    assign_course_assistants, calendar_feed, booking_ticket, hold_slot
 
 urlpatterns = [
     path('reservation/<str:slug>/', CourseDetailDelegator.as_view(), name='course_detail'),
+    path('hold/', hold_slot, name='hold_slot'),
+    path('ticket/<int:pk>/', booking_ticket, name='booking_ticket'),
     path('max_assistants/', update_max_num_assistants, name='update_max_num_assistants'),
+    path('max_assistants/batch/<str:slug>/', update_max_num_assistants_batch, name='update_max_num_assistants_batch'),
     path('bi_registration_switch/', bi_registration_switch, name='bi_registration_switch'),
+    path('bi_registration_batch/', bi_registration_batch, name='bi_registration_batch'),
     path('reservations/', ReservationList.as_view(), name='student_reservation_list'),
     path('assistant_reservations/', AssistantReservationList.as_view(), name='assistant_reservation_list'),
+    path('analytics/<str:slug>/', CourseAnalytics.as_view(), name='course_analytics'),
+    path('availability/<str:slug>/', AssistantAvailabilityView.as_view(), name='assistant_availability'),
+    path('assign_assistants/<str:slug>/', assign_course_assistants, name='assign_assistants'),
+    path('calendar/<str:token>.ics', calendar_feed, name='calendar_feed'),
 ]
@@ -1,24 +1,43 @@
 import calendar
-from datetime import time
+import json
+from collections import defaultdict
+from datetime import datetime, time
 
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, JsonResponse, HttpResponseRedirect, HttpResponseBadRequest, Http404, \
+    StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST, condition
 from django.views.generic import DetailView, ListView, FormView
 from django.views.generic.base import View, TemplateView
 
+from booking.analytics import course_occupancy
 from booking.forms import ReservationConnectionForm
-from booking.models import Course, BookingInterval, ReservationInterval, ReservationConnection
-from itsBooking.extensions.mixins import UserInGroupMixin
+from booking.ical import feed
+from booking.models import Course, BookingInterval, ReservationConnection, ReservationSlot, AssistantAvailability, \
+    CalendarToken, BookingTicket, SlotHold, current_week_start
+from booking.queue import enqueue
+from booking.scheduling import assign_assistants
+from itsBooking.extensions.conditional import conditional_course_page
+from itsBooking.extensions.courses import get_course, user_role
+from itsBooking.extensions.mixins import UserInGroupMixin, CourseObjectMixin
+from itsBooking.extensions.throttling import throttle, slug_course, nk_course, nks_courses, reservation_course
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp, user_stamp, stamp_to_datetime
 from itsBooking.templatetags.helpers import name
 from itsBooking.views import LoginView
 
 WEEKDAYS = list(calendar.day_name)[0:5]
 
 
-class TableView(DetailView):
+class TableView(CourseObjectMixin, DetailView):
     model = Course
     template_name = 'booking/course_detail.html'
 
@@ -27,18 +46,36 @@ class StudentTable(TableView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['weekdays'] = WEEKDAYS
+        booking_intervals = self.object.booking_intervals.order_by('start', 'day').annotate(
+            assistant_count=Count('assistants')
+        )
+        # {(booking interval pk, slot index): reservations} this week for the whole course, fetched in a single query
+        connections = defaultdict(list)
+        for connection in ReservationConnection.objects.current_week().filter(
+                booking_interval__course=self.object).select_related('student').order_by():
+            connections[connection.booking_interval_id, connection.slot_index].append(connection)
+        # other students' unexpired holds, expired ones are left for sweep_slot_holds to delete
+        holds = defaultdict(list)
+        for hold in SlotHold.objects.active().filter(
+                week_start=current_week_start(), booking_interval__course=self.object
+        ).exclude(student=self.request.user).order_by():
+            holds[hold.booking_interval_id, hold.slot_index].append(hold)
+
         intervals = []
         for hour in range(Course.OPEN_BOOKING_TIME, Course.CLOSE_BOOKING_TIME, Course.BOOKING_INTERVAL_LENGTH):
-            booking_intervals = BookingInterval.objects.filter(Q(start=time(hour=hour)) & Q(course=self.object))
+            row = [booking_interval for booking_interval in booking_intervals if booking_interval.start == time(hour)]
             interval = {
                 'start': time(hour),
                 'stop': time(hour + Course.BOOKING_INTERVAL_LENGTH),
-                'booking_intervals': booking_intervals,
+                'booking_intervals': row,
                 'reservation_intervals': [{
                     'start': time(hour=hour + (15 * i) // 60, minute=(15 * i) % 60),
                     'stop': time(hour=hour + (15 * (i + 1)) // 60, minute=(15 * (i + 1)) % 60),
-                    'reservations': [r.reservation_intervals.filter(index=i).first() for r in
-                                     booking_intervals.prefetch_related('reservation_intervals')],
+                    'reservations': [
+                        ReservationSlot(booking_interval, i, connections[booking_interval.pk, i],
+                                        booking_interval.assistant_count, holds[booking_interval.pk, i])
+                        for booking_interval in row
+                    ],
                 }
                     for i in range(Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL)
                 ]
@@ -58,7 +95,9 @@ class AssistantTable(TableView):
         context['weekdays'] = WEEKDAYS
         intervals = []
         for hour in range(Course.OPEN_BOOKING_TIME, Course.CLOSE_BOOKING_TIME, Course.BOOKING_INTERVAL_LENGTH):
-            booking_intervals = BookingInterval.objects.filter(Q(start=time(hour=hour)) & Q(course=self.object))
+            booking_intervals = BookingInterval.objects.filter(
+                Q(start=time(hour=hour)) & Q(course=self.object)
+            ).order_by('day')
             interval = {
                 'start': time(hour),
                 'stop': time(hour + Course.BOOKING_INTERVAL_LENGTH),
@@ -73,6 +112,7 @@ class CourseCoordinatorTable(StudentTable):
     pass
 
 
+@method_decorator(throttle('reservation_create', slug_course), name='post')
 class CreateReservationConnection(UserInGroupMixin, FormView):
     form_class = ReservationConnectionForm
     template_name = 'booking/reservation_input.html'
@@ -81,10 +121,23 @@ class CreateReservationConnection(UserInGroupMixin, FormView):
     def get_success_url(self):
         return reverse('course_detail', kwargs={'slug': self.kwargs['slug']})
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['student'] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
-        reservation_interval = ReservationInterval.objects.get(pk=form.cleaned_data['reservation_pk'])
+        reservation = form.cleaned_data['reservation']
+        course_id = reservation.booking_interval.course_id
+        # the hold has served its purpose once the reservation is confirmed
+        SlotHold.objects.filter(student=self.request.user).delete()
+        if Course.objects.filter(pk=course_id, rush_mode=True).exists():
+            ticket, created = enqueue(course_id, reservation, self.request.user)
+            if not created:
+                messages.info(self.request, 'Du står allerede i kø for en reservasjon i dette emnet.')
+            return HttpResponseRedirect(reverse('booking_ticket', kwargs={'pk': ticket.pk}))
         reservation_connection = ReservationConnection.objects.create(
-            reservation_interval=reservation_interval, student=self.request.user
+            booking_interval=reservation.booking_interval, slot_index=reservation.index, student=self.request.user
         )
         success_message = f'Reservasjon opprettet! Din stud. ass. er {name(reservation_connection.assistant)}'
         messages.success(self.request, success_message)
@@ -96,52 +149,250 @@ class CreateReservationConnection(UserInGroupMixin, FormView):
         return super().form_invalid(form)
 
 
+@require_POST
+@throttle('slot_hold', nk_course)
+def hold_slot(request):
+    """
+    Holds a slot for the student while the confirmation dialog is open, so that nobody else can take it in the
+    meantime. Takes the same parameters as the reservation form, or release to release the student's hold.
+    """
+    if not request.user.is_authenticated or not request.user.groups.filter(name='students').exists():
+        raise PermissionDenied()
+    holds = SlotHold.objects.filter(student=request.user)
+    # holds count against availability on the course page, so the page has to be rendered again
+    course_ids = set(holds.values_list('booking_interval__course_id', flat=True))
+    if 'release' in request.POST:
+        holds.delete()
+        for course_id in course_ids:
+            bump_course_stamp(course_id)
+        return JsonResponse({})
+
+    form = ReservationConnectionForm(request.POST, student=request.user)
+    if not form.is_valid():
+        return JsonResponse({'error': ' '.join(form.non_field_errors()) or 'invalid slot'}, status=409)
+    hold = SlotHold.place(form.cleaned_data['reservation'], request.user)
+    for course_id in course_ids | {hold.booking_interval.course_id}:
+        bump_course_stamp(course_id)
+    return JsonResponse({'expires_at': hold.expires_at.isoformat(), 'seconds': SlotHold.DURATION.total_seconds()})
+
+
+@never_cache
+def booking_ticket(request, pk):
+    """The student's booking ticket for a course in rush mode. The page polls the ticket as JSON until it is processed"""
+    ticket = get_object_or_404(
+        BookingTicket.objects.select_related('course', 'booking_interval'), pk=pk, student_id=request.user.pk
+    )
+    position = ticket.position()
+    if request.is_ajax():
+        return JsonResponse({'status': ticket.status, 'message': ticket.message, 'position': position})
+    return render(request, 'booking/booking_ticket.html', {'ticket': ticket, 'position': position})
+
+
 class CourseDetailDelegator(View):
     delegator = {
-        'students': StudentTable.as_view(),
-        'assistants': AssistantTable.as_view(),
-        'course_coordinators': CourseCoordinatorTable.as_view(),
+        'students': conditional_course_page(StudentTable.as_view(), holds=True),
+        'assistants': conditional_course_page(AssistantTable.as_view()),
+        'course_coordinators': conditional_course_page(CourseCoordinatorTable.as_view()),
     }
 
     def dispatch(self, request, *args, **kwargs):
         # if user not logged in or not in any groups -> 403, if user is missing groups -> Login page
-        if not request.user.is_authenticated or not request.user.groups.all():
+        request_user_group = user_role(request)
+        if request_user_group is None:
             raise PermissionDenied
-        request_user_group = self.request.user.groups.first().name
         return self.delegator.get(request_user_group, LoginView.as_view())(request, *args, **kwargs)
 
 
+@throttle('max_assistants', nk_course)
 def update_max_num_assistants(request):
     nk = request.GET.get('nk', None)
     num = request.GET.get('num', None)
-    booking_interval = BookingInterval.objects.get(nk=nk)
+    booking_interval = get_object_or_404(BookingInterval.objects.select_related('course'), nk=nk)
 
     if request.user == booking_interval.course.course_coordinator:
-        booking_interval.max_available_assistants = num
-        booking_interval.save()
+        numbers = _seat_numbers({nk: num})
+        if numbers is None:
+            return HttpResponseBadRequest()
+        BookingInterval.objects.filter(pk=booking_interval.pk).update(max_available_assistants=numbers[nk])
+        bump_course_stamp(booking_interval.course_id)
         return HttpResponse('')
 
     raise PermissionDenied()
 
 
-def bi_registration_switch(request):
-    nk = request.GET.get('nk', None)
-    booking_interval = BookingInterval.objects.get(nk=nk)
+def _parse_json(request):
+    try:
+        return json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return None
 
-    if not booking_interval.course.assistants.filter(id=request.user.id).exists():
+
+def _seat_numbers(changes):
+    """changes as {key: int}, or None if any of the numbers is not a whole number of seats"""
+    numbers = {}
+    for key, num in changes.items():
+        try:
+            numbers[key] = int(num)
+        except (TypeError, ValueError):
+            return None
+        if numbers[key] < 0:
+            return None
+    return numbers
+
+
+def _start_time(start):
+    """start as a time, or None if it is not a valid time"""
+    try:
+        return parse_time(start)
+    except ValueError:
+        # parse_time raises ValueError for well formed times that do not exist, like 25:00
+        return None
+
+
+@require_POST
+@throttle('max_assistants', slug_course)
+def update_max_num_assistants_batch(request, slug):
+    """
+    Sets max_available_assistants for many booking intervals of a course in one transaction.
+    Takes a JSON body with 'pattern', {start time: number}, which is applied to every day of the week, and/or
+    'changes', {nk: number}, which is applied after the pattern. Intervals that get the same number are updated
+    with a single query.
+    """
+    course = get_course(request, slug)
+    if request.user != course.course_coordinator:
         raise PermissionDenied()
-    if not booking_interval.assistants.filter(id=request.user.id).exists():
-        booking_interval.assistants.add(request.user.id)
-        registration_available = False
-    else:
-        booking_interval.assistants.remove(request.user.id)
-        registration_available = True
-    available_assistants_count = booking_interval.assistants.all().count()
+    data = _parse_json(request)
+    if not isinstance(data, dict) or not all(isinstance(data.get(key, {}), dict) for key in ('pattern', 'changes')):
+        return JsonResponse({'error': 'expected {"pattern": {start: number}, "changes": {nk: number}}'}, status=400)
+    pattern = _seat_numbers(data.get('pattern', {}))
+    changes = _seat_numbers(data.get('changes', {}))
+    starts = {start: _start_time(start) for start in pattern or {}}
+    if pattern is None or changes is None or None in starts.values():
+        return JsonResponse({'error': 'invalid number or start time'}, status=400)
+
+    pattern_groups, change_groups = defaultdict(list), defaultdict(list)
+    for start, num in pattern.items():
+        pattern_groups[num].append(starts[start])
+    for nk, num in changes.items():
+        change_groups[num].append(nk)
+
+    updated = 0
+    with transaction.atomic():
+        for num, start_times in pattern_groups.items():
+            updated += course.booking_intervals.filter(start__in=start_times).update(max_available_assistants=num)
+        for num, nks in change_groups.items():
+            updated += course.booking_intervals.filter(nk__in=nks).update(max_available_assistants=num)
+        # update() sends no signals
+        transaction.on_commit(lambda: bump_course_stamp(course.pk))
+    return JsonResponse({'updated': updated})
+
+
+@throttle('registration', nk_course)
+def bi_registration_switch(request):
+    """
+    Registers or unregisters the assistant for a booking interval, depending on mode ('register' or 'unregister').
+    Without a mode the registration is toggled. The booking interval row is locked for the whole operation, so
+    concurrent requests can not fill it past max_available_assistants or toggle it twice.
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    mode = params.get('mode')
+    if mode not in (None, 'register', 'unregister'):
+        return JsonResponse({'error': 'mode must be register or unregister'}, status=400)
+
+    with transaction.atomic():
+        booking_interval = get_object_or_404(BookingInterval.objects.select_for_update(), nk=params.get('nk'))
+        if not booking_interval.course.assistants.filter(id=request.user.id).exists():
+            raise PermissionDenied()
+        registered = booking_interval.assistants.filter(id=request.user.id).exists()
+        count = booking_interval.assistants.count()
+        if mode is None:
+            mode = 'unregister' if registered else 'register'
+
+        status = 200
+        if mode == 'register' and not registered:
+            if count >= booking_interval.max_available_assistants:
+                status = 409
+            else:
+                booking_interval.assistants.add(request.user.id)
+                registered, count = True, count + 1
+        elif mode == 'unregister' and registered:
+            booking_interval.assistants.remove(request.user.id)
+            registered, count = False, count - 1
+
     data = {
-        'registration_available': registration_available,
-        'available_assistants_count': available_assistants_count,
+        'registration_available': not registered,
+        'available_assistants_count': count,
+        'full': count >= booking_interval.max_available_assistants,
     }
-    return JsonResponse(data)
+    return JsonResponse(data, status=status)
+
+
+@require_POST
+@throttle('registration', nks_courses)
+def bi_registration_batch(request):
+    """
+    Registers and unregisters the assistant for many booking intervals in one transaction.
+    Takes a JSON body with 'register' and 'unregister' lists of booking interval nks. The booking intervals are
+    locked like in bi_registration_switch, and registrations for full intervals are skipped.
+    Returns the new state of every booking interval in the request.
+    """
+    if not request.user.is_authenticated:
+        raise PermissionDenied()
+    data = _parse_json(request)
+    if not isinstance(data, dict) or not all(
+            isinstance(data.get(key, []), list) and all(isinstance(nk, str) for nk in data.get(key, []))
+            for key in ('register', 'unregister')):
+        return JsonResponse({'error': 'expected {"register": [nk], "unregister": [nk]}'}, status=400)
+    register, unregister = set(data.get('register', [])), set(data.get('unregister', []))
+    if register & unregister:
+        return JsonResponse({'error': 'can not both register and unregister for a booking interval'}, status=400)
+
+    through = BookingInterval.assistants.through
+    with transaction.atomic():
+        # lock in primary key order, so that overlapping batches can not deadlock
+        booking_intervals = list(
+            BookingInterval.objects.select_for_update().filter(nk__in=register | unregister).order_by('pk')
+        )
+        if len(booking_intervals) != len(register | unregister):
+            raise Http404()
+        course_ids = {booking_interval.course_id for booking_interval in booking_intervals}
+        if Course.objects.filter(pk__in=course_ids, assistants=request.user).count() != len(course_ids):
+            raise PermissionDenied()
+
+        pks = [booking_interval.pk for booking_interval in booking_intervals]
+        counts = dict(through.objects.filter(bookinginterval_id__in=pks).order_by().values(
+            'bookinginterval_id').annotate(count=Count('pk')).values_list('bookinginterval_id', 'count'))
+        registered = set(through.objects.filter(
+            bookinginterval_id__in=pks, user_id=request.user.id
+        ).values_list('bookinginterval_id', flat=True))
+
+        added, removed, results = [], [], {}
+        for booking_interval in booking_intervals:
+            count = counts.get(booking_interval.pk, 0)
+            if (booking_interval.nk in register and booking_interval.pk not in registered
+                    and count < booking_interval.max_available_assistants):
+                added.append(booking_interval.pk)
+                registered.add(booking_interval.pk)
+                count += 1
+            elif booking_interval.nk in unregister and booking_interval.pk in registered:
+                removed.append(booking_interval.pk)
+                registered.remove(booking_interval.pk)
+                count -= 1
+            results[booking_interval.nk] = {
+                'registration_available': booking_interval.pk not in registered,
+                'available_assistants_count': count,
+                'full': count >= booking_interval.max_available_assistants,
+            }
+        through.objects.bulk_create([through(bookinginterval_id=pk, user_id=request.user.id) for pk in added])
+        through.objects.filter(bookinginterval_id__in=removed, user_id=request.user.id).delete()
+
+        # the bulk queries send no m2m_changed signals
+        def bump_stamps():
+            for course_id in course_ids:
+                bump_course_stamp(course_id)
+            bump_user_stamp(request.user.id)
+        transaction.on_commit(bump_stamps)
+    return JsonResponse({'booking_intervals': results})
 
 
 class ReservationList(UserInGroupMixin, ListView):
@@ -149,13 +400,22 @@ class ReservationList(UserInGroupMixin, ListView):
     allowed_groups = ('students',)
 
     def get_queryset(self):
-        return ReservationConnection.objects.filter(student=self.request.user)
+        return ReservationConnection.objects.current_week().filter(
+            student=self.request.user
+        ).select_related('booking_interval__course', 'assistant')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data()
-        context.update({'days': WEEKDAYS})
+        reservations_by_day = defaultdict(list)
+        for connection in context['object_list']:
+            reservations_by_day[connection.booking_interval.day].append(connection)
+        context.update({
+            'days': [(day, reservations_by_day[i]) for i, day in enumerate(WEEKDAYS)],
+            'calendar_url': calendar_url(self.request),
+        })
         return context
 
+    @method_decorator(throttle('reservation_cancel', reservation_course))
     def post(self, request):
         try:
             rc = ReservationConnection.objects.get(pk=request.POST['reservation_connection_pk'])
@@ -178,23 +438,154 @@ class AssistantReservationList(UserInGroupMixin, TemplateView):
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data()
-        bis = BookingInterval.objects.filter(assistants=self.request.user)
+        bis = BookingInterval.objects.filter(
+            assistants=self.request.user
+        ).select_related('course').order_by('day', 'start')
+        # {(booking interval pk, slot index): reservation} for all of the assistant's reservations
+        connections = {
+            (connection.booking_interval_id, connection.slot_index): connection
+            for connection in ReservationConnection.objects.current_week().filter(
+                assistant=self.request.user).select_related('student').order_by()
+        }
         booking_intervals = []
         for booking_interval in bis:
-            reservation_intervals = booking_interval.reservation_intervals.all()
             booking_intervals.append(
                 {
                     'booking_interval': booking_interval,
-                    'reservation_intervals': [
+                    'reservation_slots': [
                         {
-                            'reservation_interval': reservation_interval,
-                            'connection': reservation_interval.connections.filter(assistant=self.request.user).first(),
+                            'slot': slot,
+                            'connection': connections.get((booking_interval.pk, slot.index)),
                         }
-                        for reservation_interval in reservation_intervals],
+                        for slot in booking_interval.get_reservation_slots()],
 
                 }
             )
         context.update({
-            'booking_intervals': booking_intervals
+            'booking_intervals': booking_intervals,
+            'calendar_url': calendar_url(self.request),
         })
         return context
+
+
+class CourseAnalytics(UserInGroupMixin, CourseObjectMixin, DetailView):
+    model = Course
+    template_name = 'booking/course_analytics.html'
+    allowed_groups = ('course_coordinators',)
+
+    def get_object(self, queryset=None):
+        course = super().get_object(queryset)
+        if course.course_coordinator_id != self.request.user.pk:
+            raise PermissionDenied()
+        return course
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['weekdays'] = WEEKDAYS
+        context['occupancy'] = course_occupancy(self.object)
+        return context
+
+
+class AssistantAvailabilityView(UserInGroupMixin, CourseObjectMixin, DetailView):
+    """Lets an assistant submit the booking intervals they are available for, used when the course is staffed"""
+    model = Course
+    template_name = 'booking/assistant_availability.html'
+    allowed_groups = ('assistants',)
+
+    def get_object(self, queryset=None):
+        course = super().get_object(queryset)
+        if not course.assistants.filter(pk=self.request.user.pk).exists():
+            raise PermissionDenied()
+        return course
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        preferences = dict(AssistantAvailability.objects.filter(
+            assistant=self.request.user, booking_interval__course=self.object
+        ).values_list('booking_interval_id', 'preference'))
+        booking_intervals = list(self.object.booking_intervals.order_by('start', 'day'))
+        for booking_interval in booking_intervals:
+            booking_interval.preference = preferences.get(booking_interval.pk)
+        context.update({
+            'weekdays': WEEKDAYS,
+            'preference_choices': AssistantAvailability.PREFERENCE_CHOICES,
+            'intervals': [
+                {
+                    'start': time(hour),
+                    'stop': time(hour + Course.BOOKING_INTERVAL_LENGTH),
+                    'booking_intervals': [bi for bi in booking_intervals if bi.start == time(hour)],
+                }
+                for hour in range(Course.OPEN_BOOKING_TIME, Course.CLOSE_BOOKING_TIME, Course.BOOKING_INTERVAL_LENGTH)
+            ],
+        })
+        return context
+
+    def post(self, request, *args, **kwargs):
+        course = self.get_object()
+        choices = {str(value) for value, _ in AssistantAvailability.PREFERENCE_CHOICES}
+        availabilities = []
+        for pk in course.booking_intervals.values_list('pk', flat=True):
+            preference = request.POST.get(f'bi-{pk}', '')
+            if preference in choices:
+                availabilities.append(
+                    AssistantAvailability(assistant=request.user, booking_interval_id=pk, preference=int(preference))
+                )
+        # together, so that a failed insert keeps the old preferences and a second submit waits for the first
+        with transaction.atomic():
+            AssistantAvailability.objects.filter(assistant=request.user, booking_interval__course=course).delete()
+            AssistantAvailability.objects.bulk_create(availabilities)
+        messages.success(request, 'Tilgjengelighet lagret!')
+        return HttpResponseRedirect(request.path)
+
+
+def assign_course_assistants(request, slug):
+    course = get_course(request, slug)
+    if request.method != 'POST' or request.user != course.course_coordinator:
+        raise PermissionDenied()
+    assignment = assign_assistants(course)
+    seats = sum(len(assistants) for assistants in assignment.values())
+    messages.success(request, f'Studassene er fordelt på saltidene, {seats} plasser ble fylt')
+    return HttpResponseRedirect(reverse('course_detail', kwargs={'slug': slug}))
+
+
+def _calendar_feed_version(request, token):
+    """(user id, last modified) of the feed with the given token, or None if there is no such feed"""
+    if not hasattr(request, '_calendar_feed_version'):
+        user_id = CalendarToken.objects.filter(token=token).values_list('user_id', flat=True).first()
+        if user_id is None:
+            request._calendar_feed_version = None
+        else:
+            # recurring shifts start in the current week, so the feed also changes every monday
+            week_start = timezone.make_aware(datetime.combine(current_week_start(), datetime.min.time()))
+            request._calendar_feed_version = (user_id, max(stamp_to_datetime(user_stamp(user_id)), week_start))
+    return request._calendar_feed_version
+
+
+def _calendar_feed_etag(request, token):
+    version = _calendar_feed_version(request, token)
+    return version and f'{version[0]}-{version[1].timestamp()!r}'
+
+
+def _calendar_feed_last_modified(request, token):
+    version = _calendar_feed_version(request, token)
+    return version and version[1]
+
+
+@condition(etag_func=_calendar_feed_etag, last_modified_func=_calendar_feed_last_modified)
+def calendar_feed(request, token):
+    """
+    The user's schedule as an iCalendar feed. Calendar clients poll it, so unchanged feeds are answered with
+    304 Not Modified from the user's version stamp without querying their reservations.
+    """
+    version = _calendar_feed_version(request, token)
+    if version is None:
+        raise Http404()
+    user_id, last_modified = version
+    response = StreamingHttpResponse(feed(user_id, last_modified), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="saltider.ics"'
+    return response
+
+
+def calendar_url(request):
+    token, _ = CalendarToken.objects.get_or_create(user=request.user)
+    return request.build_absolute_uri(reverse('calendar_feed', kwargs={'token': token.token}))
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from communications.models import Announcement, Comment, Avatar
+from itsBooking.extensions.versioning import bump_course_stamp, bump_user_stamp
+
+
+@receiver([post_save, post_delete], sender=Announcement)
+def announcement_changed(sender, instance, **kwargs):
+    bump_course_stamp(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_course_stamp(Announcement.objects.filter(pk=instance.announcement_id).values_list('course_id', flat=True)
+                      .first())
+
+
+@receiver([post_save, post_delete], sender=Avatar)
+def avatar_changed(sender, instance, **kwargs):
+    # avatars are shown next to the user's announcements and comments
+    course_ids = set(Announcement.objects.filter(author=instance.user_id).values_list('course_id', flat=True))
+    course_ids.update(Comment.objects.filter(author=instance.user_id).values_list('announcement__course_id', flat=True))
+    for course_id in course_ids:
+        bump_course_stamp(course_id)
+    bump_user_stamp(instance.user_id)
@@ -76,6 +76,16 @@ class AnnouncementViewTest(TestCase):
             ['<Announcement: test>', '<Announcement: test>']
         )
 
+    def test_announcement_list_conditional(self):
+        url = reverse('announcements', kwargs={'slug': self.course.slug})
+        self.client.get(url)  # sets the csrf cookie
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        announcement = self._create_announcement()
+        etag = self.client.get(url, HTTP_IF_NONE_MATCH=etag)['ETag']
+        announcement.comments.create(content='test', author=self.user)
+        self.assertEqual(200, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
     def test_announcements_list_page_testfunc(self):
         # logged in as cc
         response = self.client.get(reverse('announcements', kwargs={'slug': self.course.slug}))
@@ -2,10 +2,12 @@ from django.contrib.auth.mixins import UserPassesTestMixin
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, ListView, DeleteView, DetailView
 
-from booking.models import Course
 from communications.models import Announcement, Comment
+from itsBooking.extensions.conditional import conditional_course_page
+from itsBooking.extensions.courses import get_course
 from itsBooking.extensions.mixins import UserInGroupMixin
 from itsBooking.templatetags.helpers import user_in_group
 from .forms import AnnouncementForm
@@ -16,8 +18,7 @@ class AnnouncementListView(UserInGroupMixin, ListView):
     allowed_groups = ('assistants', 'course_coordinators')
 
     def get_queryset(self):
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
-        return Announcement.objects.filter(course=course).order_by('-id')
+        return get_course(self.request, self.kwargs['slug']).announcement.order_by('-id')
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -26,10 +27,14 @@ class AnnouncementListView(UserInGroupMixin, ListView):
                 'announcement_form': AnnouncementForm(),
             })
         context.update({
-            'course': get_object_or_404(Course, slug=self.kwargs['slug'])
+            'course': get_course(self.request, self.kwargs['slug'])
         })
         return context
 
+    @method_decorator(conditional_course_page)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def post(self, request, *args, **kwargs):
         # handle reviews through a separate view
         return CreateAnnouncementView.as_view()(request, *args, **kwargs)
@@ -64,10 +69,7 @@ class CreateAnnouncementView(UserInGroupMixin, CreateView):
     def form_valid(self, form):
         announcement = form.save(commit=False)
         announcement.author = self.request.user
-        announcement.course = get_object_or_404(
-            Course,
-            slug=self.kwargs['slug']
-        )
+        announcement.course = get_course(self.request, self.kwargs['slug'])
         announcement.save()
         return self.get_success_url()
 
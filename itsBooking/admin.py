@@ -2,29 +2,82 @@ from django import forms
 from django.contrib import admin
 from django.contrib.auth.models import User, Group
 
+from booking.models import Course
+from itsBooking.extensions.admin import action_form, action_form_data
+
 admin.site.unregister(User)
 admin.site.unregister(Group)
 
 
-class UserAdmin(admin.ModelAdmin):
-    readonly_fields = ('last_login', 'date_joined')
+class UserForm(forms.ModelForm):
+    # users are in a single group
+    groups = forms.ModelChoiceField(Group.objects.all(), label='Gruppe')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        groups = self.initial.get('groups')
+        if groups:
+            self.initial['groups'] = groups[0].pk
+
+    def clean_groups(self):
+        return [self.cleaned_data['groups']]
+
+
+class CourseMembershipForm(forms.Form):
+    ROLE_CHOICES = (
+        ('students', 'Student'),
+        ('assistants', 'Studentassistent'),
+    )
+
+    course = forms.ModelChoiceField(Course.objects.all(), label='Emne')
+    role = forms.ChoiceField(choices=ROLE_CHOICES, label='Rolle')
+
+
+def _change_course_membership(modeladmin, request, queryset, enroll):
+    """Asks for a course and role, then enrolls the selected users in it or removes them from it"""
+    form = CourseMembershipForm(action_form_data(request))
+    response = action_form(modeladmin, request, queryset, form, 'Meld på emne' if enroll else 'Meld av emne')
+    if response is not None:
+        return response
 
-    def get_form(self, request, obj=None, change=False, **kwargs):
-        form = super().get_form(request, obj, change, **kwargs)
+    role = form.cleaned_data['role']
+    members = getattr(form.cleaned_data['course'], role)
+    if enroll:
+        # only users in the role's group can be enrolled in it
+        user_ids = list(queryset.filter(groups__name=role).values_list('pk', flat=True))
+        members.add(*user_ids)
+        modeladmin.message_user(request, f'Meldte på {len(user_ids)} av {queryset.count()} brukere')
+    else:
+        user_ids = list(queryset.values_list('pk', flat=True))
+        members.remove(*user_ids)
+        modeladmin.message_user(request, f'Meldte av {len(user_ids)} brukere')
 
-        choices = list(form.base_fields['groups'].choices)
-        if obj is not None:
-            usr_group = (obj.groups.first().id, str(obj.groups.first()))
-            del choices[choices.index(usr_group)]
-            choices.append(usr_group)
 
-        form.base_fields['groups'] = forms.ChoiceField(
-            choices=reversed(choices),
-            label='Gruppe',
-        )
-        # form.base_fields['groups'].initial = obj.groups.first()
-        return form
+def enroll_in_course(modeladmin, request, queryset):
+    return _change_course_membership(modeladmin, request, queryset, enroll=True)
+
+
+enroll_in_course.short_description = 'Meld valgte brukere på et emne'
+
+
+def remove_from_course(modeladmin, request, queryset):
+    return _change_course_membership(modeladmin, request, queryset, enroll=False)
+
+
+remove_from_course.short_description = 'Meld valgte brukere av et emne'
+
+
+class UserAdmin(admin.ModelAdmin):
+    form = UserForm
+    readonly_fields = ('last_login', 'date_joined')
+    list_display = ('username', 'first_name', 'last_name', 'email', 'is_staff')
+    list_filter = ('groups', 'is_staff', 'is_active')
+    # prefix searches, which can use the indexes on the columns
+    search_fields = ('^username', '^first_name', '^last_name', '^email')
+    actions = (enroll_in_course, remove_from_course)
+    # counting every user for "x of y selected" is not worth a query on every page
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Group)
\ No newline at end of file
+admin.site.register(Group)
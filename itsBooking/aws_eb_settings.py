@@ -44,10 +44,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'itsBooking.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'itsBooking.extensions.template_profiler.TemplateProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,7 +60,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -66,6 +67,13 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # DEBUG is on, which would otherwise leave out the cached loader and compile templates on every render
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -77,15 +85,57 @@ WSGI_APPLICATION = 'itsBooking.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'itsBooking.db.mysql',
         'NAME': os.environ['RDS_DB_NAME'],
         'USER': os.environ['RDS_USERNAME'],
         'PASSWORD': os.environ['RDS_PASSWORD'],
         'HOST': os.environ['RDS_HOSTNAME'],
         'PORT': os.environ['RDS_PORT'],
+        # keep one connection per worker thread open between requests instead of reconnecting to RDS every time.
+        # Connections are recycled after CONN_MAX_AGE seconds and pinged before being reused.
+        'CONN_MAX_AGE': int(os.environ.get('RDS_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+DATABASE_ROUTERS = ['itsBooking.db.routers.PrimaryReplicaRouter']
+
+# Aliases in DATABASES that are read-only copies of 'default'. Read-only requests are spread across them
+REPLICA_DATABASES = []
+
+if 'RDS_REPLICA_HOSTNAME' in os.environ:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.environ['RDS_REPLICA_HOSTNAME'],
+        PORT=os.environ.get('RDS_REPLICA_PORT', os.environ['RDS_PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+    REPLICA_DATABASES.append('replica')
+
+# Number of seconds a user's reads stay on the primary database after they have written something
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+# Shared by every worker process, so that bumping a course's version stamp (itsBooking.extensions.versioning)
+# invalidates what all of them have cached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+    # per process, the throttles must not cost a database query
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+# Token buckets for the booking endpoints, as (tokens added per second, bucket size).
+# See itsBooking.extensions.throttling
+BOOKING_THROTTLES = {
+    'user': (1, 10),
+    'course': (50, 200),
+}
+
 #########################
 # Import local settings
 #########################
@@ -129,6 +179,9 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Quick hack to let us see if code is running through tests or not
+TEST = 'test' in sys.argv
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.0/howto/static-files/
 
@@ -143,11 +196,19 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGOUT_URL = '/'
 
+# content hashed file names and precompressed variants, see itsBooking.extensions.staticfiles.
+# The manifest is only written by collectstatic, so tests keep the default storage
+if not TEST:
+    STATICFILES_STORAGE = 'itsBooking.extensions.staticfiles.CompressedManifestStaticFilesStorage'
+# serve static files from Django, for deployments without Apache or nginx in front
+SERVE_STATIC = os.environ.get('SERVE_STATIC') == '1'
+
+# compile templates and connect to the database when a worker starts, see itsBooking.extensions.warmup
+WARM_UP_WORKERS = os.environ.get('WARM_UP_WORKERS', '1') == '1'
+
 # enable stdout (print) during testing
 NOSE_ARGS = [
     '--nocapture',
     '--nologcapture',
 ]
 
-# Quick hack to let us see if code is running through tests or not
-TEST = 'test' in sys.argv
@@ -0,0 +1,22 @@
+from django.db import connections, router
+
+DELETE_BATCH_SIZE = 1000
+
+
+def delete_pks(model, pks, batch_size=DELETE_BATCH_SIZE):
+    """
+    Deletes the rows of model with the primary keys pks with DELETE ... WHERE pk IN, batch_size keys at a time.
+    Unlike QuerySet.delete() the rows are not collected first, so nothing is cascaded and no signals are sent,
+    the caller has to take care of both. Returns the number of rows deleted.
+    """
+    pks = list(pks)
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for i in range(0, len(pks), batch_size):
+            batch = pks[i:i + batch_size]
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(batch))})', batch)
+            deleted += cursor.rowcount
+    return deleted
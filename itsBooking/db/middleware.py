@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+
+from itsBooking.db import routers
+
+PIN_COOKIE_NAME = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets read-only requests read from the replicas, unless the user has written something in the last
+    REPLICA_PIN_SECONDS seconds. A write pins the user's reads to the primary database through a short lived cookie,
+    so that they never see a replica that has not yet caught up with their own reservation, registration or review.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE_NAME, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        routers.start_request(use_replica=request.method in SAFE_METHODS and not pinned)
+        try:
+            response = self.get_response(request)
+            if routers.wrote_to_primary():
+                pin_seconds = settings.REPLICA_PIN_SECONDS
+                response.set_cookie(PIN_COOKIE_NAME, int(time.time() + pin_seconds),
+                                    max_age=pin_seconds, httponly=True)
+        finally:
+            routers.end_request()
+        return response
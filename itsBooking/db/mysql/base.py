@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from itsBooking.db.persistent import PersistentConnectionMixin
+
+
+class DatabaseWrapper(PersistentConnectionMixin, base.DatabaseWrapper):
+    pass
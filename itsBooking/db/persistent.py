@@ -0,0 +1,74 @@
+import threading
+import time
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(alias, **increments):
+    with _stats_lock:
+        stats = _stats.setdefault(alias, {
+            'connects': 0,
+            'connect_time': 0.0,
+            'reuses': 0,
+            'failed_health_checks': 0,
+            'recycled': 0,
+        })
+        for key, value in increments.items():
+            stats[key] += value
+
+
+def get_connection_stats():
+    """
+    Returns the connection counters of this worker process, per database alias.
+    connect_time is the total number of seconds spent opening new connections.
+    """
+    with _stats_lock:
+        return {alias: dict(stats) for alias, stats in _stats.items()}
+
+
+def reset_connection_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class PersistentConnectionMixin:
+    """
+    Database wrapper mixin for connections that are kept open between requests.
+
+    How long a connection is kept is decided by CONN_MAX_AGE, after which it is closed and recycled at the end of
+    the request. With CONN_HEALTH_CHECKS set to True in the database settings, a connection carried over from an
+    earlier request is pinged the first time it is used, and replaced by a new one if the server has dropped it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+        self.health_check_done = False
+
+    def connect(self):
+        # a brand new connection does not need to be checked
+        self.health_check_done = True
+        start = time.perf_counter()
+        super().connect()
+        _record(self.alias, connects=1, connect_time=time.perf_counter() - start)
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done and not self.in_atomic_block:
+            # first use of a connection that was kept open from an earlier request
+            self.health_check_done = True
+            if self.health_check_enabled and not self.is_usable():
+                _record(self.alias, failed_health_checks=1)
+                self.close()
+            else:
+                _record(self.alias, reuses=1)
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None and self.close_at is not None and time.time() >= self.close_at:
+            _record(self.alias, recycled=1)
+        # get_autocommit() is called by the parent implementation and should not count as a use of the connection
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        # whatever is left open has to be checked again before the next request uses it
+        self.health_check_done = False
@@ -0,0 +1,50 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Apps whose tables are always read from the primary database, as stale rows there would break logins and the like.
+# django_cache is the table of the database cache backend
+PRIMARY_ONLY_APPS = ('sessions', 'django_cache')
+
+_state = threading.local()
+
+
+def start_request(use_replica):
+    _state.use_replica = use_replica
+    _state.wrote = False
+
+
+def end_request():
+    _state.use_replica = False
+    _state.wrote = False
+
+
+def wrote_to_primary():
+    return getattr(_state, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to one of the read replicas listed in settings.REPLICA_DATABASES and writes to the primary database.
+
+    Replicas are only used while ReplicaRoutingMiddleware has marked the current request as read-only. As soon as
+    something is written, the rest of the request reads from the primary database as well.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        if (not replicas or model._meta.app_label in PRIMARY_ONLY_APPS
+                or wrote_to_primary() or not getattr(_state, 'use_replica', False)):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every database holds a copy of the same data
+        return True
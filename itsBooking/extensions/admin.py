@@ -0,0 +1,68 @@
+"""
+Admin helpers for tables with thousands of rows.
+
+A regular inline renders a form for every related row. PaginatedTabularInline renders a single page of them, chosen
+by the ?<formset prefix>-page parameter, so the change page costs the same no matter how many rows there are.
+action_form() asks for the parameters of a bulk action before it is applied to the selected rows.
+"""
+from django.contrib import admin
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    per_page = 50
+    page_number = None
+
+    @classmethod
+    def get_page_parameter(cls):
+        return f'{cls.get_default_prefix()}-page'
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            # the admin posts the form to the url it was shown at, so the same page is saved
+            self.page = Paginator(super().get_queryset(), self.per_page).get_page(self.page_number)
+            self._queryset = self.page.object_list
+        return self._queryset
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    formset = PaginatedInlineFormSet
+    template = 'admin/edit_inline/paginated_tabular.html'
+    per_page = 50
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        return type(formset.__name__, (formset,), {
+            'per_page': self.per_page,
+            'page_number': request.GET.get(formset.get_page_parameter()),
+        })
+
+
+def action_form(modeladmin, request, queryset, form, title, warning=None):
+    """
+    The page asking for the parameters of an action, form is bound to request.POST once it has been submitted.
+    Returns None when form is valid, the action should then be applied.
+    """
+    if form.is_bound and form.is_valid():
+        return None
+    return TemplateResponse(request, 'admin/action_form.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': title,
+        'warning': warning,
+        'opts': modeladmin.model._meta,
+        'objects_name': modeladmin.model._meta.verbose_name_plural,
+        'form': form,
+        'count': queryset.count(),
+        'action': request.POST['action'],
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+    })
+
+
+def action_form_data(request):
+    """The data to bind an action's form to, None until the form has been submitted"""
+    return request.POST if 'apply' in request.POST else None
@@ -0,0 +1,85 @@
+"""
+Conditional GET for course pages.
+
+A course page only changes when the course's data, the user's own data or the week changes, and the version
+stamps track the first two. The ETag is computed from the stamps before the view runs, so reloading an unchanged
+page is answered with 304 Not Modified without running the view's queries or rendering the template. Pages that
+show slot holds also change when a hold expires, which bumps no stamp until sweep_slot_holds deletes the hold.
+"""
+import hashlib
+from datetime import datetime
+from functools import partial, wraps
+
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from booking.models import SlotHold, current_week_start
+from itsBooking.extensions.courses import get_course
+from itsBooking.extensions.versioning import course_stamp, user_stamp, stamp_to_datetime
+
+
+def _page_version(request, slug, holds=False, **kwargs):
+    """
+    (etag, last modified) of the course page, or None if the page has to be rendered. With holds, the page also
+    changes when one of the course's holds expires.
+    """
+    if not hasattr(request, '_course_page_version'):
+        request._course_page_version = None
+        csrf_cookie = request.META.get('CSRF_COOKIE')
+        # pages with pending messages are rendered to show them, and pages without a csrf cookie to set it
+        if request.method in ('GET', 'HEAD') and request.user.is_authenticated and csrf_cookie \
+                and not len(get_messages(request)):
+            try:
+                # the view uses the same course, so this is the only time it is loaded
+                course_id = get_course(request, slug).pk
+            except Http404:
+                course_id = None
+            if course_id is not None:
+                stamps = (course_stamp(course_id), user_stamp(request.user.pk))
+                week_start = timezone.make_aware(datetime.combine(current_week_start(), datetime.min.time()))
+                changes = [week_start] + [stamp_to_datetime(stamp) for stamp in stamps]
+                # the page is the user's own and embeds their csrf token, so both are part of the etag
+                parts = (course_id, request.user.pk, csrf_cookie, week_start) + stamps
+                if holds:
+                    # the last expiry of a hold that is not swept yet, which is when the page last changed by itself
+                    expired = SlotHold.objects.expired().filter(
+                        week_start=current_week_start(), booking_interval__course_id=course_id
+                    ).aggregate(last=Max('expires_at'))['last']
+                    parts += (expired,)
+                    changes += [expired] if expired else []
+                tag = ':'.join(map(repr, parts))
+                request._course_page_version = (hashlib.md5(tag.encode()).hexdigest(), max(changes))
+    return request._course_page_version
+
+
+def _page_etag(request, *args, **kwargs):
+    version = _page_version(request, **kwargs)
+    return version and version[0]
+
+
+def _page_last_modified(request, *args, **kwargs):
+    version = _page_version(request, **kwargs)
+    return version and version[1]
+
+
+def conditional_course_page(view, holds=False):
+    """
+    Answers GET requests for the course page given by the view's slug argument with 304 Not Modified if it has
+    not changed since the client last fetched it. Permission checks must have been done before the view is called.
+    holds is for pages that show the course's slot holds.
+    """
+    conditional_view = condition(
+        etag_func=partial(_page_etag, holds=holds), last_modified_func=partial(_page_last_modified, holds=holds)
+    )(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        # only the user may cache the page, and it has to ask before using it
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
@@ -0,0 +1,40 @@
+"""
+The course a request is for, loaded once per request.
+
+Every course page is under the course's slug, and its delegator, conditional GET handling, view and templates all
+need the course. get_course loads it by slug the first time it is asked for, and hands out the same course to everyone
+after that. On the pages the delegators pick by the user's role, it is loaded together with what the role's page uses.
+Querysets of the course's rows are best made through the course's reverse relations (course.announcement.all() and the
+like), as their rows then point to this same course instead of each loading it again.
+"""
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+
+from booking.models import Course
+
+# what the pages of each role use of the course, beyond its own fields
+ROLE_QUERYSETS = {
+    'course_coordinators': lambda courses: courses.select_related('course_coordinator').annotate(
+        assistant_count=Count('assistants', distinct=True)
+    ),
+}
+
+
+def user_role(request):
+    """Name of the request's user's group, or None if they are anonymous or in no group"""
+    if not hasattr(request, '_user_role'):
+        group = request.user.groups.first() if request.user.is_authenticated else None
+        request._user_role = group and group.name
+    return request._user_role
+
+
+def get_course(request, slug):
+    """The course with slug, loaded once per request, raises Http404 if there is none"""
+    courses = request.__dict__.setdefault('_courses', {})
+    if slug not in courses:
+        # the role is only known on pages picked by it, other views should not pay a query to find it
+        role = getattr(request, '_user_role', None)
+        queryset = ROLE_QUERYSETS.get(role, lambda courses: courses)(Course.objects.all())
+        courses[slug] = get_object_or_404(queryset, slug=slug)
+    return courses[slug]
+
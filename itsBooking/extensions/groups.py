@@ -0,0 +1,31 @@
+"""
+Per-process cache of the user groups' pks by name.
+
+The groups (students, assistants, course_coordinators) are created once and practically never change, yet every
+permission check used to look them up by name. A group that is not in the cache reloads it, and saving or deleting a
+group clears the cache of the process that did it.
+"""
+import threading
+
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_group_ids = None
+
+
+def group_ids(names=(), reload=False):
+    """{group name: pk} of every group. Reloads the cache if any of names are missing from it"""
+    global _group_ids
+    with _lock:
+        if reload or _group_ids is None or any(name not in _group_ids for name in names):
+            _group_ids = dict(Group.objects.values_list('name', 'pk'))
+        return _group_ids
+
+
+@receiver([post_save, post_delete], sender=Group)
+def clear_group_cache(**kwargs):
+    global _group_ids
+    with _lock:
+        _group_ids = None
@@ -1,9 +1,10 @@
-import django
 from django.conf import settings
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.contrib.auth.models import Group
 from django.core.exceptions import ImproperlyConfigured
 
+from itsBooking.extensions.courses import get_course
+from itsBooking.extensions.groups import group_ids
+
 
 class UserInGroupMixin(UserPassesTestMixin):
     """
@@ -29,15 +30,21 @@ class UserInGroupMixin(UserPassesTestMixin):
                 '{0}.test_func().'.format(self.__class__.__name__)
             )
         if not settings.TEST:  # If code is not being run as part of "./manage.py test" or "python manage.py test"
-            try:
-                allowed_groups = [Group.objects.get(name=group_name) for group_name in self.allowed_groups]
-            except django.contrib.auth.models.Group.DoesNotExist:
+            ids = group_ids(self.allowed_groups)
+            if any(group_name not in ids for group_name in self.allowed_groups):
                 raise AttributeError(
                     'One or more of the group names defined in {0}.allowed_groups '
                     'do not correspond to the name of any registered group'.format(self.__class__.__name__)
                 )
-
-            return any(g in allowed_groups for g in user_groups)
+            allowed_groups = {ids[group_name] for group_name in self.allowed_groups}
+            return any(g.pk in allowed_groups for g in user_groups)
         else:
             allowed_groups = self.allowed_groups
             return any(g.name in allowed_groups for g in user_groups)
+
+
+class CourseObjectMixin:
+    """For DetailViews of the course given by the slug argument, takes it from get_course instead of loading it again"""
+
+    def get_object(self, queryset=None):
+        return get_course(self.request, self.kwargs['slug'])
@@ -0,0 +1,63 @@
+"""
+Garbage collection of uploaded files that no row refers to.
+
+Files are only removed with their row when a single exercise is deleted, so queryset deletes, cascades and replaced
+avatars leave files behind in MEDIA_ROOT. The names the rows refer to are read in batches into a set, and the upload
+directories are streamed with os.scandir and checked against it one entry at a time, so memory grows with the number
+of rows and not with the number of files on disk.
+"""
+import os
+import posixpath
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+# (model, file field, directory its files are uploaded to)
+FILE_FIELDS = (
+    ('assignments.Exercise', 'file', 'exercises'),
+    ('communications.Avatar', 'image', 'avatars'),
+    ('assignments.ExerciseUpload', 'staging_name', 'partial_uploads'),
+)
+
+
+def referenced_names(batch_size=2000):
+    names = set()
+    for model, field, _ in FILE_FIELDS:
+        queryset = apps.get_model(model).objects.exclude(**{field: ''}).order_by().values_list(field, flat=True)
+        # stored names can have a trailing slash, the file on disk does not
+        names.update(posixpath.normpath(name) for name in queryset.iterator(chunk_size=batch_size))
+    return names
+
+
+def walk_files(root, directory):
+    """Yields (name relative to root, os.DirEntry) of every file below root/directory"""
+    directories = [directory]
+    while directories:
+        directory = directories.pop()
+        with os.scandir(os.path.join(root, directory)) as entries:
+            for entry in entries:
+                name = posixpath.join(directory, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry
+
+
+def find_orphans(grace_period, batch_size=2000, root=None):
+    """
+    Yields (name, size) of the uploaded files no row refers to, that were last modified more than grace_period
+    seconds ago. Newer files may belong to rows that are being saved.
+    """
+    root = root or settings.MEDIA_ROOT
+    # the cutoff is taken first, files uploaded while the names are read are too new to be yielded
+    cutoff = time.time() - grace_period
+    referenced = referenced_names(batch_size)
+    for _, _, directory in FILE_FIELDS:
+        if not os.path.isdir(os.path.join(root, directory)):
+            continue
+        for name, entry in walk_files(root, directory):
+            if name not in referenced:
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    yield name, stat.st_size
@@ -0,0 +1,126 @@
+"""
+Static file delivery for production.
+
+collectstatic stores every file under a name containing a hash of its content, so a file's url changes whenever
+the file does and browsers can cache it forever. Text files are also precompressed with gzip, and with brotli if
+the brotli package is installed, so the compressed variants do not have to be made on every request.
+
+Apache serves the files on Elastic Beanstalk (see .ebextensions/03_static.config). serve() does the same from
+Django for deployments without a web server in front, when SERVE_STATIC is set.
+"""
+import gzip
+import io
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot')
+# smaller files fit in a single packet anyway
+MIN_COMPRESS_SIZE = 512
+
+# hashed files never change, other files are revalidated after an hour
+HASHED_MAX_AGE = 365 * 24 * 60 * 60
+UNHASHED_MAX_AGE = 60 * 60
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def gzip_compress(content):
+    # no timestamp in the header, so collecting unchanged files gives identical output
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as gzip_file:
+        gzip_file.write(content)
+    return buffer.getvalue()
+
+
+def compressors():
+    """(content encoding, file suffix, compress function) in order of preference"""
+    if brotli is not None:
+        yield 'br', '.br', brotli.compress
+    yield 'gzip', '.gz', gzip_compress
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that writes a .gz (and .br) file next to each collected text file"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(paths).union(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        for _, suffix, compress in compressors():
+            compressed = compress(content)
+            # not worth a separate file if the client saves next to nothing
+            if len(compressed) < len(content) * 0.95:
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(request):
+    encodings = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = coding.strip().lower().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and quality[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        encodings.add(coding.strip())
+    return encodings
+
+
+def serve(request, path):
+    """Serves a file from STATIC_ROOT, precompressed if the client accepts it"""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, posixpath.normpath(path).lstrip('/'))
+    except SuspiciousFileOperation:
+        raise Http404()
+    if not os.path.isfile(full_path):
+        raise Http404()
+
+    encodings = accepted_encodings(request)
+    encoding, served_path = None, full_path
+    for coding, suffix, _ in compressors():
+        if (coding in encodings or '*' in encodings) and os.path.isfile(full_path + suffix):
+            encoding, served_path = coding, full_path + suffix
+            break
+
+    stat = os.stat(served_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(served_path, 'rb'))
+        # typed after the original file, FileResponse would type compressed files as archives
+        content_type, _ = mimetypes.guess_type(full_path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if HASHED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=HASHED_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=UNHASHED_MAX_AGE)
+    return response
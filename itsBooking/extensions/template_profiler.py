@@ -0,0 +1,171 @@
+"""
+Render profiler for templates.
+
+Attributes wall time and SQL queries to every template, {% include %}, {% block %} and profiled filter (those of
+itsBooking.templatetags.helpers) rendered while it is active. Time and queries are counted both inclusive of
+everything rendered inside a node and for the node itself, which is what finds lookups like
+booking_interval.assistants.all.count that run once per cell of a grid.
+
+In tests:
+
+    with TemplateProfiler() as profiler:
+        self.client.get(url)
+    print(profiler.report())
+
+Staff can also add ?profile_templates to any url, which returns the report instead of the page.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.http import HttpResponse
+from django.template import loader_tags
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAMETER = 'profile_templates'
+RANKING_KEYS = ('time', 'self_time', 'queries', 'self_queries', 'calls')
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def _active():
+    return getattr(_local, 'profiler', None)
+
+
+def _profiled_method(kind, get_name, method):
+    @functools.wraps(method)
+    def wrapper(node, context):
+        profiler = _active()
+        if profiler is None:
+            return method(node, context)
+        with profiler.measure(kind, get_name(node)):
+            return method(node, context)
+    return wrapper
+
+
+def _include_name(node):
+    # the template name as written in the tag, a variable's name if it is not a string literal
+    return node.template.token.strip('\'"')
+
+
+def _install():
+    """Wraps the render methods of templates, includes and blocks. The wrappers do nothing unless profiling"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        Template._render = _profiled_method(
+            'template', lambda template: template.name or '<string>', Template._render
+        )
+        loader_tags.IncludeNode.render = _profiled_method('include', _include_name, loader_tags.IncludeNode.render)
+        loader_tags.BlockNode.render = _profiled_method('block', lambda block: block.name, loader_tags.BlockNode.render)
+        _installed = True
+
+
+def profile_library(library):
+    """Profiles the filters of a template tag library, call it at the end of the library's module"""
+    for name, func in list(library.filters.items()):
+        library.filters[name] = _profiled_filter(name, func)
+
+
+def _profiled_filter(name, func):
+    # functools.wraps keeps the attributes (is_safe, ...) and argument checking of the filter
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active()
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler.measure('filter', name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class TemplateProfiler:
+    """Profiles the templates rendered by the current thread while used as a context manager"""
+
+    def __init__(self):
+        self.stats = {}  # {(kind, name): {'calls', 'time', 'self_time', 'queries', 'self_queries'}}
+        self.queries = 0
+        self._stack = []  # [time, queries] spent in the children of each node being rendered
+        self._exit_stack = None
+        self._previous = None
+
+    def __enter__(self):
+        _install()
+        self._previous = _active()
+        _local.profiler = self
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self._count_query))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._exit_stack.close()
+        _local.profiler = self._previous
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def measure(self, kind, name):
+        children = [0.0, 0]
+        self._stack.append(children)
+        start, queries_before = time.perf_counter(), self.queries
+        try:
+            yield
+        finally:
+            elapsed, queries = time.perf_counter() - start, self.queries - queries_before
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += elapsed
+                self._stack[-1][1] += queries
+            stat = self.stats.setdefault((kind, name), {
+                'calls': 0, 'time': 0.0, 'self_time': 0.0, 'queries': 0, 'self_queries': 0,
+            })
+            stat['calls'] += 1
+            stat['time'] += elapsed
+            stat['self_time'] += elapsed - children[0]
+            stat['queries'] += queries
+            stat['self_queries'] += queries - children[1]
+
+    def ranked(self, key='self_time'):
+        return sorted(self.stats.items(), key=lambda item: item[1][key], reverse=True)
+
+    def report(self, key='self_time', limit=25):
+        """The most expensive templates, includes, blocks and filters, by key"""
+        lines = [
+            f'{self.queries} queries in total, ranked by {key}',
+            f'{"calls":>7} {"total ms":>9} {"self ms":>9} {"queries":>8} {"self q":>7}  node',
+        ]
+        for (kind, name), stat in self.ranked(key)[:limit]:
+            lines.append(
+                f'{stat["calls"]:>7} {stat["time"] * 1000:>9.2f} {stat["self_time"] * 1000:>9.2f} '
+                f'{stat["queries"]:>8} {stat["self_queries"]:>7}  {kind} {name}'
+            )
+        return '\n'.join(lines)
+
+
+class TemplateProfilerMiddleware:
+    """Profiles the request's templates if a staff member asks for it, responding with the report"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_PARAMETER not in request.GET or not request.user.is_staff:
+            return self.get_response(request)
+        with TemplateProfiler() as profiler:
+            self.get_response(request)
+        # ?profile_templates=queries ranks by queries instead of time
+        key = request.GET[PROFILE_PARAMETER]
+        report = profiler.report(key if key in RANKING_KEYS else 'self_time')
+        logger.info('Template profile of %s\n%s', request.get_full_path(), report)
+        return HttpResponse(report, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,151 @@
+"""
+Token bucket throttling of the booking endpoints.
+
+Every user, and every course, has a bucket of tokens that refills at a steady rate. Each request to a throttled
+view takes a token from the user's bucket and the course's bucket, and is answered with 429 Too Many Requests
+before it gets to the database if either is empty. The buckets live in the per-process 'throttle' cache, so the
+limits are per worker process; the rates and sizes are set by BOOKING_THROTTLES.
+"""
+import json
+import math
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from booking.models import BookingInterval, ReservationConnection
+
+_lock = threading.Lock()
+_rejects = Counter()
+
+# the course a booking interval belongs to does not change, so it is only looked up now and then
+_COURSE_TIMEOUT = 24 * 60 * 60
+
+
+def _refill(tokens, updated, now, rate, size):
+    return min(size, tokens + (now - updated) * rate)
+
+
+def take_tokens(buckets, now=None):
+    """
+    Takes a token from every bucket in buckets, [(key, rate, size)], if all of them have one, and returns (0, None).
+    Otherwise nothing is taken, and the seconds until all of them have a token are returned along with the key of
+    the bucket that takes the longest to refill.
+    """
+    cache = caches['throttle']
+    now = time.time() if now is None else now
+    with _lock:
+        states = cache.get_many([key for key, _, _ in buckets])
+        levels = {}
+        for key, rate, size in buckets:
+            tokens, updated = states.get(key, (size, now))
+            levels[key] = _refill(tokens, updated, now, rate, size)
+        wait, limiting = max(((1 - levels[key]) / rate, key) for key, rate, _ in buckets)
+        taken = 1 if wait <= 0 else 0
+        for key, rate, size in buckets:
+            # an untouched bucket is full again after size / rate seconds, and can be forgotten
+            cache.set(key, (levels[key] - taken, now), math.ceil(size / rate) + 1)
+    return (0, None) if taken else (wait, limiting)
+
+
+def get_throttle_stats():
+    """The number of rejected requests of this worker process, {(scope, 'user' or 'course'): count}"""
+    with _lock:
+        return dict(_rejects)
+
+
+def reset_throttle_stats():
+    with _lock:
+        _rejects.clear()
+
+
+def slug_course(request, *args, slug=None, **kwargs):
+    """course for views of a course given by its slug"""
+    return slug
+
+
+def _cached_slugs(kind, keys, lookup):
+    """
+    {key: course slug} of the rows given by keys, kind names the rows in the cache keys. The slugs that are not
+    cached are looked up with lookup(keys), which returns {key: slug}.
+    """
+    cache = caches['throttle']
+    cache_keys = {key: f'throttle:{kind}:{key}' for key in keys}
+    cached = cache.get_many(list(cache_keys.values()))
+    slugs = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+    missing = [key for key in cache_keys if key not in slugs]
+    if missing:
+        found = lookup(missing)
+        cache.set_many({cache_keys[key]: slug for key, slug in found.items()}, _COURSE_TIMEOUT)
+        slugs.update(found)
+    return slugs
+
+
+def _booking_interval_slugs(nks):
+    return dict(BookingInterval.objects.filter(nk__in=nks).values_list('nk', 'course__slug'))
+
+
+def nk_course(request, *args, **kwargs):
+    """course for views of a booking interval given by the nk parameter"""
+    nk = request.POST.get('nk') or request.GET.get('nk')
+    if not nk:
+        return None
+    return _cached_slugs('nk', [nk], _booking_interval_slugs).get(nk)
+
+
+def nks_courses(request, *args, **kwargs):
+    """courses for views of the booking intervals given by the 'register' and 'unregister' nk lists of a JSON body"""
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    nks = {
+        nk for key in ('register', 'unregister') if isinstance(data.get(key), list)
+        for nk in data[key] if isinstance(nk, str)
+    }
+    return set(_cached_slugs('nk', nks, _booking_interval_slugs).values())
+
+
+def reservation_course(request, *args, **kwargs):
+    """course for views of a reservation given by the reservation_connection_pk parameter"""
+    pk = request.POST.get('reservation_connection_pk', '')
+    if not pk.isdigit():
+        return None
+    return _cached_slugs('reservation', [int(pk)], lambda pks: dict(
+        ReservationConnection.objects.filter(pk__in=pks).values_list('pk', 'booking_interval__course__slug')
+    )).get(int(pk))
+
+
+def throttle(scope, course=None):
+    """
+    Rate limits a view per user, and per course if course(request, *args, **kwargs) returns the slug of the course
+    the request is for, or a set of slugs if it is for several courses. scope names the view in the reject counts.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user_rate, user_size = settings.BOOKING_THROTTLES['user']
+            course_rate, course_size = settings.BOOKING_THROTTLES['course']
+            user = request.user.pk if request.user.is_authenticated else request.META.get('REMOTE_ADDR')
+            buckets = [(f'throttle:user:{user}', user_rate, user_size)]
+            slugs = course(request, *args, **kwargs) if course else None
+            for slug in [slugs] if isinstance(slugs, str) else sorted(slugs or ()):
+                buckets.append((f'throttle:course:{slug}', course_rate, course_size))
+
+            wait, limiting = take_tokens(buckets)
+            if wait:
+                with _lock:
+                    _rejects[scope, limiting.split(':')[1]] += 1
+                response = HttpResponse('For mange forespørsler, prøv igjen om litt.', status=429,
+                                        content_type='text/plain; charset=utf-8')
+                response['Retry-After'] = max(1, math.ceil(wait))
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
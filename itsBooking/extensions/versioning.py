@@ -0,0 +1,72 @@
+"""
+Version stamps for cached data.
+
+Everything cached for a course (or a user) is stored under a key that contains the course's current stamp.
+Signal handlers bump the stamp whenever a row the cached data is built from changes, which makes the old
+entries unreachable instead of having to find and delete them. Stamps are timestamps, so they double as the
+last modified time of the data they cover.
+"""
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+def _stamp_key(kind, pk):
+    return f'stamp:{kind}:{pk}'
+
+
+def get_stamp(kind, pk):
+    key = _stamp_key(kind, pk)
+    stamp = cache.get(key)
+    if stamp is None:
+        # never bumped, or evicted from the cache. Either way, nothing cached under an older stamp can be trusted
+        cache.add(key, time.time(), None)
+        stamp = cache.get(key, time.time())
+    return stamp
+
+
+def get_stamps(kind, pks):
+    """get_stamp for many rows in a single cache round trip, {pk: stamp}"""
+    keys = {_stamp_key(kind, pk): pk for pk in pks}
+    stamps = {keys[key]: stamp for key, stamp in cache.get_many(list(keys)).items()}
+    for pk in pks:
+        if pk not in stamps:
+            stamps[pk] = get_stamp(kind, pk)
+    return stamps
+
+
+def bump_stamp(kind, pk):
+    cache.set(_stamp_key(kind, pk), time.time(), None)
+
+
+def bump_stamps(kind, pks):
+    """bump_stamp for many rows in a single cache round trip"""
+    now = time.time()
+    cache.set_many({_stamp_key(kind, pk): now for pk in pks}, None)
+
+
+def course_stamp(course_id):
+    return get_stamp('course', course_id)
+
+
+def bump_course_stamp(course_id):
+    bump_stamp('course', course_id)
+
+
+def user_stamp(user_id):
+    return get_stamp('user', user_id)
+
+
+def bump_user_stamp(user_id):
+    bump_stamp('user', user_id)
+
+
+def stamp_to_datetime(stamp):
+    return datetime.fromtimestamp(stamp, timezone.utc)
+
+
+def versioned_key(prefix, *stamps):
+    """Cache key for data built from the rows covered by stamps"""
+    return ':'.join([prefix] + [repr(stamp) for stamp in stamps])
@@ -0,0 +1,92 @@
+"""
+Warm-up for new worker processes.
+
+Django builds the URL resolvers, compiles templates and connects to the database lazily, so without a warm-up the
+first requests a worker serves after a deploy or restart pay for all of it. warm_up() does the work up front, and is
+run by itsBooking/wsgi.py when WARM_UP_WORKERS is set, or by hand with ./manage.py warm_up.
+"""
+import logging
+import os
+import time
+
+from django.db import connections
+from django.template import engines, TemplateSyntaxError
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver, reverse
+
+from itsBooking.extensions.groups import group_ids
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def load_url_resolvers():
+    resolver = get_resolver()
+    # builds the reverse lookup tables of the resolver and every included urlconf
+    resolver.reverse_dict
+    reverse('home')
+    return f'{len(resolver.url_patterns)} url patterns'
+
+
+def _template_loaders(engine):
+    for loader in engine.engine.template_loaders:
+        yield from getattr(loader, 'loaders', [loader])  # the cached loader wraps the real ones
+
+
+def compile_templates():
+    """Compiles every template of the Django template engines, which the cached loader keeps"""
+    compiled, failed, cached = 0, 0, False
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        cached = cached or any(hasattr(loader, 'get_template_cache') for loader in engine.engine.template_loaders)
+        names = set()
+        for loader in _template_loaders(engine):
+            for directory in loader.get_dirs():
+                for root, _, files in os.walk(directory):
+                    names.update(
+                        os.path.relpath(os.path.join(root, file), directory).replace(os.sep, '/')
+                        for file in files if file.endswith(TEMPLATE_EXTENSIONS)
+                    )
+        for name in sorted(names):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except TemplateSyntaxError:
+                # e.g. templates of apps that are not installed
+                failed += 1
+    return f'{compiled} templates compiled, {failed} failed' + ('' if cached else ' (not cached, DEBUG loaders)')
+
+
+def prime_group_cache():
+    return f'{len(group_ids(reload=True))} groups'
+
+
+def connect_databases():
+    # connections are per thread, so this mostly checks that the databases can be reached and loads the drivers
+    for connection in connections.all():
+        connection.ensure_connection()
+    return ', '.join(connections)
+
+
+STEPS = (
+    ('url resolvers', load_url_resolvers),
+    ('templates', compile_templates),
+    ('databases', connect_databases),
+    ('group cache', prime_group_cache),
+)
+
+
+def warm_up():
+    """Runs every warm-up step, returns (step, seconds, result) for each"""
+    report = []
+    for step, function in STEPS:
+        start = time.perf_counter()
+        result = function()
+        report.append((step, time.perf_counter() - start, result))
+    return report
+
+
+def format_report(report):
+    return '\n'.join(f'{step:<14} {seconds * 1000:>8.1f} ms  {result}' for step, seconds, result in report)
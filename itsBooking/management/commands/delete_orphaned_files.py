@@ -0,0 +1,46 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from assignments.models import ExerciseUpload
+from itsBooking.extensions.orphans import find_orphans
+
+
+class Command(BaseCommand):
+    help = 'Reports uploaded files that no exercise or avatar refers to, and deletes them with --delete.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete the files instead of only reporting them')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Leave files modified in the last hours alone, they may belong to unsaved rows')
+        parser.add_argument('--abandoned-days', type=float, default=7,
+                            help='Chunked uploads that have not progressed for this many days are abandoned')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        abandoned = ExerciseUpload.objects.filter(
+            updated__lt=timezone.now() - timedelta(days=options['abandoned_days'])
+        )
+        if options['delete']:
+            # their staging files are orphans from here on, and are deleted with the rest
+            abandoned_count, _ = abandoned.delete()
+            self.stdout.write(f'Deleted {abandoned_count} abandoned uploads')
+        else:
+            self.stdout.write(f'Found {abandoned.count()} abandoned uploads')
+
+        count, size = 0, 0
+        for name, file_size in find_orphans(options['grace_hours'] * 60 * 60, options['batch_size']):
+            if options['delete']:
+                try:
+                    os.remove(os.path.join(settings.MEDIA_ROOT, name))
+                except FileNotFoundError:
+                    continue
+            if options['verbosity'] >= 2:
+                self.stdout.write(name)
+            count += 1
+            size += file_size
+        action = 'Deleted' if options['delete'] else 'Found'
+        self.stdout.write(f'{action} {count} orphaned files, {size / 1024 / 1024:.1f} MB')
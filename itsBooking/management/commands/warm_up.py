@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from itsBooking.extensions.warmup import warm_up, format_report
+
+
+class Command(BaseCommand):
+    help = 'Loads the url resolvers, compiles the templates, fills the group cache and connects to the databases.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(format_report(warm_up()))
@@ -43,7 +43,7 @@ def setup_course(course, cc):
         if not registered_assistants:
             continue
 
-        for ri in bi.reservation_intervals.all():
+        for slot in bi.get_reservation_slots():
             possible_students = list.copy(students)
             for i in range(bi.assistants.all().count()):
                 r = random.randint(1, 4)
@@ -52,7 +52,7 @@ def setup_course(course, cc):
                     continue
                 student = random.choice(possible_students)
                 possible_students.remove(student)
-                ReservationConnection.objects.create(reservation_interval=ri, student=student)
+                ReservationConnection.objects.create(booking_interval=bi, slot_index=slot.index, student=student)
 
 
 def generate_users(group, group_list, number):
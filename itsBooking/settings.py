@@ -44,10 +44,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'itsBooking.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'itsBooking.extensions.template_profiler.TemplateProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +84,31 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = ['itsBooking.db.routers.PrimaryReplicaRouter']
+
+# Aliases in DATABASES that are read-only copies of 'default'. Read-only requests are spread across them
+REPLICA_DATABASES = []
+
+# Number of seconds a user's reads stay on the primary database after they have written something
+REPLICA_PIN_SECONDS = 10
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+# Token buckets for the booking endpoints, as (tokens added per second, bucket size).
+# See itsBooking.extensions.throttling
+BOOKING_THROTTLES = {
+    'user': (1, 10),
+    'course': (50, 200),
+}
+
 #########################
 # Import local settings
 #########################
@@ -138,6 +165,12 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGOUT_URL = '/'
 
+# serve collected static files from Django, see itsBooking.extensions.staticfiles
+SERVE_STATIC = False
+
+# compile templates and connect to the database when a worker starts, see itsBooking.extensions.warmup
+WARM_UP_WORKERS = False
+
 # enable stdout (print) during testing
 NOSE_ARGS = [
     '--nocapture',
@@ -146,3 +179,17 @@ NOSE_ARGS = [
 
 # Quick hack to let us see if code is running through tests or not
 TEST = 'test' in sys.argv
+
+# Tests make requests faster than any user could, the throttling tests set their own limits
+if TEST:
+    BOOKING_THROTTLES = {
+        'user': (1000, 1000),
+        'course': (1000, 1000),
+    }
+
+# The database router tests use a second database standing in for a read replica
+if TEST:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+    }
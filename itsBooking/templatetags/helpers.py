@@ -2,6 +2,8 @@ import calendar
 
 from django import template
 
+from itsBooking.extensions.template_profiler import profile_library
+
 register = template.Library()
 
 
@@ -19,7 +21,7 @@ def get_norwegian_day_name(day):
 
 @register.filter('available_slots')
 def get_available_reservation_slots(reservation):
-    return reservation.booking_interval.assistants.count() - reservation.connections.count()
+    return reservation.available_slots
 
 
 @register.filter
@@ -38,17 +40,13 @@ def first_name(user):
     return user.username
 
 @register.filter(name='already_made_reservation')
-def user_has_made_reservation_for_interval(user, reservation_interval):
-    for rc in reservation_interval.connections.all():
-        if user == rc.student:
-            return True
-    return False
+def user_has_made_reservation_for_interval(user, reservation):
+    return any(connection.student_id == user.id for connection in reservation.connections)
 
 @register.filter('student_count')
 def student_count_in_reservation_interval(booking_interval):
-    count=0;
-    for reservation in booking_interval.reservation_intervals.all():
-        if reservation.connections.first() is not None:
-            count+=1;
-    return  count
+    # number of reservation slots with at least one reservation this week
+    return booking_interval.connections.current_week().values('slot_index').distinct().count()
+
 
+profile_library(register)
@@ -1,12 +1,33 @@
+import gzip
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth.models import User, Group
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse, Http404
+from django.test import TestCase, Client, SimpleTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy, reverse
 
 from assignments.models import Exercise
-from booking.models import Course, ReservationConnection
+from booking.models import Course, ReservationConnection, current_week_start
+from booking.overview import user_courses
 from communications.models import Announcement
+from itsBooking.db.middleware import ReplicaRoutingMiddleware, PIN_COOKIE_NAME
+from itsBooking.db.persistent import get_connection_stats, reset_connection_stats
+from itsBooking.extensions import staticfiles
+from itsBooking.extensions.groups import group_ids
+from itsBooking.extensions.template_profiler import TemplateProfiler
+from itsBooking.extensions.warmup import compile_templates
 
 
 class TestBaseViews(TestCase):
@@ -175,8 +196,7 @@ class StudentViewTest(TestCase):
         booking_interval = self.course.booking_intervals.filter(day=4).first()
         booking_interval.min_num_assistants = 1
         booking_interval.assistants.add(assistant_user)
-        self.reservation = booking_interval.reservation_intervals.first()
-        self.connection = ReservationConnection.objects.create(reservation_interval=self.reservation,
+        self.connection = ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=0,
                                                                student=self.user,
                                                                assistant=assistant_user
                                                                )
@@ -223,3 +243,433 @@ class CourseCoordinatorViewTest(TestCase):
 
     def test_context_data(self):
         self.assertIsNotNone(self.response.context)
+
+
+class HomeCourseListTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.other_course = Course.objects.create(title='matte', course_code='tma4100')
+        self.student = User.objects.create_user(username='STUDENT')
+        self.student.groups.add(Group.objects.create(name='students'))
+        self.assistant = User.objects.create_user(username='ASSISTANT')
+        self.assistant.groups.add(Group.objects.create(name='assistants'))
+        self.course.students.add(self.student)
+        self.course.assistants.add(self.assistant)
+
+    def home_courses(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('home')).context['course_list']
+
+    def test_own_courses(self):
+        self.assertEqual([self.course], self.home_courses(self.student))
+        self.assertEqual([self.course], self.home_courses(self.assistant))
+        self.other_course.students.add(self.student)
+        self.assertEqual([self.course, self.other_course], self.home_courses(self.student))
+
+    def test_counts(self):
+        monday = current_week_start()
+        booking_interval = self.course.booking_intervals.get(day=0, start='08:00')
+        booking_interval.assistants.add(self.assistant)
+        ReservationConnection.objects.create(booking_interval=booking_interval, slot_index=0, student=self.student)
+        other_student = User.objects.create_user(username='OTHER')
+        for student in (self.student, other_student):
+            Exercise.objects.create(course=self.course, student=student, file='ex.txt')
+
+        course = user_courses(self.student, 'students', today=monday).get()
+        self.assertEqual((1, 1), (course.upcoming_reservations, course.unreviewed_exercises))
+        course = user_courses(self.assistant, 'assistants', today=monday).get()
+        self.assertEqual((1, 2), (course.upcoming_reservations, course.unreviewed_exercises))
+        # monday's reservations are past by tuesday
+        course = user_courses(self.student, 'students', today=monday + timedelta(days=1)).get()
+        self.assertEqual(0, course.upcoming_reservations)
+
+    def test_cached(self):
+        self.home_courses(self.assistant)
+        with CaptureQueriesContext(connection) as queries:
+            self.home_courses(self.assistant)
+        self.assertFalse([query for query in queries if 'FROM "booking_course"' in query['sql']])
+
+        # an upload bumps the course's stamp
+        time.sleep(0.01)
+        Exercise.objects.create(course=self.course, student=self.student, file='ex.txt')
+        self.assertEqual(1, self.home_courses(self.assistant)[0].unreviewed_exercises)
+
+
+class CourseLoaderTest(TestCase):
+    def setUp(self):
+        self.cc = User.objects.create_user(username='CC')
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125', course_coordinator=self.cc)
+        for i in range(3):
+            Announcement.objects.create(title=f'test {i}', content='test', author=self.cc, course=self.course)
+        self.users = {}
+        for role in ('students', 'assistants', 'course_coordinators'):
+            user = self.cc if role == 'course_coordinators' else User.objects.create_user(username=role)
+            user.groups.add(Group.objects.create(name=role))
+            self.users[role] = user
+
+    def course_queries(self, url, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(200, self.client.get(url).status_code)
+        return [query['sql'] for query in queries if 'FROM "booking_course"' in query['sql']]
+
+    def test_course_loaded_once(self):
+        urls = {
+            'students': ['course_landing_page', 'course_detail', 'upload_exercise', 'student_exercise_uploads_list'],
+            'assistants': ['course_landing_page', 'course_detail', 'announcements', 'exercise_uploads_list'],
+            'course_coordinators': ['course_landing_page', 'course_detail', 'announcements', 'course_analytics'],
+        }
+        for role, names in urls.items():
+            for name in names:
+                url = reverse(name, kwargs={'slug': self.course.slug})
+                with self.subTest(role=role, url=url):
+                    self.assertEqual(1, len(self.course_queries(url, self.users[role])))
+
+    def test_coordinator_landing_page(self):
+        queries = self.course_queries(reverse('course_landing_page', kwargs={'slug': self.course.slug}), self.cc)
+        # the number of assistants is counted in the same query
+        self.assertIn('COUNT', queries[0])
+
+
+class PersistentConnectionTest(SimpleTestCase):
+    """
+    Runs the persistent connection backend against a throwaway SQLite database standing in for MySQL.
+    Calls to close_if_unusable_or_obsolete() mark the boundaries between requests, like Django's request signals do.
+    """
+
+    def setUp(self):
+        reset_connection_stats()
+        self.db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+        self.db_file.close()
+
+    def tearDown(self):
+        if hasattr(self, 'wrapper'):
+            self.wrapper.close()
+        os.remove(self.db_file.name)
+
+    def _get_wrapper(self, **options):
+        handler = ConnectionHandler({
+            'default': {},
+            'persistent': dict({
+                'ENGINE': 'itsBooking.db.sqlite3',
+                'NAME': self.db_file.name,
+                'CONN_MAX_AGE': 300,
+                'CONN_HEALTH_CHECKS': True,
+            }, **options)
+        })
+        self.wrapper = handler['persistent']
+        return self.wrapper
+
+    def _run_query(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def test_connection_reused_between_requests(self):
+        self._get_wrapper()
+        for _ in range(3):
+            self._run_query()
+            self.wrapper.close_if_unusable_or_obsolete()
+        stats = get_connection_stats()['persistent']
+        self.assertEqual(1, stats['connects'])
+        self.assertEqual(2, stats['reuses'])
+        self.assertGreater(stats['connect_time'], 0)
+
+    def test_dead_connection_replaced(self):
+        self._get_wrapper()
+        self._run_query()
+        self.wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(self.wrapper, 'is_usable', return_value=False):
+            self._run_query()
+        stats = get_connection_stats()['persistent']
+        self.assertEqual(2, stats['connects'])
+        self.assertEqual(1, stats['failed_health_checks'])
+        self.assertEqual(0, stats['reuses'])
+
+    def test_health_check_only_once_per_request(self):
+        self._get_wrapper()
+        self._run_query()
+        self.wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(self.wrapper, 'is_usable', return_value=True) as is_usable:
+            self._run_query()
+            self._run_query()
+        self.assertEqual(1, is_usable.call_count)
+
+    def test_connection_recycled_after_max_age(self):
+        self._get_wrapper(CONN_MAX_AGE=0)
+        self._run_query()
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(self.wrapper.connection)
+        self._run_query()
+        stats = get_connection_stats()['persistent']
+        self.assertEqual(1, stats['recycled'])
+        self.assertEqual(2, stats['connects'])
+
+
+@override_settings(REPLICA_DATABASES=['replica'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTest(TestCase):
+    """
+    'default' and 'replica' are two separate SQLite databases here, and nothing is replicated between them,
+    which makes it easy to see which one a query went to.
+    """
+    multi_db = True
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        Course.objects.create(title='algdat', course_code='tdt4125')
+
+    def _course_exists_view(self, request):
+        return HttpResponse(str(Course.objects.filter(course_code='tdt4125').exists()))
+
+    def _create_course_view(self, request):
+        Course.objects.create(title='mattematikk', course_code='tma4100')
+        return self._course_exists_view(request)
+
+    def test_reads_go_to_replica(self):
+        response = ReplicaRoutingMiddleware(self._course_exists_view)(self.factory.get('/'))
+        self.assertEqual(b'False', response.content, msg='read only requests should read from the replica')
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_unsafe_requests_read_from_primary(self):
+        response = ReplicaRoutingMiddleware(self._course_exists_view)(self.factory.post('/'))
+        self.assertEqual(b'True', response.content)
+
+    def test_read_your_writes(self):
+        middleware = ReplicaRoutingMiddleware(self._create_course_view)
+        response = middleware(self.factory.get('/'))
+        self.assertEqual(b'True', response.content, msg='reads after a write should go to the primary database')
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+        # the next request from the same user stays on the primary database
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = response.cookies[PIN_COOKIE_NAME].value
+        response = ReplicaRoutingMiddleware(self._course_exists_view)(request)
+        self.assertEqual(b'True', response.content)
+
+        # until the pin has expired
+        request.COOKIES[PIN_COOKIE_NAME] = '0'
+        response = ReplicaRoutingMiddleware(self._course_exists_view)(request)
+        self.assertEqual(b'False', response.content)
+
+
+class StaticFilesTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        with override_settings(
+                STATIC_ROOT=cls.static_root.name,
+                STATICFILES_STORAGE='itsBooking.extensions.staticfiles.CompressedManifestStaticFilesStorage'):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            cls.css = staticfiles_storage.stored_name('itsBooking/uikit/uikit.min.css')
+            cls.image = staticfiles_storage.stored_name('itsBooking/favicon/favicon-32x32.png')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.static_root.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def path(self, name):
+        return os.path.join(self.static_root.name, name)
+
+    def serve(self, name, **headers):
+        with self.settings(STATIC_ROOT=self.static_root.name):
+            return staticfiles.serve(self.factory.get('/static/' + name, **headers), name)
+
+    def test_collectstatic_compresses_hashed_files(self):
+        self.assertRegex(self.css, r'uikit\.min\.[0-9a-f]{12}\.css$')
+        with open(self.path(self.css), 'rb') as original, gzip.open(self.path(self.css + '.gz')) as compressed:
+            self.assertEqual(original.read(), compressed.read())
+        # images are compressed already
+        self.assertFalse(os.path.exists(self.path(self.image + '.gz')))
+
+    def test_serve_negotiates_encoding(self):
+        response = self.serve(self.css, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual('text/css', response['Content-Type'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        with open(self.path(self.css), 'rb') as original:
+            self.assertEqual(original.read(), gzip.decompress(b''.join(response.streaming_content)))
+
+        response = self.serve(self.css, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response.close()
+
+    def test_serve_unhashed_and_missing(self):
+        response = self.serve('itsBooking/uikit/uikit.min.css')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
+        with self.assertRaises(Http404):
+            self.serve('../manage.py')
+        with self.assertRaises(Http404):
+            self.serve('itsBooking/nope.css')
+
+
+class TemplateProfilerTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.user = User.objects.create_user(username='STUDENT', password='123')
+        self.user.groups.add(Group.objects.create(name='students'))
+        self.client.login(username='STUDENT', password='123')
+        self.url = reverse('course_detail', kwargs={'slug': self.course.slug})
+
+    def test_attributes_time_and_queries(self):
+        with TemplateProfiler() as profiler:
+            self.client.get(self.url)
+        stats = profiler.stats
+        self.assertEqual(1, stats['template', 'booking/course_detail.html']['calls'])
+        self.assertIn(('block', 'body'), stats)
+        self.assertIn(('include', 'booking/reservation_input.html'), stats)
+        # once per cell of the grid
+        self.assertEqual(
+            Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL * self.course.booking_intervals.count(),
+            stats['filter', 'already_made_reservation']['calls'],
+        )
+        # the group checks query the database, and so count towards the templates they are used in
+        in_group = stats['filter', 'in_group']
+        self.assertEqual(in_group['calls'], in_group['self_queries'])
+        page = stats['template', 'booking/course_detail.html']
+        self.assertGreaterEqual(page['queries'], page['self_queries'] + in_group['queries'] - in_group['calls'])
+        self.assertLessEqual(page['self_time'], page['time'])
+        self.assertIn('filter already_made_reservation', profiler.report())
+
+    def test_profile_request(self):
+        response = self.client.get(self.url, {'profile_templates': 'queries'})
+        self.assertEqual('text/html; charset=utf-8', response['Content-Type'])  # only for staff
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(self.url, {'profile_templates': 'queries'})
+        self.assertEqual('text/plain; charset=utf-8', response['Content-Type'])
+        self.assertIn('ranked by queries', response.content.decode())
+        self.assertIn('template booking/course_detail.html', response.content.decode())
+
+
+class WarmUpTest(TestCase):
+    def test_warm_up_command(self):
+        Group.objects.create(name='students')
+        out = StringIO()
+        call_command('warm_up', stdout=out)
+        report = out.getvalue()
+        for step in ('url resolvers', 'templates', 'databases', 'group cache'):
+            self.assertIn(step, report)
+        self.assertIn('1 groups', report)
+
+    def test_compile_templates(self):
+        with self.settings(TEMPLATES=[dict(settings.TEMPLATES[0], APP_DIRS=False, OPTIONS=dict(
+                settings.TEMPLATES[0]['OPTIONS'],
+                loaders=[('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.app_directories.Loader',
+                ])],
+        ))]):
+            from django.template import engines
+            result = compile_templates()
+            cache = engines['django'].engine.template_loaders[0].get_template_cache
+            self.assertIn('booking/course_detail.html', cache)
+            self.assertNotIn('not cached', result)
+
+    def test_group_cache(self):
+        students = Group.objects.create(name='students')
+        self.assertEqual({'students': students.pk}, group_ids())
+        # new groups clear the cache, and unknown names reload it
+        assistants = Group.objects.create(name='assistants')
+        self.assertEqual(assistants.pk, group_ids()['assistants'])
+        Group.objects.filter(pk=assistants.pk).update(name='course_coordinators')
+        self.assertEqual(assistants.pk, group_ids(['course_coordinators'])['course_coordinators'])
+
+
+class UserAdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('ADMIN', 'admin@example.com', '123'))
+        self.students = Group.objects.create(name='students')
+        self.assistants = Group.objects.create(name='assistants')
+        self.course = Course.objects.create(title='algdat', course_code='tdt4125')
+        self.student = User.objects.create_user(username='STUDENT')
+        self.student.groups.add(self.students)
+        self.assistant = User.objects.create_user(username='ASSISTANT')
+        self.assistant.groups.add(self.assistants)
+        self.url = reverse('admin:auth_user_changelist')
+
+    def run_action(self, action, **data):
+        return self.client.post(self.url, {
+            'action': action, ACTION_CHECKBOX_NAME: [self.student.pk, self.assistant.pk], **data
+        })
+
+    def test_enroll_asks_for_course(self):
+        response = self.run_action('enroll_in_course')
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, '2 brukere er valgt')
+        self.assertFalse(self.course.students.exists())
+
+    def test_enroll_and_remove(self):
+        response = self.run_action('enroll_in_course', apply=1, course=self.course.pk, role='students')
+        self.assertEqual(302, response.status_code)
+        # the assistant is not a student
+        self.assertEqual([self.student], list(self.course.students.all()))
+        self.run_action('remove_from_course', apply=1, course=self.course.pk, role='students')
+        self.assertFalse(self.course.students.exists())
+
+    def test_change_group(self):
+        url = reverse('admin:auth_user_change', args=[self.student.pk])
+        self.assertEqual(self.students.pk, self.client.get(url).context['adminform'].form.initial['groups'])
+        response = self.client.post(url, {
+            'username': 'STUDENT', 'password': self.student.password, 'groups': self.assistants.pk,
+        })
+        self.assertEqual(302, response.status_code)
+        self.assertEqual([self.assistants], list(self.student.groups.all()))
+
+    def test_search(self):
+        response = self.client.get(self.url, {'q': 'stud'})
+        self.assertEqual([self.student], list(response.context['cl'].result_list))
+
+
+class OrphanedFilesTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        course = Course.objects.create(title='algdat', course_code='tdt4125')
+        student = User.objects.create_user(username='STUDENT')
+        self.exercise = Exercise.objects.create(
+            course=course, student=student, file=SimpleUploadedFile('ex.txt', b'exercise')
+        )
+        self.orphan = self.write_file('exercises/tdt4125/user_1/old.txt', age=2 * 24 * 60 * 60)
+        self.new_orphan = self.write_file('avatars/user_STUDENT_1/new.png')
+        self.other = self.write_file('other/file.txt', age=2 * 24 * 60 * 60)
+        os.utime(self.exercise.file.path, (0, 0))
+
+    def write_file(self, name, age=0):
+        path = os.path.join(self.media_root.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'orphan')
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_report(self):
+        out = StringIO()
+        call_command('delete_orphaned_files', verbosity=2, stdout=out)
+        self.assertEqual(['Found 0 abandoned uploads', 'exercises/tdt4125/user_1/old.txt',
+                          'Found 1 orphaned files, 0.0 MB'],
+                         out.getvalue().splitlines())
+        self.assertTrue(os.path.isfile(self.orphan))
+
+    def test_delete(self):
+        call_command('delete_orphaned_files', '--delete', stdout=StringIO())
+        self.assertFalse(os.path.isfile(self.orphan))
+        # files of rows, files within the grace period and files outside the upload directories are kept
+        for path in (self.exercise.file.path, self.new_orphan, self.other):
+            self.assertTrue(os.path.isfile(path))
+
+    def test_grace_period(self):
+        out = StringIO()
+        call_command('delete_orphaned_files', '--grace-hours', '0', stdout=out)
+        self.assertIn('Found 2 orphaned files', out.getvalue())
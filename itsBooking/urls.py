@@ -1,8 +1,9 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 
+from itsBooking.extensions.staticfiles import serve as serve_static
 from itsBooking.views import Home, populate_db, LoginView, LogoutView, LandingPageDelegator
 
 urlpatterns = [
@@ -17,5 +18,8 @@ urlpatterns = [
     path('<str:slug>/', LandingPageDelegator.as_view(), name='course_landing_page'),
 ]
 
+if settings.SERVE_STATIC:
+    urlpatterns.insert(0, re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static))
+
 if settings.DEBUG:
     urlpatterns = urlpatterns + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -6,7 +6,6 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
 from django.db.models import Q
 from django.http import HttpResponseRedirect, HttpResponse
-from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.views import View
 from django.views.generic import TemplateView, DetailView
@@ -14,7 +13,10 @@ from django.views.generic import TemplateView, DetailView
 from assignments.models import Exercise
 from booking.models import BookingInterval, ReservationConnection
 from booking.models import Course
-from communications.models import Announcement
+from booking.overview import home_courses
+from itsBooking.extensions.conditional import conditional_course_page
+from itsBooking.extensions.courses import user_role
+from itsBooking.extensions.mixins import CourseObjectMixin
 from itsBooking.templatetags.helpers import user_in_group
 
 
@@ -23,7 +25,7 @@ class Home(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        context['course_list'] = Course.objects.all()
+        context['course_list'] = home_courses(self.request.user, user_role(self.request))
         return context
 
     def dispatch(self, request, *args, **kwargs):
@@ -62,64 +64,61 @@ def populate_db(request):
     raise PermissionDenied()
 
 
-class AssistantLandingPage(DetailView):
+class AssistantLandingPage(CourseObjectMixin, DetailView):
     model = Course
     template_name = 'landing/landing_page.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
-        context['announcements'] = Announcement.objects.filter(course=course)
-        context['booking_intervals'] = BookingInterval.objects.filter(
-            Q(assistants=self.request.user)
-            & Q(course=Course.objects.get(slug=self.kwargs['slug']))
-        )
-        context.update({'course': course,
-                        'exercise_list': course.exercise_uploads.filter(approved__isnull=True)})
+        course = self.object
+        context['announcements'] = course.announcement.all()
+        context['booking_intervals'] = course.booking_intervals.filter(
+            assistants=self.request.user
+        ).order_by('day', 'start')
+        context['exercise_list'] = course.exercise_uploads.filter(approved__isnull=True)
         return context
 
 
-class StudentLandingPage(DetailView):
+class StudentLandingPage(CourseObjectMixin, DetailView):
     model = Course
     template_name = 'landing/landing_page.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['reservations'] = ReservationConnection.objects.filter(
+        context['reservations'] = ReservationConnection.objects.current_week().filter(
             Q(student=self.request.user)
-            & Q(reservation_interval__booking_interval__course=Course.objects.get(slug=self.kwargs['slug']))
+            & Q(booking_interval__course=self.object)
         )
         context['exercise_list'] = Exercise.objects.filter(student=self.request.user)
         return context
 
 
-class CourseCoordinatorLandingPage(DetailView):
+class CourseCoordinatorLandingPage(CourseObjectMixin, DetailView):
     model = Course
     template_name = 'landing/landing_page.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        booking_intervals = BookingInterval.objects.filter(course=self.object)
+        booking_intervals = BookingInterval.objects.filter(course=self.object).order_by()
         assistants_registered_for_bi = []
         booked_counter, available_intervals, full_booking_intervals = 0, 0, 0
         for booking_interval in booking_intervals:
             # Assistants registered for a booking interval
-            for assistant in booking_interval.assistants.all():
-                assistants_registered_for_bi.append(assistant)
-            # Share of reservation_intervals booked by students
-            for reservation_interval in booking_interval.reservation_intervals.all():
-                available_intervals += booking_interval.assistants.count()
-                booked_counter += reservation_interval.connections.count()
+            assistants = booking_interval.assistants.all()
+            assistants_registered_for_bi.extend(assistants)
+            # Share of reservation slots booked by students
+            available_intervals += Course.NUM_RESERVATIONS_IN_BOOKING_INTERVAL * len(assistants)
+            booked_counter += booking_interval.connections.current_week().count()
             # Number of full booking intervals
-            if booking_interval.max_available_assistants == booking_interval.assistants.count():
+            if booking_interval.max_available_assistants == len(assistants):
                 full_booking_intervals += 1
         context['assistants_registered_for_bi'] = list(set(assistants_registered_for_bi))
         context['booked_ri_count'] = booked_counter
         context['available_rintervals_count'] = available_intervals  # Reservation intervals available for students
         context['full_bi_count'] = full_booking_intervals
         context['available_bintervals_count'] = booking_intervals.all().count()  # Number of available booking intervals
-        context['available_assistants'] = Course.objects.get(pk=self.object.pk).assistants.all().count()
+        context['available_assistants'] = self.object.assistant_count
         context['total_opening_time'] = booking_intervals.filter(max_available_assistants__gt=0).all().count() * 2
 
         # Percentages for progress bar at cc_overview
@@ -131,28 +130,23 @@ class CourseCoordinatorLandingPage(DetailView):
         context['max_studass_percent'] = round(context['full_bi_count'] / context['available_bintervals_count'] * 100) \
             if context['available_bintervals_count'] != 0 else 0
 
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
-        # context["announcements"] = Announcement.objects.filter(course=course)
-        context["announcements"] = Announcement.objects.filter(course=course).order_by('-id')  # [:10]
-
-        course = get_object_or_404(Course, slug=self.kwargs['slug'])
-        context.update({'course': course,
-                        'exercise_list': course.exercise_uploads.filter(approved__isnull=True)})
+        context["announcements"] = self.object.announcement.order_by('-id')  # [:10]
+        context['exercise_list'] = self.object.exercise_uploads.filter(approved__isnull=True)
 
         return context
 
 
 class LandingPageDelegator(View):
     delegator = {
-        'students': StudentLandingPage.as_view(),
-        'assistants': AssistantLandingPage.as_view(),
-        'course_coordinators': CourseCoordinatorLandingPage.as_view(),
+        'students': conditional_course_page(StudentLandingPage.as_view()),
+        'assistants': conditional_course_page(AssistantLandingPage.as_view()),
+        'course_coordinators': conditional_course_page(CourseCoordinatorLandingPage.as_view()),
     }
 
     def dispatch(self, request, *args, **kwargs):
         # if user not logged in or not in any groups -> 403, if user is missing groups -> Login page
-        if not request.user.is_authenticated or not request.user.groups.all():
+        request_user_group = user_role(request)
+        if request_user_group is None:
             raise PermissionDenied
-        request_user_group = self.request.user.groups.first().name
 
         return self.delegator.get(request_user_group, LoginView.as_view())(request, *args, **kwargs)
@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "itsBooking.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP_WORKERS:
+    from itsBooking.extensions import warmup  # noqa: E402
+
+    try:
+        warmup.logger.info('Worker warmed up\n%s', warmup.format_report(warmup.warm_up()))
+    except Exception:
+        # a cold worker is better than none, the requests will do the work instead
+        warmup.logger.exception('Warming up the worker failed')